@@ -1,12 +1,18 @@
 # app/main.py
-from fastapi import FastAPI
+# Primero: mide desde aquí la importación de cada módulo de la app (ver /debug/startup)
+from app.utils.startup import startup_report
+startup_report.install_import_hook()
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.database import init_db, SessionLocal
 from app.utils import discover
 
 # importamos Cafeteria y DataLoader para el seeding
 from app.models import Cafeteria
-from app.utils.data_loader import DataLoader
+from app.utils.data_loader import DataLoader, StaleDataError
+from app.utils.data_reload import DataVersionMiddleware, start_data_watcher
 
 app = FastAPI(title="Caffinet Backend")
 
@@ -17,6 +23,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Cada petición usa de principio a fin una sola versión de los datos (ver /admin/data/reload)
+app.add_middleware(DataVersionMiddleware)
+
+
+@app.exception_handler(StaleDataError)
+def on_stale_data(request: Request, exc: StaleDataError):
+    # La versión de esta petición ya no puede leer los CSV (han cambiado): se pide
+    # una recarga (si sigue siendo la vigente) y el cliente reintenta con la nueva
+    DataLoader().reload_if_current(exc.data_version, "stale")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Datos en recarga: {exc}"},
+        headers={"Retry-After": "1"},
+    )
+
 
 # Inicializa la base de datos y crea tablas si no existen
 init_db()
@@ -36,6 +57,8 @@ from app.routers import (
     favoritos,
     calificaciones,
     historial_busquedas,
+    debug,
+    admin,
 )
 
 # Routers de datasets
@@ -65,6 +88,8 @@ app.include_router(
 )
 app.include_router(historial_busquedas.router, prefix="/historial", tags=["Historial"])
 app.include_router(discover.router)
+app.include_router(debug.router, prefix="/debug", tags=["Debug"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 
 # ==========================
 # Seeding automático de cafeterias
@@ -114,6 +139,17 @@ def seed_cafeterias_if_empty():
 def on_startup():
     # Se ejecuta automáticamente al levantar el backend
     seed_cafeterias_if_empty()
+    # Recarga automática de los datasets si cambian los CSV (DATA_WATCH_INTERVAL_SECONDS)
+    app.state.data_watcher = start_data_watcher()
+    startup_report.mark_ready()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # Puede no existir si el arranque falló antes de crearlo
+    data_watcher = getattr(app.state, "data_watcher", None)
+    if data_watcher is not None:
+        data_watcher.stop()
 
 
 @app.get("/")
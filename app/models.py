@@ -1,12 +1,12 @@
 # app/models.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, validator
 from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Enum, TIMESTAMP
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
 from app.database import Base
-from pydantic import BaseModel
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+from app.utils.schedule_index import cafe_local_time
 
 # --------------------------
 # Historial de búsquedas
@@ -123,14 +123,45 @@ class Favorito(Base):
 
 # --- Entradas (Input) ---
 
+def _validate_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    # `abierto_en` no válido: 422 en lugar de ignorar el filtro de horario
+    if filters.get('abierto_en') is not None:
+        try:
+            cafe_local_time(filters['abierto_en'])
+        except ValueError:
+            raise ValueError("abierto_en debe ser una fecha ISO 8601 (p.ej. 2025-06-02T15:30)")
+    return filters
+
 class UserLocation(BaseModel):
     latitude: float
     longitude: float
 
 class OptimalRouteRequest(BaseModel):
-    algorithm: str # Dijkstra, Floyd-Warshall, Bellman-Ford
+    algorithm: str # Dijkstra, Floyd-Warshall, Bellman-Ford, SPFA, Directo
     user_location: UserLocation
     filters: Dict[str, Any] # Tags, precios, etc.
+    top_k: int = Field(20, ge=1, le=100) # Número de cafeterías a devolver (con polyline)
+    include_routes: bool = True # False: responde sin polylines y con un route_token para pedirlos después
+    include_timings: bool = False # True: añade `timings` (ms por etapa) a la respuesta
+    force_algorithm: bool = False # True: ejecuta `algorithm` aunque el grafo sea una estrella (sin ranking directo)
+
+    _check_filters = validator('filters', allow_reuse=True)(_validate_filters)
+
+class BatchOptimalRouteRequest(BaseModel):
+    origins: List[UserLocation] = Field(..., min_items=1, max_items=1000) # Ubicaciones de usuario, mismos filtros
+    filters: Dict[str, Any] # Tags, precios, etc.
+    top_k: int = Field(20, ge=1, le=100) # Cafeterías por origen (sin polylines)
+
+    _check_filters = validator('filters', allow_reuse=True)(_validate_filters)
+
+class CafeCrawlRequest(BaseModel):
+    user_location: UserLocation
+    filters: Dict[str, Any] = {} # Mismos filtros que optimal_route; se aplican a todas las paradas
+    stops: int = Field(3, ge=2, le=8) # Número de cafeterías de cada ruta
+    beam_width: int = Field(20, ge=1, le=200) # Rutas parciales que se conservan en cada paso
+    top_k: int = Field(3, ge=1, le=20) # Número de rutas a devolver
+
+    _check_filters = validator('filters', allow_reuse=True)(_validate_filters)
 
 # --- Salidas (Output) ---
 
@@ -147,4 +178,33 @@ class OptimalRouteResultSchema(BaseModel):
     ordered_cafeterias: List[CafeRouteItemSchema]
     selected_algorithm: str
     big_o_notation: str
+    processing_time_ms: int
+    route_token: Optional[str] = None # Para GET /discover/routes/{route_token} (si include_routes=False)
+    timings: Optional[Dict[str, float]] = None # ms por etapa (si include_timings=True)
+
+class BatchOriginResultSchema(BaseModel):
+    user_location: UserLocation
+    ordered_cafeterias: List[CafeRouteItemSchema]
+
+class BatchOptimalRouteResultSchema(BaseModel):
+    results: List[BatchOriginResultSchema] # En el mismo orden que `origins`
+    big_o_notation: str
+    processing_time_ms: int
+
+class CafeCrawlStopSchema(BaseModel):
+    cafeteria_id: int
+    name: str
+    latitude: float
+    longitude: float
+    leg_distance_km: float # Desde la parada anterior (o desde el usuario en la primera)
+    preference_cost: float
+
+class CafeCrawlRouteSchema(BaseModel):
+    stops: List[CafeCrawlStopSchema]
+    total_cost: float
+    total_distance_km: float
+
+class CafeCrawlResultSchema(BaseModel):
+    routes: List[CafeCrawlRouteSchema]
+    big_o_notation: str
     processing_time_ms: int
\ No newline at end of file
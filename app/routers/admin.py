@@ -0,0 +1,48 @@
+# routers/admin.py
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from app.utils.data_loader import DataLoader, DataReloadError
+
+router = APIRouter()
+
+# Token de las operaciones de administración (cabecera X-Admin-Token); sin él quedan deshabilitadas
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def _check_admin_token(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Operaciones de administración deshabilitadas (ADMIN_TOKEN vacío).")
+    if token is None or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="X-Admin-Token inválido.")
+
+
+@router.post("/data/reload")
+def reload_data(
+    wait: bool = Query(False, description="Esperar a que la versión nueva esté publicada"),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Recarga los datasets de app/data sin reiniciar el servicio. La versión
+    nueva se construye en segundo plano y se publica de forma atómica: las
+    peticiones en curso terminan con la anterior. Con `wait=true` responde
+    cuando la versión nueva ya está publicada (o con 422 si no es válida).
+    """
+    _check_admin_token(x_admin_token)
+    data_loader = DataLoader()
+    if wait:
+        try:
+            data_loader.reload("admin")
+        except DataReloadError as e:
+            raise HTTPException(status_code=422, detail=f"Recarga rechazada: {e}")
+    else:
+        data_loader.reload_in_background("admin")
+    return data_loader.reload_status()
+
+
+@router.get("/data/status")
+def get_data_status(x_admin_token: Optional[str] = Header(None)):
+    """Versión de los datos vigente, si hay una recarga en curso y el resultado de la última."""
+    _check_admin_token(x_admin_token)
+    return DataLoader().reload_status()
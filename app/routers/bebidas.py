@@ -5,7 +5,6 @@ router = APIRouter()
 
 # Obtener la instancia Singleton
 data_loader = DataLoader()
-DF_BEBIDAS = data_loader.df_bebidas
 
 @router.get("/")
 def get_bebidas(
@@ -17,7 +16,7 @@ def get_bebidas(
     """
     Devuelve todas las bebidas con filtros opcionales.
     """
-    df = DF_BEBIDAS.copy()
+    df = data_loader.df_bebidas.copy()
 
     if categoria:
         df = df[df["Categoría"].str.lower() == categoria.lower()]
@@ -32,7 +31,8 @@ def get_bebidas(
 
 @router.get("/{bebida_id}")
 def get_bebida(bebida_id: int):
-    df = DF_BEBIDAS[DF_BEBIDAS["id_tipo_bebida"] == bebida_id]
+    df_bebidas = data_loader.df_bebidas
+    df = df_bebidas[df_bebidas["id_tipo_bebida"] == bebida_id]
     if df.empty:
         return {"message": "Bebida no encontrada"}
     return df.iloc[0].to_dict()
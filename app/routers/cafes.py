@@ -5,11 +5,10 @@ router = APIRouter()
 
 # Obtener la instancia Singleton
 data_loader = DataLoader()
-DF_CAFES = data_loader.df_cafes
 
 @router.get("/")
 def get_cafes(pais: str = None, variedad: str = None):
-    df = DF_CAFES.copy()
+    df = data_loader.df_cafes.copy()
     if pais:
         df = df[df["pais"].str.lower() == pais.lower()]
     if variedad:
@@ -18,7 +17,8 @@ def get_cafes(pais: str = None, variedad: str = None):
 
 @router.get("/{cafe_id}")
 def get_cafe(cafe_id: int):
-    df = DF_CAFES[DF_CAFES["id_cafes"] == cafe_id]
+    df_cafes = data_loader.df_cafes
+    df = df_cafes[df_cafes["id_cafes"] == cafe_id]
     if df.empty:
         return {"message": "Café no encontrado"}
     return df.iloc[0].to_dict()
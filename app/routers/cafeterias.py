@@ -7,17 +7,13 @@ from typing import Optional
 
 router = APIRouter(prefix="/cafeterias", tags=["Cafeterias"])
 
-# 1. Instancia Singleton para acceder a los datos
-data_loader = DataLoader() 
-
-# 2. Acceso a los DataFrames con los nombres CORRECTOS
-# Ahora son data_loader.df_cafeterias y data_loader.df_tags
-DF_CAFETERIAS = data_loader.df_cafeterias 
-DF_TAGS = data_loader.df_tags 
+# Instancia Singleton (los DataFrames se cargan la primera vez que se usan:
+# se leen dentro de cada endpoint, no en variables globales del módulo)
+data_loader = DataLoader()
 
 # --- Función Auxiliar para Limpieza de Tags ---
 def _clean_tags(df_t: pd.DataFrame) -> pd.DataFrame:
-    """Normaliza las columnas booleanas de tags."""
+    """Normaliza las columnas booleanas de tags (el DataLoader ya las carga como bool)."""
     if df_t.empty:
         return df_t
         
@@ -25,7 +21,7 @@ def _clean_tags(df_t: pd.DataFrame) -> pd.DataFrame:
     boolean_cols = ["pet_friendly", "enchufes", "wifi", "terraza"]
     
     for col in boolean_cols:
-        if col in df_clean.columns:
+        if col in df_clean.columns and df_clean[col].dtype != bool:
             df_clean[col] = df_clean[col].astype(str).str.strip().str.lower().isin(["sí", "si"])
             
     return df_clean
@@ -46,8 +42,8 @@ def get_cafeterias(
     """
     Devuelve todas las cafeterías, filtrando opcionalmente por cualquier tag.
     """
-    df = DF_CAFETERIAS.copy()
-    df_t = _clean_tags(DF_TAGS)
+    df = data_loader.df_cafeterias.copy()
+    df_t = _clean_tags(data_loader.df_tags)
 
     # Merge tags
     df = df.merge(df_t, on="cafeteria_id", how="left")
@@ -74,6 +70,30 @@ def get_cafeterias(
     return df.to_dict(orient="records")
 
 
+# -------------------------------------------------------------
+# ENDPOINT: GET /cafeterias/nearby
+# (declarado antes de /{cafeteria_id} para que no se interprete como ID)
+# -------------------------------------------------------------
+@router.get("/nearby")
+def get_cafeterias_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(1.0, gt=0),
+    limit: int = Query(20, ge=1, le=500)
+):
+    """
+    Devuelve las cafeterías más cercanas a (lat, lon) dentro de `radius_km`,
+    ordenadas por distancia. Usa el índice espacial del DataLoader.
+    """
+    positions, distances = data_loader.spatial_index.nearest(lat, lon, radius_km, limit)
+    if len(positions) == 0:
+        return []
+
+    df = data_loader.df_cafeterias.iloc[positions].copy()
+    df["distance_km"] = distances
+    return df.to_dict(orient="records")
+
+
 # -------------------------------------------------------------
 # ENDPOINT: GET /cafeterias/{cafeteria_id}
 # -------------------------------------------------------------
@@ -82,13 +102,14 @@ def get_cafeteria_detail(cafeteria_id: int):
     """
     Devuelve información de una cafetería específica.
     """
-    df_cafeteria = DF_CAFETERIAS[DF_CAFETERIAS["cafeteria_id"] == cafeteria_id].copy()
+    df_cafeterias = data_loader.df_cafeterias
+    df_cafeteria = df_cafeterias[df_cafeterias["cafeteria_id"] == cafeteria_id].copy()
     
     if df_cafeteria.empty:
         return {"message": "Cafetería no encontrada"}
     
     # Merge con tags
-    df_t = _clean_tags(DF_TAGS)
+    df_t = _clean_tags(data_loader.df_tags)
     
     df_cafeteria = df_cafeteria.merge(df_t[df_t['cafeteria_id'] == cafeteria_id], on="cafeteria_id", how="left")
     
@@ -0,0 +1,28 @@
+# routers/debug.py
+from fastapi import APIRouter, Query
+from app.utils.data_loader import DataLoader
+from app.utils.startup import startup_report
+
+router = APIRouter()
+
+
+@router.get("/startup")
+def get_startup_report():
+    """
+    Tiempos de arranque del proceso: importación de cada módulo de la app,
+    tiempo hasta estar listo y qué datasets se han cargado (origen y tiempo).
+    No provoca ninguna carga.
+    """
+    return {**startup_report.snapshot(), "data": DataLoader().load_report()}
+
+
+@router.get("/memory")
+def get_memory_report(load: bool = Query(False, description="Cargar antes todos los datasets")):
+    """
+    Bytes de cada DataFrame cargado (total y por columna, con su dtype) y de
+    los arrays derivados de discover. Por defecto solo informa de lo ya cargado.
+    """
+    data_loader = DataLoader()
+    if load:
+        data_loader.load_all()
+    return data_loader.memory_report()
@@ -5,7 +5,6 @@ router = APIRouter()
 
 # Obtener la instancia Singleton
 data_loader = DataLoader()
-DF_PRODUCTOS = data_loader.df_productos
 
 @router.get("/")
 def get_productos(
@@ -14,12 +13,12 @@ def get_productos(
     precio_min: float = None,
     precio_max: float = None
 ):
-    df = DF_PRODUCTOS.copy()
+    df = data_loader.df_productos.copy()
 
     if tipo:
         df = df[df["tipo"].str.lower() == tipo.lower()]
     if vegano is not None:
-        df = df[df["vegano"].str.lower() == ("sí" if vegano else "no")]
+        df = df[df["vegano"] == vegano]
     if precio_min is not None:
         df = df[df["precio"] >= precio_min]
     if precio_max is not None:
@@ -29,7 +28,8 @@ def get_productos(
 
 @router.get("/{producto_id}")
 def get_producto(producto_id: int):
-    df = DF_PRODUCTOS[DF_PRODUCTOS["id_productos"] == producto_id]
+    df_productos = data_loader.df_productos
+    df = df_productos[df_productos["id_productos"] == producto_id]
     if df.empty:
         return {"message": "Producto no encontrado"}
     return df.iloc[0].to_dict()
@@ -5,22 +5,19 @@ from typing import List, Dict, Any, Optional
 
 router = APIRouter(prefix="/tags", tags=["Tags"])
 
-# 1. Obtener la instancia Singleton y cargar los datos
-data_loader = DataLoader() 
-
-# 2. Acceder al DataFrame como atributo de la instancia
-DF_TAGS = data_loader.df_tags 
+# Instancia Singleton (los DataFrames se cargan la primera vez que se usan)
+data_loader = DataLoader()
 
 # --- Función Auxiliar para Limpieza de Tags ---
 def _clean_tags(df: pd.DataFrame) -> pd.DataFrame:
-    """Normaliza las columnas booleanas de tags de 'sí/no' a True/False."""
+    """Normaliza las columnas booleanas de tags de 'sí/no' a True/False (si no vienen ya como bool)."""
     if df.empty:
         return df.copy()
     
     df_clean = df.copy()
     boolean_cols = ["pet_friendly", "enchufes", "wifi", "terraza"]
     
-    for col in [c for c in boolean_cols if c in df_clean.columns]:
+    for col in [c for c in boolean_cols if c in df_clean.columns and df_clean[c].dtype != bool]:
         # Convierte 'sí/si' a True, cualquier otra cosa a False (incluida NaN)
         df_clean[col] = df_clean[col].apply(
             lambda x: True if str(x).strip().lower() in ["sí", "si"] else False
@@ -38,11 +35,12 @@ def get_tags(cafeteria_id: Optional[int] = Query(None)) -> List[Dict[str, Any]]
     Devuelve los tags de todas las cafeterías o de una específica, 
     convirtiendo los valores 'sí/no' a True/False.
     """
-    if DF_TAGS.empty:
+    df_tags = data_loader.df_tags
+    if df_tags.empty:
         return []
 
     # Aplicamos la limpieza de booleanos al DataFrame original
-    df = _clean_tags(DF_TAGS)
+    df = _clean_tags(df_tags)
     
     if cafeteria_id is not None:
         # Filtrado por ID si se proporciona
@@ -0,0 +1,276 @@
+# app/scripts/benchmark_graph_algorithms.py
+"""
+Benchmark de los algoritmos de grafos de discover sobre grafos sintéticos
+reproducibles (misma semilla = mismos grafos).
+
+Uso (desde la raíz del proyecto):
+
+    python -m app.scripts.benchmark_graph_algorithms
+    python -m app.scripts.benchmark_graph_algorithms --kinds star knn_geo --sizes 100 1000 10000 \\
+        --repeats 5 --json bench.json --csv bench.csv
+
+Para cada (tipo de grafo, tamaño, algoritmo) mide el tiempo de varias
+ejecuciones (percentiles p50/p90/p99), el pico de memoria con tracemalloc y
+comprueba que las distancias desde el origen coinciden con las de Dijkstra.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.csr_graph import CSRGraph
+from app.utils.graph_algorithms import (
+    bellman_ford_algorithm,
+    dijkstra_algorithm,
+    direct_star_algorithm,
+    floyd_warshall_algorithm,
+    spfa_algorithm,
+)
+from app.utils.knn_graph import KNNGraph
+from app.utils.spatial_index import SpatialIndex
+
+Graph = CSRGraph
+
+GRAPH_KINDS = ("star", "knn_geo", "random_sparse", "dense")
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+SOURCE_NODE = 0
+
+# Tolerancia al comparar distancias entre algoritmos (sumas en distinto orden)
+DISTANCE_TOLERANCE = 1e-6
+
+
+# --- Generadores de grafos ---
+
+def _rng(seed: int, kind: str, n: int) -> np.random.Generator:
+    return np.random.default_rng([seed, GRAPH_KINDS.index(kind), n])
+
+
+def _to_graph(n: int, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> Graph:
+    """CSR con nodos 0..n-1, sin bucles (las aristas repetidas se conservan: todos los algoritmos las admiten)."""
+    keep = sources != targets
+    return CSRGraph.from_arrays(np.arange(n), sources[keep], targets[keep], weights[keep])
+
+
+def star_graph(n: int, seed: int) -> Graph:
+    """Como el grafo de discover: solo aristas origen -> resto (distancia + coste de preferencias)."""
+    rng = _rng(seed, "star", n)
+    targets = np.arange(1, n)
+    return _to_graph(n, np.zeros(n - 1, dtype=np.int64), targets, rng.uniform(0.1, 20.0, n - 1))
+
+
+def knn_geo_graph(n: int, seed: int, k: int = 8) -> Graph:
+    """Puntos aleatorios en una ciudad de ~20 x 20 km unidos con sus k vecinos más cercanos (km)."""
+    rng = _rng(seed, "knn_geo", n)
+    lats = -12.05 + rng.uniform(-0.09, 0.09, n)
+    lons = -77.04 + rng.uniform(-0.09, 0.09, n)
+    # Radio de búsqueda según la densidad (~3 veces el radio medio que contiene k puntos)
+    max_km = 3 * float(np.sqrt(k * 400.0 / (np.pi * n)))
+    knn = KNNGraph.build(
+        lats, lons, np.ones(n, dtype=bool), SpatialIndex(lats, lons, cell_deg=0.01), k=k, max_km=max_km
+    )
+    sources = np.repeat(np.arange(n), np.diff(knn.indptr))
+    return _to_graph(n, sources, knn.indices, knn.weights.astype(np.float64))
+
+
+def random_sparse_graph(n: int, seed: int, avg_degree: int = 8) -> Graph:
+    rng = _rng(seed, "random_sparse", n)
+    m = n * avg_degree
+    return _to_graph(n, rng.integers(0, n, m), rng.integers(0, n, m), rng.uniform(0.1, 10.0, m))
+
+
+def dense_graph(n: int, seed: int, density: float = 0.5) -> Graph:
+    rng = _rng(seed, "dense", n)
+    sources, targets = np.nonzero(rng.random((n, n)) < density)
+    return _to_graph(n, sources, targets, rng.uniform(0.1, 10.0, len(sources)))
+
+
+GENERATORS: Dict[str, Callable[[int, int], Graph]] = {
+    "star": star_graph,
+    "knn_geo": knn_geo_graph,
+    "random_sparse": random_sparse_graph,
+    "dense": dense_graph,
+}
+
+
+def _estimated_edges(kind: str, n: int) -> int:
+    return {"star": n, "knn_geo": 8 * n, "random_sparse": 8 * n, "dense": n * n // 2}[kind]
+
+
+# --- Algoritmos: todos devuelven {nodo: distancia desde SOURCE_NODE} ---
+
+def _run_dijkstra(graph: Graph, nodes: List[int]) -> Dict[int, float]:
+    return dijkstra_algorithm(graph, SOURCE_NODE)[0]
+
+
+def _run_bellman_ford(graph: Graph, nodes: List[int]) -> Dict[int, float]:
+    return bellman_ford_algorithm(graph, SOURCE_NODE, nodes)[0]
+
+
+def _run_spfa(graph: Graph, nodes: List[int]) -> Dict[int, float]:
+    return spfa_algorithm(graph, SOURCE_NODE, nodes)[0]
+
+
+def _run_direct(graph: Graph, nodes: List[int]) -> Dict[int, float]:
+    return direct_star_algorithm(graph, SOURCE_NODE)[0]
+
+
+def _run_floyd_warshall(graph: Graph, nodes: List[int]) -> Dict[int, float]:
+    return floyd_warshall_algorithm(graph, nodes)[0].row(SOURCE_NODE)
+
+
+ALGORITHMS: Dict[str, Callable[[Graph, List[int]], Dict[int, float]]] = {
+    "dijkstra": _run_dijkstra,
+    "bellman_ford": _run_bellman_ford,
+    "spfa": _run_spfa,
+    "floyd_warshall": _run_floyd_warshall,
+    "direct": _run_direct,
+}
+
+
+# --- Medición ---
+
+def _max_abs_diff(reference: Dict[int, float], result: Dict[int, float]) -> float:
+    """Mayor diferencia entre distancias (inf == inf cuenta como igual; nodo ausente = inf)."""
+    ref = np.array([reference.get(node, np.inf) for node in reference], dtype=np.float64)
+    got = np.array([result.get(node, np.inf) for node in reference], dtype=np.float64)
+    finite = np.isfinite(ref)
+    if (finite != np.isfinite(got)).any():
+        return float("inf")
+    diff = np.abs(ref[finite] - got[finite])
+    return float(diff.max()) if len(diff) else 0.0
+
+
+def benchmark_algorithm(
+    algorithm: Callable[[Graph, List[int]], Dict[int, float]],
+    graph: Graph,
+    nodes: List[int],
+    repeats: int,
+) -> Tuple[Dict[str, Any], Dict[int, float]]:
+    """Tiempos de `repeats` ejecuciones y pico de memoria (en una ejecución aparte con tracemalloc)."""
+    times_ms = []
+    result: Dict[int, float] = {}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = algorithm(graph, nodes)
+        times_ms.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        algorithm(graph, nodes)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times = np.array(times_ms)
+    stats = {
+        "repeats": repeats,
+        "min_ms": float(times.min()),
+        "mean_ms": float(times.mean()),
+        "p50_ms": float(np.percentile(times, 50)),
+        "p90_ms": float(np.percentile(times, 90)),
+        "p99_ms": float(np.percentile(times, 99)),
+        "peak_memory_kb": peak / 1024,
+    }
+    return stats, result
+
+
+def run_benchmarks(
+    kinds: List[str],
+    sizes: List[int],
+    algorithms: List[str],
+    repeats: int,
+    seed: int,
+    max_edges: int,
+) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for kind in kinds:
+        for n in sizes:
+            base = {"graph": kind, "nodes": n, "seed": seed}
+            if _estimated_edges(kind, n) > max_edges:
+                for name in algorithms:
+                    rows.append({**base, "algorithm": name, "status": "skipped: too many edges"})
+                print(f"{kind:>13} n={n:<7} omitido (más de {max_edges} aristas)", flush=True)
+                continue
+
+            graph = GENERATORS[kind](n, seed)
+            nodes = list(range(n))
+            base["edges"] = graph.num_edges
+            # Referencia para comprobar que todos los algoritmos dan las mismas distancias
+            reference = _run_dijkstra(graph, nodes)
+
+            for name in algorithms:
+                row: Dict[str, Any] = {**base, "algorithm": name}
+                try:
+                    stats, result = benchmark_algorithm(ALGORITHMS[name], graph, nodes, repeats)
+                except ValueError as e:
+                    # GraphTooLargeError (Floyd-Warshall) o grafo que no es estrella (direct)
+                    row["status"] = f"skipped: {e}"
+                    rows.append(row)
+                    print(f"{kind:>13} n={n:<7} {name:<15} {row['status']}", flush=True)
+                    continue
+                diff = _max_abs_diff(reference, result)
+                row.update(stats)
+                row["max_abs_diff"] = diff
+                row["matches_reference"] = diff <= DISTANCE_TOLERANCE
+                row["status"] = "ok" if row["matches_reference"] else "MISMATCH"
+                rows.append(row)
+                print(
+                    f"{kind:>13} n={n:<7} {name:<15} p50={row['p50_ms']:10.2f} ms  "
+                    f"p90={row['p90_ms']:10.2f} ms  pico={row['peak_memory_kb']:10.0f} KB  {row['status']}",
+                    flush=True,
+                )
+    return rows
+
+
+CSV_FIELDS = [
+    "graph", "nodes", "edges", "seed", "algorithm", "status", "repeats",
+    "min_ms", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "peak_memory_kb",
+    "max_abs_diff", "matches_reference",
+]
+
+
+def write_csv(rows: List[Dict[str, Any]], path: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_json(rows: List[Dict[str, Any]], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"python": sys.version.split()[0], "numpy": np.__version__, "results": rows}, f, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de los algoritmos de grafos de discover.")
+    parser.add_argument("--kinds", nargs="+", choices=GRAPH_KINDS, default=list(GRAPH_KINDS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--algorithms", nargs="+", choices=list(ALGORITHMS), default=list(ALGORITHMS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--max-edges", type=int, default=2_000_000,
+        help="Se omiten los grafos con más aristas (p.ej. dense con 10^4 nodos o más)",
+    )
+    parser.add_argument("--json", dest="json_path", help="Ruta del resultado en JSON")
+    parser.add_argument("--csv", dest="csv_path", help="Ruta del resultado en CSV")
+    args = parser.parse_args(argv)
+
+    rows = run_benchmarks(args.kinds, args.sizes, args.algorithms, args.repeats, args.seed, args.max_edges)
+    if args.json_path:
+        write_json(rows, args.json_path)
+    if args.csv_path:
+        write_csv(rows, args.csv_path)
+
+    # Código de salida distinto de 0 si algún algoritmo no coincide con la referencia (útil en CI)
+    return 1 if any(row.get("status") == "MISMATCH" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
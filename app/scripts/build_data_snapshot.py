@@ -0,0 +1,58 @@
+# app/scripts/build_data_snapshot.py
+"""
+Regenera (o comprueba) la instantánea binaria que usa el DataLoader al
+arrancar en lugar de volver a leer y procesar los CSV de app/data.
+
+Uso (desde la raíz del proyecto):
+
+    python -m app.scripts.build_data_snapshot            # reconstruye desde los CSV
+    python -m app.scripts.build_data_snapshot --check    # solo indica si es válida
+    python -m app.scripts.build_data_snapshot --snapshot-dir /ruta/compartida
+
+Por defecto usa DATA_SNAPSHOT_DIR (app/data/.snapshot). Conviene ejecutarlo
+en el despliegue, después de actualizar los CSV y antes de arrancar los workers.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from app.utils.data_loader import CSV_FILES, DATA_DIR, DATA_SNAPSHOT_DIR, DataLoader, snapshot_config
+from app.utils.snapshot import SnapshotError, snapshot_status
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Instantánea binaria de los datasets del DataLoader.")
+    parser.add_argument("--snapshot-dir", default=DATA_SNAPSHOT_DIR, help="Directorio de la instantánea")
+    parser.add_argument("--check", action="store_true", help="Solo comprueba si la instantánea es válida")
+    args = parser.parse_args(argv)
+    if not args.snapshot_dir:
+        print("DATA_SNAPSHOT_DIR está vacío: indica --snapshot-dir.")
+        return 2
+    snapshot_dir = Path(args.snapshot_dir)
+
+    if args.check:
+        try:
+            manifest, reason = snapshot_status(snapshot_dir, DATA_DIR, CSV_FILES.values(), snapshot_config())
+        except SnapshotError as e:
+            manifest, reason = None, str(e)
+        if manifest is None:
+            print(f"Instantánea en {snapshot_dir}: no válida ({reason})")
+            return 1
+        print(f"Instantánea en {snapshot_dir}: válida (creada {manifest['created_at']}, {manifest['build']})")
+        return 0
+
+    start = time.perf_counter()
+    loader = DataLoader.from_csv()
+    build_dir = loader.save_snapshot(str(snapshot_dir))
+    if build_dir is None:
+        return 1
+    size_kb = sum(f.stat().st_size for f in build_dir.iterdir()) / 1024
+    print(f"Instantánea escrita en {build_dir} ({size_kb:.0f} KB, {(time.perf_counter() - start) * 1000:.0f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
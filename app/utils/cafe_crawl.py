@@ -0,0 +1,90 @@
+# app/utils/cafe_crawl.py
+import heapq
+import numpy as np
+from typing import Any, Dict, List, Tuple
+from app.utils.cost_calculator import (
+    candidate_positions,
+    data_loader,
+    hard_filter_mask,
+    preference_costs,
+)
+
+# (coste_total, posiciones de las paradas, distancia de cada tramo en km, coste de preferencias de cada parada)
+CrawlRoute = Tuple[float, Tuple[int, ...], Tuple[float, ...], Tuple[float, ...]]
+
+
+def plan_cafe_crawl(
+    user_lat: float,
+    user_lon: float,
+    filters: Dict[str, Any],
+    stops: int,
+    beam_width: int = 20,
+    top_k: int = 3,
+) -> List[CrawlRoute]:
+    """
+    Planifica rutas de `stops` cafeterías distintas ("café crawl") con búsqueda
+    en haz sobre el grafo de vecinas precalculado (`data_loader.knn_graph`).
+
+    El coste de una ruta es, como en discover, la suma de la distancia de cada
+    tramo más el coste de preferencias de cada parada. Todas las paradas deben
+    pasar los filtros duros (incluido `distancia_max_km` respecto al usuario).
+    En cada paso solo se conservan las `beam_width` rutas parciales más baratas.
+
+    Devuelve hasta `top_k` rutas completas, de menor a mayor coste, sin
+    repetir el mismo conjunto de cafeterías en otro orden.
+    """
+    # Paradas permitidas y distancia del usuario a cada una (primer tramo)
+    positions, distances = candidate_positions(user_lat, user_lon, filters)
+    mask = hard_filter_mask(filters, positions)
+    positions, distances = positions[mask], distances[mask]
+    if len(positions) == 0:
+        return []
+
+    allowed = np.zeros(len(data_loader.cafeteria_ids), dtype=bool)
+    allowed[positions] = True
+
+    # Coste de preferencias de todas las paradas permitidas (vectorizado, una vez)
+    costs = preference_costs(positions, filters)
+    preference_cost = dict(zip(positions.tolist(), costs.tolist()))
+
+    # Paso 1: mejores primeras paradas desde el usuario
+    beam: List[CrawlRoute] = heapq.nsmallest(
+        beam_width,
+        (
+            (distance + pref, (pos,), (distance,), (pref,))
+            for pos, distance, pref in zip(positions.tolist(), distances.tolist(), costs.tolist())
+        ),
+    )
+
+    # Pasos siguientes: extender cada ruta parcial con las vecinas de su última parada
+    knn_graph = data_loader.knn_graph
+    for _ in range(stops - 1):
+        # Mejor ruta parcial por (conjunto de paradas, última parada): el resto no puede acabar mejor
+        best: Dict[Tuple[frozenset, int], CrawlRoute] = {}
+        for cost, path, legs, prefs in beam:
+            neighbors, weights = knn_graph.neighbors(path[-1])
+            for pos, distance in zip(neighbors.tolist(), weights.tolist()):
+                if not allowed[pos] or pos in path:
+                    continue
+                pref = preference_cost[pos]
+                candidate = (cost + distance + pref, path + (pos,), legs + (distance,), prefs + (pref,))
+                key = (frozenset(candidate[1]), pos)
+                if key not in best or candidate[0] < best[key][0]:
+                    best[key] = candidate
+        beam = heapq.nsmallest(beam_width, best.values())
+        if not beam:
+            return []
+
+    # Resultado: una sola ruta por conjunto de cafeterías
+    routes: List[CrawlRoute] = []
+    seen = set()
+    for route in sorted(beam):
+        stops_set = frozenset(route[1])
+        if stops_set in seen:
+            continue
+        seen.add(stops_set)
+        routes.append(route)
+        if len(routes) == top_k:
+            break
+    return routes
+
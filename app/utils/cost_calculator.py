@@ -1,42 +1,61 @@
 # app/utils/cost_calculator.py
-from typing import Dict, List, Any, Tuple
-from math import radians, sin, cos, sqrt, atan2
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from app.utils.csr_graph import CSRGraph
 from app.utils.data_loader import DataLoader # Asumo que tienes un DataLoader
-import requests
-import polyline
-
-# Carga la Data (deberías tener una instancia Singleton de tu DataLoader)
+from app.utils.geo import haversine_many
+from app.utils.menu_index import bitset_to_mask
+from app.utils.route_cache import RouteCache
+from app.utils.route_providers import RouteProvider, provider_from_env
+from app.utils.schedule_index import cafe_local_time
+from app.utils.timing import StageTimer
+
+# Instancia Singleton del DataLoader: los datos se cargan la primera vez que se usan
+# (se leen siempre como data_loader.<atributo>, nunca en variables globales del módulo)
 data_loader = DataLoader()
-COFFEE_DATA = data_loader.cafe_data
-CAFETERIA_DATA = data_loader.cafeterias_data
-TAGS_DATA = data_loader.tags_data
-# DataFrames útiles para filtros
-DF_HORARIOS = data_loader.df_horarios
-DF_PRODUCTOS = data_loader.df_productos
-CAFETERIAS_PRODUCTOS_DF = data_loader.cafeterias_productos_data
-CAFES_BEBIDAS_DF = data_loader.cafes_bebidas_data
-DF_BEBIDAS = data_loader.df_bebidas
-# Añade aquí más data: BEBIDAS_DATA, PRODUCTOS_DATA, etc.
 
-# --- Constante de Distancia (Radio de la Tierra en km) ---
-R = 6371.0
+# Caché de polylines (memoria + SQLite opcional), configurada por variables de entorno
+route_cache = RouteCache.from_env()
 
-# --- OSRM para obtener polylines ---
-OSRM_URL = "http://router.project-osrm.org/route/v1/driving" 
+# Descarga concurrente de rutas: hilos acotados + sesión HTTP con conexiones keep-alive
+ROUTE_FETCH_WORKERS = int(os.getenv("ROUTE_FETCH_WORKERS", "8"))
+ROUTE_FETCH_DEADLINE_SECONDS = float(os.getenv("ROUTE_FETCH_DEADLINE_SECONDS", "8"))
+ROUTE_REQUEST_TIMEOUT_SECONDS = 5
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calcula la distancia Haversine entre dos puntos en kilómetros."""
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+# Ranking por lotes: celdas (orígenes x cafeterías) por bloque de la matriz de distancias (~16 MB en float64)
+DISCOVER_BATCH_CHUNK_ELEMENTS = int(os.getenv("DISCOVER_BATCH_CHUNK_ELEMENTS", "2000000"))
 
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
+_route_executor = ThreadPoolExecutor(max_workers=ROUTE_FETCH_WORKERS, thread_name_prefix="route-fetch")
 
-    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+# Proveedor de rutas: ROUTE_PROVIDER=osrm (OSRM_URL) o ROUTE_PROVIDER=local (red vial en ROAD_GRAPH_DIR).
+# Se crea en la primera ruta pedida (ver get_route_provider)
+_route_provider: Optional[RouteProvider] = None
+_route_provider_lock = threading.Lock()
 
-    distance = R * c
-    return distance
+
+def get_route_provider() -> RouteProvider:
+    """
+    Proveedor de rutas, creado la primera vez que se necesita con una sesión
+    HTTP keep-alive: `requests` (y `polyline`) solo se importan si se piden rutas.
+    """
+    global _route_provider
+    if _route_provider is None:
+        with _route_provider_lock:
+            if _route_provider is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=ROUTE_FETCH_WORKERS))
+                session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=ROUTE_FETCH_WORKERS))
+                _route_provider = provider_from_env(session=session, timeout=ROUTE_REQUEST_TIMEOUT_SECONDS)
+    return _route_provider
 
 
 def _tag_true(value: Any) -> bool:
@@ -47,96 +66,33 @@ def _tag_true(value: Any) -> bool:
     return s.startswith('s') or s in ('si', 'sí', 'true', '1', 'y', 'yes')
 
 
-def _weekday_name_spanish(dt: datetime) -> str:
-    # Map Python weekday (0=Lunes) to Spanish names used in dataset
-    mapping = {
-        0: 'lunes', 1: 'martes', 2: 'miercoles', 3: 'jueves', 4: 'viernes', 5: 'sabado', 6: 'domingo'
-    }
-    return mapping[dt.weekday()]
-
-
 def is_open_now(cafeteria_id: int, now: datetime = None) -> bool:
-    """Determina si una cafetería está abierta ahora usando `DF_HORARIOS`.
+    """Determina si una cafetería está abierta ahora (o en `now`) usando el
+    horario semanal compilado por el DataLoader a partir de `df_horarios`.
 
-    La columna `dias_abre` suele contener rangos como 'Lunes-Sabado' o listados;
-    esta función hace una comprobación conservadora: si alguna fila para la cafetería
-    incluye el día actual y las horas contienen valores válidos, intentamos evaluar.
+    La columna `dias_abre` contiene rangos como 'Lunes-Sabado' o listados; si
+    no se reconoce se asume que abre todos los días. Las cafeterías sin
+    horario se consideran abiertas.
     """
-    if DF_HORARIOS is None or DF_HORARIOS.empty:
-        return True
     if now is None:
-        now = datetime.now()
+        now = cafe_local_time()
 
-    try:
-        df = DF_HORARIOS
-        rows = df[df['cafeteria_id'] == cafeteria_id]
-        if rows.empty:
-            return True
-
-        weekday = _weekday_name_spanish(now)
-        current_minutes = now.hour * 60 + now.minute
-
-        for _, r in rows.iterrows():
-            dias = str(r.get('dias_abre', '')).lower()
-            if weekday not in dias and '-' not in dias and weekday not in dias.split(','):
-                # si no menciona el día explícitamente, ignoramos esta fila
-                continue
-
-            try:
-                apertura = str(r.get('hora_apertura', '')).strip()
-                cierre = str(r.get('hora_cierre', '')).strip()
-                if not apertura or not cierre:
-                    continue
-                # Formato esperado HH:MM
-                ah, am = map(int, apertura.split(':'))
-                ch, cm = map(int, cierre.split(':'))
-                apertura_min = ah * 60 + am
-                cierre_min = ch * 60 + cm
-
-                # si cierre < apertura asumimos horario pasado la medianoche
-                if cierre_min < apertura_min:
-                    # abierto si ahora >= apertura o ahora <= cierre
-                    if current_minutes >= apertura_min or current_minutes <= cierre_min:
-                        return True
-                else:
-                    if apertura_min <= current_minutes <= cierre_min:
-                        return True
-            except Exception:
-                # Si falla parseo, consideramos esa fila no válida y seguimos
-                continue
-
-        # Si ninguna fila indica abierto ahora, devolvemos False
-        return False
-    except Exception:
+    pos = data_loader.cafeteria_pos.get(cafeteria_id)
+    if pos is None:
         return True
+    return data_loader.schedule_index.is_open(pos, now)
 
 
 def has_vegan_option(cafeteria_id: int) -> bool:
-    """Comprueba de forma básica si la cafetería ofrece productos catalogados como veganos."""
-    try:
-        if CAFETERIAS_PRODUCTOS_DF is None or CAFETERIAS_PRODUCTOS_DF.empty or DF_PRODUCTOS is None or DF_PRODUCTOS.empty:
-            return False
-
-        rel = CAFETERIAS_PRODUCTOS_DF
-        prod_ids = rel[rel['cafeteria_id'] == cafeteria_id]['producto_id'].unique()
-        if len(prod_ids) == 0:
-            return False
-
-        prods = DF_PRODUCTOS[DF_PRODUCTOS['producto_id'].isin(prod_ids)]
-        if prods.empty:
-            return False
-
-        # Buscamos en columnas descriptivas palabras 'vegano' o 'vegan'
-        for col in prods.columns:
-            try:
-                if prods[col].astype(str).str.lower().str.contains('vegano|vegan').any():
-                    return True
-            except Exception:
-                continue
-
-        return False
-    except Exception:
+    """
+    Comprueba si la cafetería ofrece algún producto catalogado como vegano
+    (columna `vegano` = 'sí' en df_productos), con el indicador que el
+    DataLoader precalcula al cargar los datos.
+    """
+    pos = data_loader.cafeteria_pos.get(cafeteria_id)
+    if pos is None:
         return False
+    return bool(data_loader.vegan_flags[pos])
 
 # --- Lógica de Ponderación de Preferencias ---
 
@@ -150,7 +106,7 @@ def calculate_preference_cost(cafeteria_id: int, filters: Dict[str, Any]) -> flo
     """
     coste = 0.0
 
-    tag_data = TAGS_DATA.get(cafeteria_id, {}) or {}
+    tag_data = data_loader.tags_data.get(cafeteria_id, {}) or {}
 
     # Hard/soft tag-based preferences
     # Si el usuario pide pet_friendly y la cafetería no lo es -> excluir (handled in prefilter)
@@ -178,175 +134,245 @@ def calculate_preference_cost(cafeteria_id: int, filters: Dict[str, Any]) -> flo
             coste += 5.0
 
     # Variedad de cafe (ejemplo de beneficio)
-    if filters.get('variedad_cafe') and filters.get('variedad_cafe') == COFFEE_DATA.get(cafeteria_id, {}).get('variedad'):
+    if filters.get('variedad_cafe') and filters.get('variedad_cafe') == data_loader.cafe_data.get(cafeteria_id, {}).get('variedad'):
         coste -= 2.0
 
     return coste
 
+def _category_mask(category_codes: Tuple[np.ndarray, pd.Index], value: Any) -> np.ndarray:
+    """Array booleano: qué cafeterías tienen exactamente `value` en la columna categórica."""
+    codes, categories = category_codes
+    try:
+        if value not in categories:
+            return np.zeros(len(codes), dtype=bool)
+    except TypeError:
+        # Valores no hashables (p.ej. listas) nunca coinciden, como con `==`
+        return np.zeros(len(codes), dtype=bool)
+    return codes == categories.get_loc(value)
+
+
+def preference_costs(positions: np.ndarray, filters: Dict[str, Any]) -> np.ndarray:
+    """
+    Versión vectorizada de `calculate_preference_cost` para las cafeterías en
+    `positions` (posiciones en `data_loader.cafeteria_ids`): mismos
+    ajustes y en el mismo orden, así que el resultado es idéntico.
+    """
+    costs = np.zeros(len(positions), dtype=np.float64)
+
+    if filters.get('pet_friendly', False):
+        costs += np.where(data_loader.tag_flags['pet_friendly'][positions], 0.0, 5.0)
+
+    # Soft preferences: tipo_musica, iluminacion, estilo (coincidencia exacta por código categórico)
+    for col, bonus in (('tipo_musica', 1.0), ('iluminacion', 0.8), ('estilo_decorativo', 0.8)):
+        preferred = filters.get(col)
+        if preferred:
+            costs -= np.where(_category_mask(data_loader.soft_tag_codes[col], preferred)[positions], bonus, 0.0)
+
+    if filters.get('vegano', False):
+        costs += np.where(data_loader.vegan_flags[positions], -1.5, 5.0)
+
+    preferred_variedad = filters.get('variedad_cafe')
+    if preferred_variedad:
+        costs -= np.where(_category_mask(data_loader.variedad_codes, preferred_variedad)[positions], 2.0, 0.0)
+
+    return costs
+
+# --- Filtros Duros Vectorizados ---
+
+def _as_lower_list(value: Any) -> List[str]:
+    """Normaliza un filtro que puede ser un valor suelto o una lista."""
+    values = value if isinstance(value, (list, tuple)) else [value]
+    return [str(v).strip().lower() for v in values]
+
+
+def _max_distance_km(filters: Dict[str, Any]) -> Any:
+    """Valor numérico de `distancia_max_km`, o None si no se pidió o no es válido."""
+    max_distance_km = filters.get('distancia_max_km')
+    if max_distance_km is None:
+        return None
+    try:
+        max_km = float(max_distance_km)
+    except Exception:
+        return None
+    return None if np.isnan(max_km) else max_km
+
+
+def candidate_positions(user_lat: float, user_lon: float, filters: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Devuelve (posiciones, distancias_km) de las cafeterías con coordenadas que
+    cumplen el filtro `distancia_max_km`. Con radio se usa el índice espacial,
+    así que solo se calculan distancias para las celdas cercanas.
+    Las posiciones se devuelven en el orden del dataset.
+    """
+    max_km = _max_distance_km(filters)
+    if max_km is not None:
+        positions, distances = data_loader.spatial_index.query_radius(user_lat, user_lon, max_km)
+        order = np.argsort(positions)
+        return positions[order], distances[order]
+
+    positions = np.flatnonzero(data_loader.coords_valid)
+    distances = haversine_many(
+        user_lat, user_lon, data_loader.cafeteria_lat[positions], data_loader.cafeteria_lon[positions]
+    )
+    return positions, distances
+
+
+def hard_filter_mask(filters: Dict[str, Any], positions: np.ndarray) -> np.ndarray:
+    """
+    Evalúa los filtros duros (tags, precio, categoría de bebida, tipo de
+    producto y horario: `abierto_ahora` o `abierto_en`) como una única máscara booleana alineada con
+    `positions` (posiciones en `data_loader.cafeteria_ids`). El filtro de
+    distancia ya lo aplica `candidate_positions`.
+    """
+    mask = np.ones(len(positions), dtype=bool)
+
+    # Tag checks (hard filters)
+    for tag, flags in data_loader.tag_flags.items():
+        if filters.get(tag):
+            mask &= flags[positions]
+
+    # Filtros de menú como intersección de bitsets (una sola pasada por cafetería al final)
+    # - precio: 'barato','medio','caro' (cadena o lista)
+    # - categoria_bebida: columna 'categoria' de df_bebidas (p.ej. 'Café', 'Bebidas Espresso Clásicas')
+    # - tipos_producto: columna 'tipo' de df_productos (ej. 'postre','comida','bebida')
+    menu_bits = None
+    for key, index in (
+        ('precio', data_loader.precio_index),
+        ('categoria_bebida', data_loader.categoria_bebida_index),
+        ('tipos_producto', data_loader.tipo_producto_index),
+    ):
+        if filters.get(key):
+            bits = index.any_of(_as_lower_list(filters[key]))
+            menu_bits = bits if menu_bits is None else menu_bits & bits
+    if menu_bits is not None:
+        mask &= bitset_to_mask(menu_bits, len(data_loader.cafeteria_ids))[positions]
+
+    # Horarios: abierto_ahora / abierto_en (hora local de la cafetería) en una sola lectura del bitmap semanal.
+    # `abierto_en` ya viene validado por el modelo de la petición (si no es ISO 8601, ValueError)
+    if filters.get('abierto_ahora', False):
+        mask &= data_loader.schedule_index.open_mask(cafe_local_time(), positions)
+    if filters.get('abierto_en') is not None:
+        mask &= data_loader.schedule_index.open_mask(cafe_local_time(filters['abierto_en']), positions)
+
+    return mask
+
 # --- Constructor del Grafo ---
 
 def build_preference_graph(
     user_lat: float, 
     user_lon: float, 
-    filters: Dict[str, Any]
-) -> Tuple[Dict[int, Dict[int, float]], List[int], int]:
+    filters: Dict[str, Any],
+    timer: StageTimer = None
+) -> Tuple[CSRGraph, List[int], int, Dict[int, float]]:
     """
     Construye el grafo de cafeterías con el usuario como nodo central.
     El peso de la arista es (Distancia + Coste de Preferencia).
+    El grafo es un CSRGraph (`graph.to_dict()` da el formato anterior).
+
+    Devuelve también {cafeteria_id: distancia_km} de los candidatos, para que
+    el llamador no tenga que volver a calcular las distancias.
+    Con `timer`, mide por separado las etapas "filter" y "graph_build".
     """
-    
-    # 1. Filtra las cafeterías según las preferencias iniciales (hard-filters)
-    candidate_cafeterias = {}
+    timer = timer or StageTimer()
 
-    max_distance_km = filters.get('distancia_max_km')
-    abierto_req = filters.get('abierto_ahora', False)
-
-    for cafeteria_id, cafe_data in CAFETERIA_DATA.items():
-        # Ignorar si faltan coordenadas
-        if 'latitude' not in cafe_data or 'longitude' not in cafe_data:
-            continue
-
-        # Tag checks (hard filters)
-        tag_data = TAGS_DATA.get(cafeteria_id, {}) or {}
-        if filters.get('wifi') and not _tag_true(tag_data.get('wifi')):
-            continue
-        if filters.get('terraza') and not _tag_true(tag_data.get('terraza')):
-            continue
-        if filters.get('enchufes') and not _tag_true(tag_data.get('enchufes')):
-            continue
-        if filters.get('pet_friendly') and not _tag_true(tag_data.get('pet_friendly')):
-            continue
-
-        # Distance filter (hard)
-        cafe_lat = cafe_data['latitude'] / 10**7
-        cafe_lon = cafe_data['longitude'] / 10**7
-        distance = haversine_distance(user_lat, user_lon, cafe_lat, cafe_lon)
-        if max_distance_km is not None:
-            try:
-                if float(distance) > float(max_distance_km):
-                    continue
-            except Exception:
-                pass
-
-        # Horarios: abierto_ahora
-        if abierto_req:
-            if not is_open_now(cafeteria_id):
-                continue
-
-        # --- Filtros sobre precio / bebidas / productos (hard filters) ---
-        # Precio: 'precio' puede ser una cadena o lista con valores 'barato','medio','caro'
-        precio_filter = filters.get('precio')
-        if precio_filter:
-            wanted = precio_filter if isinstance(precio_filter, (list, tuple)) else [precio_filter]
-            wanted = [str(w).strip().lower() for w in wanted]
-            has_category = False
-            try:
-                # Revisar bebidas
-                if CAFES_BEBIDAS_DF is not None and not CAFES_BEBIDAS_DF.empty:
-                    rel = CAFES_BEBIDAS_DF
-                    rows = rel[rel['cafeteria_id'] == cafeteria_id]
-                    if not rows.empty and 'categoria' in rows.columns:
-                        categorias = rows['categoria'].astype(str).str.lower().unique()
-                        if any(w in categorias for w in wanted):
-                            has_category = True
-                # Revisar productos si no encontrado en bebidas
-                if not has_category and CAFETERIAS_PRODUCTOS_DF is not None and not CAFETERIAS_PRODUCTOS_DF.empty:
-                    relp = CAFETERIAS_PRODUCTOS_DF
-                    rows_p = relp[relp['cafeteria_id'] == cafeteria_id]
-                    if not rows_p.empty and 'categoria' in rows_p.columns:
-                        categorias_p = rows_p['categoria'].astype(str).str.lower().unique()
-                        if any(w in categorias_p for w in wanted):
-                            has_category = True
-            except Exception:
-                has_category = False
-
-            if not has_category:
-                continue
-
-        # Categoria de bebida: filtra por la columna 'categoria' en df_bebidas (p.ej. 'Caf�', 'Bebidas Espresso Cl�sicas')
-        bebida_categoria = filters.get('categoria_bebida')
-        if bebida_categoria:
-            wanted_b = bebida_categoria if isinstance(bebida_categoria, (list, tuple)) else [bebida_categoria]
-            wanted_b = [str(w).strip().lower() for w in wanted_b]
-            has_b_cat = False
-            try:
-                if CAFES_BEBIDAS_DF is not None and not CAFES_BEBIDAS_DF.empty and DF_BEBIDAS is not None and not DF_BEBIDAS.empty:
-                    rel = CAFES_BEBIDAS_DF
-                    bebida_ids = rel[rel['cafeteria_id'] == cafeteria_id]['bebida_id'].unique()
-                    if len(bebida_ids) > 0:
-                        # columna de id en DF_BEBIDAS: intentar detectar nombre (id_tipo_bebida o id)
-                        id_cols = [c for c in DF_BEBIDAS.columns if 'id' in c]
-                        if id_cols:
-                            id_col = id_cols[0]
-                            matches = DF_BEBIDAS[DF_BEBIDAS[id_col].isin(bebida_ids)]
-                            if not matches.empty and 'categoria' in matches.columns:
-                                cats = matches['categoria'].astype(str).str.lower().unique()
-                                if any(w in cats for w in wanted_b):
-                                    has_b_cat = True
-            except Exception:
-                has_b_cat = False
-
-            if not has_b_cat:
-                continue
-
-        # Tipos de producto: filtra por DF_PRODUCTOS['tipo'] (ej. 'postre','comida','bebida')
-        tipos_producto = filters.get('tipos_producto')
-        if tipos_producto:
-            wanted_t = tipos_producto if isinstance(tipos_producto, (list, tuple)) else [tipos_producto]
-            wanted_t = [str(w).strip().lower() for w in wanted_t]
-            has_tipo = False
-            try:
-                if CAFETERIAS_PRODUCTOS_DF is not None and not CAFETERIAS_PRODUCTOS_DF.empty and DF_PRODUCTOS is not None and not DF_PRODUCTOS.empty:
-                    relp = CAFETERIAS_PRODUCTOS_DF
-                    producto_ids = relp[relp['cafeteria_id'] == cafeteria_id]['producto_id'].unique()
-                    if len(producto_ids) > 0:
-                        # columna id en DF_PRODUCTOS: buscar 'id_productos' o similar
-                        id_cols_p = [c for c in DF_PRODUCTOS.columns if 'id' in c]
-                        if id_cols_p:
-                            id_col_p = id_cols_p[0]
-                            matches_p = DF_PRODUCTOS[DF_PRODUCTOS[id_col_p].isin(producto_ids)]
-                            if not matches_p.empty and 'tipo' in matches_p.columns:
-                                tipos = matches_p['tipo'].astype(str).str.lower().unique()
-                                if any(w in tipos for w in wanted_t):
-                                    has_tipo = True
-            except Exception:
-                has_tipo = False
-
-            if not has_tipo:
-                continue
-
-        candidate_cafeterias[cafeteria_id] = cafe_data
-    
+    with timer.stage("filter"):
+        # 0. Candidatas por distancia (índice espacial) con su distancia física, calculada una sola vez
+        positions, distances = candidate_positions(user_lat, user_lon, filters)
+
+        # 1. Filtra las cafeterías según las preferencias iniciales (hard-filters)
+        mask = hard_filter_mask(filters, positions)
+        positions, distances = positions[mask], distances[mask]
+
+    with timer.stage("graph_build"):
+        return _star_graph(positions, distances, filters)
+
+
+def _star_graph(
+    positions: np.ndarray,
+    distances: np.ndarray,
+    filters: Dict[str, Any]
+) -> Tuple[CSRGraph, List[int], int, Dict[int, float]]:
+    """Grafo estrella usuario -> cafeterías candidatas (ya filtradas), en formato CSR."""
     # ID especial para el nodo de origen del usuario
     USER_NODE_ID = 0 
-    
-    # Inicializa el grafo
-    graph: Dict[int, Dict[int, float]] = {USER_NODE_ID: {}}
-    nodes = [USER_NODE_ID]
 
-    for cafeteria_id, cafe_data in candidate_cafeterias.items():
-        nodes.append(cafeteria_id)
+    cafeteria_ids = data_loader.cafeteria_ids[positions]
+    ids = cafeteria_ids.tolist()
+
+    # 1. Distancia física
+    distances_km: Dict[int, float] = dict(zip(ids, distances.tolist()))
+
+    # 2. Coste de preferencias (vectorizado)
+    costs = preference_costs(positions, filters)
 
-        cafe_lat = cafe_data['latitude'] / 10**7 # Denormalizar Lat/Lon (datos estan en 10^7)
-        cafe_lon = cafe_data['longitude'] / 10**7
+    # 3. Peso Total de la Arista (Coste = Distancia + Penalización/Beneficio)
+    # Solo aristas del usuario a cada cafetería (rutas de varias paradas: ver cafe_crawl)
+    graph = CSRGraph.star(USER_NODE_ID, cafeteria_ids, distances + costs)
 
-        # 1. Distancia física
-        distance = haversine_distance(user_lat, user_lon, cafe_lat, cafe_lon)
+    return graph, [USER_NODE_ID] + ids, USER_NODE_ID, distances_km
 
-        # 2. Coste de preferencias
-        preference_cost = calculate_preference_cost(cafeteria_id, filters)
 
-        # 3. Peso Total de la Arista (Coste = Distancia + Penalización/Beneficio)
-        total_weight = distance + preference_cost
+# --- Ranking por lotes (muchos orígenes, mismos filtros) ---
 
-        # Añadir la arista del usuario a la cafetería (solo rutas unidireccionales desde el usuario)
-        graph[USER_NODE_ID][cafeteria_id] = total_weight
-        
-        # Opcional: Para Floyd-Warshall y Bellman-Ford,
-        # necesitarías también añadir aristas entre cafeterías si quieres rutas múltiples.
-        # Por ahora, solo rutas desde el usuario.
-        
-    return graph, nodes, USER_NODE_ID
+def rank_many_origins(
+    origins: List[Tuple[float, float]],
+    filters: Dict[str, Any],
+    top_k: int,
+) -> List[List[Tuple[float, int, float]]]:
+    """
+    Top-k de cafeterías para cada origen (lat, lon) con los mismos filtros.
+    Equivale a ejecutar el grafo estrella de `build_preference_graph` por
+    origen (coste = distancia + coste de preferencias), pero:
+
+    - los filtros duros y los costes de preferencias se evalúan una sola vez;
+    - las distancias origen x cafetería se calculan en bloques vectorizados
+      de hasta DISCOVER_BATCH_CHUNK_ELEMENTS celdas;
+    - el top-k de cada fila se elige con `argpartition`, sin ordenar todo.
+
+    Devuelve, por origen, [(coste, cafeteria_id, distancia_km)] de menor a mayor coste.
+    """
+    # 1. Filtros duros (sin el de distancia, que depende del origen) y costes de preferencias, una vez
+    positions = np.flatnonzero(data_loader.coords_valid)
+    positions = positions[hard_filter_mask(filters, positions)]
+    ids = data_loader.cafeteria_ids[positions]
+    lats = data_loader.cafeteria_lat[positions]
+    lons = data_loader.cafeteria_lon[positions]
+    costs_by_cafe = preference_costs(positions, filters)
+    max_km = _max_distance_km(filters)
+
+    n = len(positions)
+    k = min(top_k, n)
+    if k == 0:
+        return [[] for _ in origins]
+
+    origin_coords = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+    rows_per_chunk = max(1, DISCOVER_BATCH_CHUNK_ELEMENTS // n)
+    results: List[List[Tuple[float, int, float]]] = []
+
+    for start in range(0, len(origin_coords), rows_per_chunk):
+        chunk = origin_coords[start:start + rows_per_chunk]
+        # 2. Matriz de distancias del bloque (filas = orígenes, columnas = cafeterías)
+        distances = haversine_many(chunk[:, 0, None], chunk[:, 1, None], lats, lons)
+        costs = distances + costs_by_cafe
+        if max_km is not None:
+            costs[distances > max_km] = np.inf
+
+        # 3. Top-k por fila: partición parcial y orden (coste, id) solo de esos k
+        top = np.argpartition(costs, k - 1, axis=1)[:, :k]
+        top_costs = np.take_along_axis(costs, top, axis=1)
+        order = np.lexsort((ids[top], top_costs), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        for row, columns in enumerate(top):
+            row_costs = costs[row, columns]
+            finite = np.isfinite(row_costs)
+            columns = columns[finite]
+            results.append(list(zip(
+                row_costs[finite].tolist(),
+                ids[columns].tolist(),
+                distances[row, columns].tolist(),
+            )))
+    return results
 
 
 def get_route_polyline(
@@ -356,35 +382,126 @@ def get_route_polyline(
     end_lon: float
 ) -> List[Tuple[float, float]]:
     """
-    Obtiene el polyline (lista de puntos lat/lon) desde el servicio OSRM.
+    Obtiene el polyline (lista de puntos lat/lon) desde el proveedor de rutas
+    configurado (`get_route_provider()`: OSRM o la red vial local).
     Retorna una lista de tuplas (lat, lon) que representa la ruta geométrica.
-    Si OSRM no responde o hay error, retorna una línea recta (solo puntos inicio/fin).
+    Si el proveedor no responde o hay error, retorna una línea recta (solo puntos inicio/fin).
+    Las rutas obtenidas se guardan en `route_cache` (el fallback no).
+    """
+    cache_key = route_cache.make_key(start_lat, start_lon, end_lat, end_lon)
+    cached = route_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    points = _fetch_route_polyline(start_lat, start_lon, end_lat, end_lon, cache_key)
+    return points if points is not None else [(start_lat, start_lon), (end_lat, end_lon)]
+
+
+def _fetch_route_polyline(
+    start_lat: float,
+    start_lon: float,
+    end_lat: float,
+    end_lon: float,
+    cache_key: Tuple[float, float, float, float]
+) -> Optional[List[Tuple[float, float]]]:
     """
+    Pide la ruta al proveedor (sin consultar la caché) y la guarda en `route_cache`.
+    None si no hay ruta o el proveedor falla (quien llama usa la línea recta).
+    """
+    route_provider = get_route_provider()
     try:
-        # Formato OSRM: lng,lat (nota el orden invertido)
-        coordinates = f"{start_lon},{start_lat};{end_lon},{end_lat}"
-        url = f"{OSRM_URL}/{coordinates}"
-        params = {
-            "steps": "false",
-            "geometries": "polyline",  # Retorna polyline6 (comprimido)
-            "overview": "full",  # Incluye la ruta completa
-        }
-        
-        response = requests.get(url, params=params, timeout=5)
-        response.raise_for_status()
-        
-        data = response.json()
-        if data.get("code") == "Ok" and data.get("routes"):
-            route = data["routes"][0]
-            geometry_str = route.get("geometry", "")
-            if geometry_str:
-                # Decodificar polyline6 (formato comprimido de Google)
-                points = polyline.decode(geometry_str, precision=6)
-                # polyline.decode devuelve [(lat, lon), ...], que es lo que queremos
-                return points
-        
-        return [(start_lat, start_lon), (end_lat, end_lon)]
+        points = route_provider.route(start_lat, start_lon, end_lat, end_lon)
+        if points:
+            route_cache.set(cache_key, points)
+            return points
+        return None
     except Exception as e:
-        # Si hay error, retorna línea recta como fallback
-        print(f"Error al obtener polyline de OSRM: {e}")
-        return [(start_lat, start_lon), (end_lat, end_lon)]
\ No newline at end of file
+        print(f"Error al obtener polyline ({route_provider.name}): {e}")
+        return None
+
+
+def iter_route_polylines(
+    start_lat: float,
+    start_lon: float,
+    destinations: List[Tuple[float, float]],
+    deadline_seconds: float = None
+) -> Iterator[Tuple[int, List[Tuple[float, float]]]]:
+    """
+    Genera (índice, polyline) desde el inicio a cada destino (lat, lon) a medida
+    que van estando listos. Las rutas en caché salen primero sin tocar la red;
+    el resto se pide con un pool acotado de hilos. Las que no lleguen antes del
+    plazo total `deadline_seconds` salen al final como línea recta (la descarga
+    sigue en segundo plano y, si termina, queda en caché para la próxima vez).
+    """
+    for i, points, _ in _iter_route_polylines(start_lat, start_lon, destinations, deadline_seconds):
+        yield i, points
+
+
+def _iter_route_polylines(
+    start_lat: float,
+    start_lon: float,
+    destinations: List[Tuple[float, float]],
+    deadline_seconds: float = None
+) -> Iterator[Tuple[int, List[Tuple[float, float]], bool]]:
+    """Como `iter_route_polylines`, con un tercer valor: True si la ruta es la línea recta de fallback."""
+    if deadline_seconds is None:
+        deadline_seconds = ROUTE_FETCH_DEADLINE_SECONDS
+    started = time.perf_counter()
+
+    pending = {}
+    for i, (end_lat, end_lon) in enumerate(destinations):
+        cache_key = route_cache.make_key(start_lat, start_lon, end_lat, end_lon)
+        cached = route_cache.get(cache_key)
+        if cached is not None:
+            yield i, cached, False
+        else:
+            future = _route_executor.submit(_fetch_route_polyline, start_lat, start_lon, end_lat, end_lon, cache_key)
+            pending[future] = i
+
+    remaining = deadline_seconds - (time.perf_counter() - started)
+    try:
+        for future in as_completed(list(pending), timeout=max(remaining, 0)):
+            i = pending.pop(future)
+            points = future.result() if future.exception() is None else None
+            if points is not None:
+                yield i, points, False
+            else:
+                yield i, [(start_lat, start_lon), destinations[i]], True
+    except FuturesTimeoutError:
+        pass
+
+    for i in pending.values():
+        end_lat, end_lon = destinations[i]
+        print(f"Advertencia: ruta hacia ({end_lat}, {end_lon}) fuera de plazo; se usa línea recta")
+        yield i, [(start_lat, start_lon), (end_lat, end_lon)], True
+
+
+def get_route_polylines(
+    start_lat: float,
+    start_lon: float,
+    destinations: List[Tuple[float, float]],
+    deadline_seconds: float = None
+) -> List[List[Tuple[float, float]]]:
+    """
+    Obtiene en paralelo los polylines desde el inicio a cada destino (lat, lon),
+    en el mismo orden (ver `iter_route_polylines`).
+    """
+    return fetch_route_polylines(start_lat, start_lon, destinations, deadline_seconds)[0]
+
+
+def fetch_route_polylines(
+    start_lat: float,
+    start_lon: float,
+    destinations: List[Tuple[float, float]],
+    deadline_seconds: float = None
+) -> Tuple[List[List[Tuple[float, float]]], int]:
+    """
+    Como `get_route_polylines`, pero devuelve también cuántas rutas son la
+    línea recta de fallback (error del proveedor o fuera de plazo), para no
+    guardar en caché respuestas que las incluyan.
+    """
+    results: List[List[Tuple[float, float]]] = [None] * len(destinations)
+    fallbacks = 0
+    for i, points, fallback in _iter_route_polylines(start_lat, start_lon, destinations, deadline_seconds):
+        results[i] = points
+        fallbacks += fallback
+    return results, fallbacks
@@ -0,0 +1,147 @@
+# app/utils/csr_graph.py
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+DictGraph = Dict[int, Dict[int, float]]
+
+
+class CSRGraph:
+    """
+    Grafo dirigido y ponderado en formato CSR compacto:
+
+    - `node_ids[i]`: id del nodo en la posición `i` (p.ej. cafeteria_id; 0 = usuario).
+    - Las aristas que salen de la posición `i` son `indices[indptr[i]:indptr[i + 1]]`
+      (posiciones de destino), con su peso en `weights`.
+
+    Es el formato que usan todos los algoritmos de `graph_algorithms`; el
+    formato anterior {origen: {destino: peso}} se convierte con `from_dict`
+    (o `as_csr`) y se recupera con `to_dict`.
+    """
+
+    def __init__(self, node_ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self._positions: Optional[Dict[int, int]] = None
+
+    @classmethod
+    def from_arrays(
+        cls,
+        node_ids: Iterable[int],
+        sources: np.ndarray,
+        targets: np.ndarray,
+        weights: np.ndarray,
+    ) -> 'CSRGraph':
+        """Construye el CSR a partir de aristas dadas como posiciones (0..n-1) en `node_ids`."""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        n = len(node_ids)
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+        return cls(
+            node_ids,
+            indptr,
+            np.asarray(targets, dtype=np.int64)[order].astype(np.int32 if n < 2**31 else np.int64),
+            np.asarray(weights, dtype=np.float64)[order],
+        )
+
+    @classmethod
+    def star(cls, center_id: int, leaf_ids: Iterable[int], weights: np.ndarray) -> 'CSRGraph':
+        """Grafo estrella: una arista de `center_id` a cada hoja (como el grafo de discover)."""
+        leaf_ids = np.asarray(leaf_ids, dtype=np.int64)
+        m = len(leaf_ids)
+        indptr = np.full(m + 2, m, dtype=np.int64)
+        indptr[0] = 0
+        return cls(
+            np.concatenate([np.array([center_id], dtype=np.int64), leaf_ids]),
+            indptr,
+            np.arange(1, m + 1, dtype=np.int32),
+            np.asarray(weights, dtype=np.float64),
+        )
+
+    @classmethod
+    def from_dict(cls, graph: DictGraph, nodes: Optional[Iterable[int]] = None) -> 'CSRGraph':
+        """
+        Adaptador desde {origen: {destino: peso}}. El orden de los nodos es
+        `nodes` (si se indica) seguido de los que solo aparecen en el grafo.
+        """
+        positions: Dict[int, int] = {}
+        for node in (nodes or ()):
+            positions.setdefault(node, len(positions))
+        for u, neighbors in graph.items():
+            positions.setdefault(u, len(positions))
+            for v in neighbors:
+                positions.setdefault(v, len(positions))
+
+        sources: List[int] = []
+        targets: List[int] = []
+        weights: List[float] = []
+        for u, neighbors in graph.items():
+            i = positions[u]
+            for v, weight in neighbors.items():
+                sources.append(i)
+                targets.append(positions[v])
+                weights.append(weight)
+        csr = cls.from_arrays(list(positions), np.array(sources, dtype=np.int64), targets, weights)
+        csr._positions = positions
+        return csr
+
+    def to_dict(self) -> DictGraph:
+        """{origen: {destino: peso}} (solo los nodos con aristas salientes)."""
+        ids = self.node_ids.tolist()
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        weights = self.weights.tolist()
+        graph: DictGraph = {}
+        for i, u in enumerate(ids):
+            start, end = indptr[i], indptr[i + 1]
+            if start < end:
+                graph[u] = {ids[indices[e]]: weights[e] for e in range(start, end)}
+        return graph
+
+    # --- Consultas ---
+    @property
+    def positions(self) -> Dict[int, int]:
+        """{node_id: posición} (se construye la primera vez que se usa)."""
+        if self._positions is None:
+            self._positions = {node: i for i, node in enumerate(self.node_ids.tolist())}
+        return self._positions
+
+    def position(self, node_id: int) -> Optional[int]:
+        return self.positions.get(node_id)
+
+    def neighbors(self, position: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(posiciones destino, pesos) de las aristas que salen de `position`."""
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def edge_sources(self) -> np.ndarray:
+        """Posición de origen de cada arista (alineado con `indices` y `weights`)."""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self.positions
+
+    def __len__(self) -> int:
+        return self.num_nodes
+
+    def nbytes(self) -> int:
+        """Memoria de los arrays del grafo (sin el diccionario de posiciones)."""
+        return self.node_ids.nbytes + self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes
+
+
+def as_csr(graph: Union[CSRGraph, DictGraph], nodes: Optional[Iterable[int]] = None) -> CSRGraph:
+    """Devuelve `graph` como CSRGraph (convirtiéndolo si viene en formato diccionario)."""
+    if isinstance(graph, CSRGraph):
+        return graph
+    return CSRGraph.from_dict(graph, nodes)
@@ -1,11 +1,124 @@
 # app/utils/data_loader.py (FINAL Y CORREGIDO)
 
+import os
+import threading
+import time
+import numpy as np
 import pandas as pd
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Dict, Any, Union
+from typing import Dict, Any, Iterator, Mapping, Optional, Tuple, Union
+from app.utils.frame_records import FrameRecords
+from app.utils.knn_graph import KNNGraph
+from app.utils.menu_index import MenuIndex
+from app.utils.schedule_index import ScheduleIndex
+from app.utils.snapshot import (
+    SnapshotError,
+    build_lock,
+    decode_index,
+    encode_index,
+    read_arrays,
+    read_frame,
+    snapshot_status,
+    source_fingerprint,
+    sources_match,
+    write_snapshot,
+)
+from app.utils.spatial_index import SpatialIndex
 
 DATA_DIR = Path(__file__).parent.parent / "data"
 
+# Tags booleanos (sí/no) que se usan como filtros duros en discover
+TAG_FLAG_COLUMNS = ("wifi", "terraza", "enchufes", "pet_friendly")
+
+# Factor de normalización de coordenadas en el dataset (lat/lon * 10^7)
+COORD_SCALE = 10**7
+
+# Tags de texto usados como preferencias blandas (coincidencia exacta con el filtro)
+SOFT_TAG_COLUMNS = ("tipo_musica", "iluminacion", "estilo_decorativo")
+
+# Claves de unión (columna en la relación, columna id en el catálogo)
+BEBIDAS_JOIN_KEYS = ("bebida_id", "id_tipo_bebida")
+PRODUCTOS_JOIN_KEYS = ("producto_id", "id_productos")
+
+# Grafo de vecinas entre cafeterías (rutas de varias paradas): k vecinas dentro de un radio
+KNN_GRAPH_K = int(os.getenv("KNN_GRAPH_K", "8"))
+KNN_GRAPH_MAX_KM = float(os.getenv("KNN_GRAPH_MAX_KM", "3.0"))
+
+# CSV de origen: atributo del DataLoader -> archivo en DATA_DIR
+CSV_FILES = {
+    "df_tags": "dataset_caracteristicas_cafeterias.csv",
+    "df_cafeterias": "dataset_cafeterias_peru_colombia.csv",
+    "df_cafes": "dataset_cafes.csv",
+    "df_bebidas": "dataset_cafe_datos.csv",
+    "df_productos": "dataset_producto.csv",
+    "cafes_bebidas_data": "dataset_relacion_cafeteria_bebidas.csv",
+    "cafeterias_productos_data": "dataset_relacion_cafeteria_productos.csv",
+    "df_horarios": "dataset_cafeterias_horarios.csv",
+}
+
+# Esquema de tipos por CSV (lo aplica load_csv): texto de pocos valores como
+# categórico, tags 'sí'/'no' como booleanos y precios con coma decimal ("7,1")
+# como float. Además, todas las columnas enteras se reducen al menor tipo que
+# admite sus valores (p.ej. los ids a int16).
+DATASET_SCHEMAS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "dataset_caracteristicas_cafeterias.csv": {
+        "category": ("tipo_musica", "iluminacion", "estilo_decorativo"),
+        "bool": ("pet_friendly", "enchufes", "wifi", "terraza"),
+    },
+    "dataset_cafeterias_peru_colombia.csv": {
+        "category": ("country",),
+    },
+    "dataset_cafes.csv": {
+        "category": ("pais", "variedad", "presentacion", "notas_sabor", "altitud"),
+    },
+    "dataset_cafe_datos.csv": {
+        "category": ("categoria", "bebida", "tamaño", "leche"),
+    },
+    "dataset_producto.csv": {
+        "category": ("nombre_producto", "tipo"),
+        "bool": ("vegano",),
+        "decimal": ("precio",),
+    },
+    "dataset_relacion_cafeteria_bebidas.csv": {
+        "category": ("categoria",),
+        "decimal": ("precio",),
+    },
+    "dataset_relacion_cafeteria_productos.csv": {
+        "category": ("categoria",),
+    },
+    "dataset_cafeterias_horarios.csv": {
+        "category": ("hora_apertura", "hora_cierre", "dias_abre"),
+    },
+}
+
+# Diccionarios por ID: atributo -> (DataFrame de origen, columna ID)
+ID_DICTS = {
+    "cafeterias_data": ("df_cafeterias", "cafeteria_id"),
+    "tags_data": ("df_tags", "cafeteria_id"),
+    "cafe_data": ("df_cafes", "id_cafes"),
+}
+
+# Instantánea binaria de los datos ya limpios e indexados (vacío = siempre desde los CSV)
+DATA_SNAPSHOT_DIR = os.getenv("DATA_SNAPSHOT_DIR", str(DATA_DIR / ".snapshot"))
+
+# Leer la instantánea mapeada en memoria (solo lectura, sin copiar): los workers que
+# usan la misma instantánea comparten sus páginas en lugar de tener cada uno su copia
+DATA_SNAPSHOT_MMAP = os.getenv("DATA_SNAPSHOT_MMAP", "0") == "1"
+
+
+def snapshot_config() -> Dict[str, Any]:
+    """Parámetros de los índices derivados: si cambian, la instantánea deja de valer."""
+    return {
+        "coord_scale": COORD_SCALE,
+        "knn_graph_k": KNN_GRAPH_K,
+        "knn_graph_max_km": KNN_GRAPH_MAX_KM,
+        # Tuplas como listas: así se compara igual que lo leído del manifiesto JSON
+        "schemas": {name: {kind: list(cols) for kind, cols in schema.items()} for name, schema in DATASET_SCHEMAS.items()},
+    }
+
+
 def load_csv(file_name: str, delimiter: str = ";") -> pd.DataFrame:
     """Carga un archivo CSV desde la carpeta 'data'."""
     path = DATA_DIR / file_name
@@ -18,7 +131,7 @@ def load_csv(file_name: str, delimiter: str = ";") -> pd.DataFrame:
             .replace(' ', '_')
             for col in df.columns
         ]
-        return df
+        return apply_schema(df, DATASET_SCHEMAS.get(file_name, {}), file_name)
     except FileNotFoundError:
         print(f"Error: Archivo no encontrado en {path}")
         return pd.DataFrame()
@@ -26,67 +139,721 @@ def load_csv(file_name: str, delimiter: str = ";") -> pd.DataFrame:
         print(f"Error al cargar {file_name}: {e}")
         return pd.DataFrame()
 
-class DataLoader:
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, Tuple[str, ...]], name: str = "") -> pd.DataFrame:
+    """Aplica los tipos compactos de `schema` (ver DATASET_SCHEMAS) a un DataFrame recién leído."""
+    missing = [col for cols in schema.values() for col in cols if col not in df.columns]
+    if missing:
+        print(f"Advertencia: columnas del esquema no encontradas en {name}: {missing}")
+
+    for col in schema.get("category", ()):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in schema.get("bool", ()):
+        if col in df.columns:
+            df[col] = _tag_flags(df[col])
+    for col in schema.get("decimal", ()):
+        if col in df.columns:
+            text = df[col].astype(str).str.strip().str.replace(",", ".", regex=False)
+            df[col] = pd.to_numeric(text, errors="coerce")
+    for col in df.select_dtypes(include="integer").columns:
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+    return df
+
+
+def _tag_flags(values: pd.Series) -> np.ndarray:
+    """Versión vectorizada de `_tag_true`: True si el valor indica 'sí'."""
+    if values.dtype == bool:
+        return values.to_numpy()
+    s = values.astype(str).str.strip().str.lower()
+    return (s.str.startswith('s') | s.isin(['si', 'sí', 'true', '1', 'y', 'yes'])).to_numpy(dtype=bool)
+
+
+def _category_codes(index: pd.Index, keys: pd.Series, values: pd.Series) -> Tuple[np.ndarray, pd.Index]:
     """
-    Clase Singleton para cargar todos los datasets una sola vez y hacerlos
-    accesibles como atributos.
+    Códigos categóricos por cafetería: (codes, categorías), con `codes`
+    alineado con `index` y -1 para las cafeterías sin valor.
     """
-    _instance: Union['DataLoader', None] = None
-    
-    # --- Atributos para Almacenar Datos (Definiciones requeridas) ---
+    codes = np.full(len(index), -1, dtype=np.int32)
+    pos = index.get_indexer(keys)
+    valid = pos >= 0
+    value_codes, categories = pd.factorize(values.to_numpy()[valid])
+    codes[pos[valid]] = value_codes
+    return codes, pd.Index(categories)
+
+
+def _is_mapped(values: Union[pd.Series, np.ndarray]) -> bool:
+    """True si los datos están mapeados desde un archivo (np.memmap) en lugar de en memoria propia."""
+    if isinstance(values, pd.Series):
+        values = values.cat.codes.to_numpy() if isinstance(values.dtype, pd.CategoricalDtype) else values.to_numpy()
+    while isinstance(values, np.ndarray):
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+def _mapped_bytes(values: pd.Series) -> int:
+    """
+    Bytes de la columna mapeados desde la instantánea: todos sus valores
+    (numéricas y booleanas) o solo los códigos (categóricas). Las etiquetas de
+    las categóricas y las columnas de texto son objetos propios de cada worker.
+    """
+    categorical = isinstance(values.dtype, pd.CategoricalDtype)
+    array = values.cat.codes.to_numpy() if categorical else values.to_numpy()
+    return int(array.nbytes) if _is_mapped(array) else 0
+
+
+class _LazyAttribute:
+    """
+    Atributo de una DataVersion que se carga la primera vez que se lee, llamando
+    al método `loader` con su nombre. Ese método lo guarda en la instancia, así
+    que las lecturas siguientes son un acceso normal (sin pasar por aquí ni por el lock).
+    """
+
+    def __init__(self, loader: str):
+        self.loader = loader
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        with obj._lock:
+            if self.name not in obj.__dict__:
+                getattr(obj, self.loader)(self.name)
+        return obj.__dict__[self.name]
+
+
+class DataReloadError(Exception):
+    """La versión nueva de los datos no es válida: se sigue sirviendo la anterior."""
+
+
+class StaleDataError(Exception):
+    """
+    Un CSV cambió después de que la versión registrara su huella: esa versión
+    ya no puede leerlo sin mezclar datos de dos versiones (hay que recargar).
+    """
+
+    def __init__(self, data_version: int, file_name: str):
+        super().__init__(f"{file_name} ha cambiado desde que se creó la versión {data_version} de los datos")
+        self.data_version = data_version
+        self.file_name = file_name
+
+
+class DataVersion:
+    """
+    Una versión de todos los datasets, accesibles como atributos. No se
+    modifica una vez publicada: para cambiar los datos se construye otra
+    (ver DataLoader.reload).
+
+    Crear la instancia no carga nada: cada DataFrame se lee (de la instantánea
+    o del CSV) la primera vez que se usa, y los arrays derivados para discover
+    se calculan juntos la primera vez que se usa cualquiera de ellos. La carga
+    es segura entre hilos. Un proceso que solo sirve rutas de usuarios no
+    llega a cargar ningún dataset.
+    """
+
+    # --- Atributos para Almacenar Datos (se cargan al primer acceso) ---
     
-    # Mapeados por ID para acceso rápido O(1)
-    cafeterias_data: Dict[int, Any] = {}
-    tags_data: Dict[int, Any] = {}
-    cafe_data: Dict[int, Any] = {}
+    # Mapeados por ID para acceso rápido O(1) (vistas de solo lectura sobre los DataFrames)
+    cafeterias_data: Mapping[int, Dict[str, Any]] = _LazyAttribute('_load_id_dict')
+    tags_data: Mapping[int, Dict[str, Any]] = _LazyAttribute('_load_id_dict')
+    cafe_data: Mapping[int, Dict[str, Any]] = _LazyAttribute('_load_id_dict')
     
     # DataFrames completos (ACCEDIDOS POR EL ROUTER)
-    df_cafeterias: pd.DataFrame = pd.DataFrame()
-    df_tags: pd.DataFrame = pd.DataFrame()
-    df_cafes: pd.DataFrame = pd.DataFrame()
-    
-    df_bebidas: pd.DataFrame = pd.DataFrame()
-    df_productos: pd.DataFrame = pd.DataFrame()
-    df_horarios: pd.DataFrame = pd.DataFrame()
-    cafes_bebidas_data: pd.DataFrame = pd.DataFrame()
-    cafeterias_productos_data: pd.DataFrame = pd.DataFrame()
+    df_cafeterias: pd.DataFrame = _LazyAttribute('_load_dataset')
+    df_tags: pd.DataFrame = _LazyAttribute('_load_dataset')
+    df_cafes: pd.DataFrame = _LazyAttribute('_load_dataset')
     
+    df_bebidas: pd.DataFrame = _LazyAttribute('_load_dataset')
+    df_productos: pd.DataFrame = _LazyAttribute('_load_dataset')
+    df_horarios: pd.DataFrame = _LazyAttribute('_load_dataset')
+    cafes_bebidas_data: pd.DataFrame = _LazyAttribute('_load_dataset')
+    cafeterias_productos_data: pd.DataFrame = _LazyAttribute('_load_dataset')
+
+    # Matriz de características por cafetería (arrays alineados con cafeteria_ids)
+    cafeteria_ids: np.ndarray = _LazyAttribute('_load_features')
+    cafeteria_pos: Dict[int, int] = _LazyAttribute('_load_features')
+    cafeteria_lat: np.ndarray = _LazyAttribute('_load_features')
+    cafeteria_lon: np.ndarray = _LazyAttribute('_load_features')
+    coords_valid: np.ndarray = _LazyAttribute('_load_features')
+    spatial_index: SpatialIndex = _LazyAttribute('_load_features')
+    # Grafo CSR de k vecinas más cercanas entre cafeterías
+    knn_graph: KNNGraph = _LazyAttribute('_load_features')
+    tag_flags: Dict[str, np.ndarray] = _LazyAttribute('_load_features')
+    # Preferencias blandas: códigos categóricos (codes, categorías) por cafetería
+    soft_tag_codes: Dict[str, Tuple[np.ndarray, pd.Index]] = _LazyAttribute('_load_features')
+    variedad_codes: Tuple[np.ndarray, pd.Index] = _LazyAttribute('_load_features')
+    # True si la cafetería ofrece al menos un producto vegano
+    vegan_flags: np.ndarray = _LazyAttribute('_load_features')
+    # Índices invertidos categoría -> bitset de cafeterías
+    precio_index: MenuIndex = _LazyAttribute('_load_features')
+    categoria_bebida_index: MenuIndex = _LazyAttribute('_load_features')
+    tipo_producto_index: MenuIndex = _LazyAttribute('_load_features')
+    # Horarios semanales compilados (bitmap de minutos por cafetería)
+    schedule_index: ScheduleIndex = _LazyAttribute('_load_features')
+
+    def __init__(self, data_version: int = 1, use_snapshot: bool = True):
+        # Número de versión: las cachés derivadas (p.ej. la de resultados de discover) lo usan en su clave
+        self.data_version = data_version
+        self.created_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._lock = threading.RLock()
+        self._use_snapshot = use_snapshot and bool(DATA_SNAPSHOT_DIR)
+        self._snapshot_checked = False
+        self._manifest: Union[Dict[str, Any], None] = None
+        # Huella de los CSV (de la instantánea válida o tomada antes de leerlos)
+        self._sources: Dict[str, Any] = {}
+        # Qué se ha cargado, de dónde y cuánto tardó: {nombre: {"source", "load_ms"}}
+        self._load_times: Dict[str, Dict[str, Any]] = {}
+        self._features_mapped_bytes = 0
+
+    def load_all(self):
+        """Fuerza la carga de todos los datasets e índices (p.ej. para precargar un worker)."""
+        for name in (*CSV_FILES, *ID_DICTS, 'cafeteria_ids'):
+            getattr(self, name)
+
+    def preload(self):
+        """
+        Carga todos los datasets e índices, para que la versión no tenga que
+        leer nada más después de publicarse. Lanza DataReloadError si algún
+        CSV no se pudo leer o ha quedado vacío.
+        """
+        for name in CSV_FILES:
+            if getattr(self, name).empty:
+                raise DataReloadError(f"el dataset '{name}' ({CSV_FILES[name]}) está vacío o no se pudo leer")
+        self.load_all()
+
+    def loaded_names(self) -> set:
+        """Nombres (como en load_report) de lo que ya está cargado."""
+        with self._lock:
+            return set(self._load_times)
+
+    def load_report(self) -> Dict[str, Any]:
+        """Estado de carga de cada dataset, sin provocar ninguna carga."""
+        with self._lock:
+            loaded = dict(self._load_times)
+        return {
+            "data_version": self.data_version,
+            "created_at": self.created_at,
+            "snapshot_dir": DATA_SNAPSHOT_DIR if self._use_snapshot else None,
+            "snapshot_valid": (self._manifest is not None) if self._snapshot_checked else None,
+            "datasets": {
+                name: {"loaded": name in loaded, **loaded.get(name, {})}
+                for name in (*CSV_FILES, *ID_DICTS, 'features')
+            },
+        }
+
+    def memory_report(self) -> Dict[str, Any]:
+        """
+        Memoria (bytes) de cada DataFrame ya cargado, por columna, y de los
+        arrays derivados. `mapped_bytes` es la parte mapeada desde la
+        instantánea (DATA_SNAPSHOT_MMAP), compartida entre workers, y
+        `private_bytes` la propia de este worker: las columnas de texto (p.ej.
+        `name`) y las etiquetas de las categóricas nunca se comparten.
+        """
+        frames = {}
+        for name in CSV_FILES:
+            df = self.__dict__.get(name)
+            if df is None:
+                continue
+            usage = df.memory_usage(deep=True, index=True)
+            columns = {}
+            for col in df.columns:
+                mapped = min(_mapped_bytes(df[col]), int(usage[col]))
+                columns[col] = {
+                    "dtype": str(df[col].dtype),
+                    "bytes": int(usage[col]),
+                    "mapped": mapped > 0,
+                    "mapped_bytes": mapped,
+                    "private_bytes": int(usage[col]) - mapped,
+                }
+            mapped_bytes = sum(info["mapped_bytes"] for info in columns.values())
+            frames[name] = {
+                "rows": len(df),
+                "bytes": int(usage.sum()),
+                "mapped_bytes": mapped_bytes,
+                "private_bytes": int(usage.sum()) - mapped_bytes,
+                # Columnas que no se comparten en absoluto (texto): se copian en cada worker
+                "private_columns": [col for col, info in columns.items() if not info["mapped"]],
+                "columns": columns,
+            }
+        report: Dict[str, Any] = {
+            "mmap": DATA_SNAPSHOT_MMAP,
+            "frames": frames,
+            "frames_total_bytes": sum(frame["bytes"] for frame in frames.values()),
+            "frames_mapped_bytes": sum(frame["mapped_bytes"] for frame in frames.values()),
+            "frames_private_bytes": sum(frame["private_bytes"] for frame in frames.values()),
+        }
+        if 'cafeteria_ids' in self.__dict__:
+            report["features_bytes"] = int(sum(arr.nbytes for arr in self._snapshot_arrays().values()))
+            report["features_mapped_bytes"] = self._features_mapped_bytes
+        return report
+
+    # --- Lógica de Carga de Datos ---
+    def _to_id_dict(self, df: pd.DataFrame, id_col: str) -> Mapping[int, Dict[str, Any]]:
+        """
+        Acceso por ID a las filas de un DataFrame ({id: {columna: valor}}, como
+        `to_dict('index')`), sin copiar los datos del DataFrame.
+        """
+        return FrameRecords(df, id_col)
+
+    def _record_load(self, name: str, source: str, start: float):
+        load_ms = (time.perf_counter() - start) * 1000
+        self._load_times[name] = {"source": source, "load_ms": round(load_ms, 3)}
+        print(f"Dataset '{name}' cargado ({source}, {load_ms:.0f} ms).")
+
+    def _snapshot_manifest(self) -> Union[Dict[str, Any], None]:
+        """Manifiesto de la instantánea si es válida (se comprueba una sola vez por instancia)."""
+        if not self._snapshot_checked:
+            self._snapshot_checked = True
+            if self._use_snapshot:
+                try:
+                    self._manifest, reason = snapshot_status(
+                        Path(DATA_SNAPSHOT_DIR), DATA_DIR, CSV_FILES.values(), snapshot_config()
+                    )
+                except SnapshotError as e:
+                    self._manifest, reason = None, str(e)
+                if self._manifest is None and DATA_SNAPSHOT_MMAP:
+                    self._manifest = self._materialize_snapshot(reason)
+                elif self._manifest is None:
+                    print(f"Instantánea de datos no usada ({reason}): se cargan los CSV.")
+            if self._manifest is not None:
+                self._sources = self._manifest["sources"]
+            else:
+                # Huella de los CSV antes de leerlos: si cambian durante la carga, la instantánea no valdrá
+                self._sources = source_fingerprint(DATA_DIR, CSV_FILES.values())
+        return self._manifest
+
+    def _materialize_snapshot(self, reason: str) -> Union[Dict[str, Any], None]:
+        """
+        Modo mapeado (DATA_SNAPSHOT_MMAP): en lugar de cargar los CSV en este
+        proceso, construye la instantánea (una sola vez entre todos los
+        workers, con un bloqueo de archivo) y devuelve su manifiesto para
+        mapearla. None si no se pudo: se cargan los CSV como siempre.
+        """
+        snapshot_dir = Path(DATA_SNAPSHOT_DIR)
+        config = snapshot_config()
+        try:
+            with build_lock(snapshot_dir):
+                # Puede que otro worker la haya construido mientras esperábamos el bloqueo
+                manifest, _ = snapshot_status(snapshot_dir, DATA_DIR, CSV_FILES.values(), config)
+                if manifest is None:
+                    print(f"Instantánea de datos no válida ({reason}): construyéndola desde los CSV.")
+                    builder = DataVersion(use_snapshot=False)
+                    if builder.save_snapshot(DATA_SNAPSHOT_DIR) is None:
+                        return None
+                    manifest, reason = snapshot_status(snapshot_dir, DATA_DIR, CSV_FILES.values(), config)
+        except (SnapshotError, OSError) as e:
+            manifest, reason = None, str(e)
+        if manifest is None:
+            print(f"Instantánea de datos no usada ({reason}): se cargan los CSV.")
+        return manifest
+
+    def _snapshot_failed(self, error: Exception):
+        """
+        La instantánea no se pudo leer: lo que quede por cargar se lee de los
+        CSV, siempre que sigan siendo los de su huella (ver _load_dataset).
+        """
+        print(f"Advertencia: no se pudo leer la instantánea de datos ({error}): se cargan los CSV.")
+        self._manifest = None
+
+    def _load_dataset(self, name: str):
+        start = time.perf_counter()
+        manifest = self._snapshot_manifest()
+        if manifest is not None:
+            try:
+                setattr(self, name, read_frame(Path(DATA_SNAPSHOT_DIR), manifest, name, mmap=DATA_SNAPSHOT_MMAP))
+                self._record_load(name, "snapshot", start)
+                return
+            except SnapshotError as e:
+                self._snapshot_failed(e)
+        file_name = CSV_FILES[name]
+        df = load_csv(file_name)
+        # Una versión solo lee los CSV de la huella que registró: si han cambiado desde
+        # entonces (p.ej. un dataset cargado bajo demanda tras editarlos), no se mezclan
+        if not sources_match(DATA_DIR, {file_name: self._sources.get(file_name)}, [file_name]):
+            raise StaleDataError(self.data_version, file_name)
+        setattr(self, name, df)
+        self._record_load(name, "csv", start)
+
+    def _load_id_dict(self, name: str):
+        start = time.perf_counter()
+        frame, id_col = ID_DICTS[name]
+        setattr(self, name, self._to_id_dict(getattr(self, frame), id_col=id_col))
+        self._record_load(name, "build", start)
+
+    def _load_features(self, name: str):
+        """Carga (o calcula) de una vez todos los arrays derivados de la matriz de características."""
+        start = time.perf_counter()
+        manifest = self._snapshot_manifest()
+        if manifest is not None:
+            try:
+                arrays = read_arrays(Path(DATA_SNAPSHOT_DIR), manifest, mmap=DATA_SNAPSHOT_MMAP)
+                self._restore_snapshot_arrays(arrays)
+                self._features_mapped_bytes = int(sum(arr.nbytes for arr in arrays.values() if _is_mapped(arr)))
+                self._record_load("features", "snapshot", start)
+                return
+            except (SnapshotError, KeyError) as e:
+                self._snapshot_failed(e)
+        self._build_feature_matrix()
+        self._record_load("features", "build", start)
+        if self._use_snapshot:
+            # Si otro worker ya publicó una instantánea válida mientras se calculaba, no se reescribe
+            self.save_snapshot(DATA_SNAPSHOT_DIR, skip_if_valid=True)
+
+    # --- Instantánea binaria (ver app/utils/snapshot.py) ---
+    def _snapshot_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays derivados de `_build_feature_matrix` que se guardan en la instantánea."""
+        arrays = {
+            "cafeteria_ids": self.cafeteria_ids,
+            "cafeteria_lat": self.cafeteria_lat,
+            "cafeteria_lon": self.cafeteria_lon,
+            "coords_valid": self.coords_valid,
+            "knn_graph.indptr": self.knn_graph.indptr,
+            "knn_graph.indices": self.knn_graph.indices,
+            "knn_graph.weights": self.knn_graph.weights,
+            "vegan_flags": self.vegan_flags,
+            "schedule_index.bits": self.schedule_index.bits,
+            "schedule_index.has_schedule": self.schedule_index.has_schedule,
+        }
+        for col, flags in self.tag_flags.items():
+            arrays[f"tag_flags.{col}"] = flags
+        categorical = {f"soft_tag_codes.{col}": value for col, value in self.soft_tag_codes.items()}
+        categorical["variedad_codes"] = self.variedad_codes
+        for key, (codes, categories) in categorical.items():
+            arrays[f"{key}.codes"] = codes
+            arrays[f"{key}.categories"] = encode_index(categories)
+        for name in ("precio_index", "categoria_bebida_index", "tipo_producto_index"):
+            menu_index: MenuIndex = getattr(self, name)
+            categories = list(menu_index.categories())
+            arrays[f"{name}.categories"] = encode_index(categories)
+            arrays[f"{name}.bitsets"] = (
+                np.stack([menu_index.any_of([c]) for c in categories])
+                if categories else np.zeros((0, (menu_index.size + 7) // 8), dtype=np.uint8)
+            )
+        return arrays
+
+    def _restore_snapshot_arrays(self, arrays: Dict[str, np.ndarray]):
+        self.cafeteria_ids = arrays["cafeteria_ids"]
+        self.cafeteria_pos = {int(cid): pos for pos, cid in enumerate(self.cafeteria_ids)}
+        n = len(self.cafeteria_ids)
+        self.cafeteria_lat = arrays["cafeteria_lat"]
+        self.cafeteria_lon = arrays["cafeteria_lon"]
+        self.coords_valid = arrays["coords_valid"]
+        # El índice espacial es solo una ordenación por celda: reconstruirlo es barato
+        self.spatial_index = SpatialIndex(self.cafeteria_lat, self.cafeteria_lon)
+        self.knn_graph = KNNGraph(
+            arrays["knn_graph.indptr"], arrays["knn_graph.indices"], arrays["knn_graph.weights"]
+        )
+        self.vegan_flags = arrays["vegan_flags"]
+        self.schedule_index = ScheduleIndex(arrays["schedule_index.bits"], arrays["schedule_index.has_schedule"])
+        self.tag_flags = {
+            key[len("tag_flags."):]: arr for key, arr in arrays.items() if key.startswith("tag_flags.")
+        }
+        self.soft_tag_codes = {
+            col: (arrays[f"soft_tag_codes.{col}.codes"], decode_index(arrays[f"soft_tag_codes.{col}.categories"]))
+            for col in SOFT_TAG_COLUMNS
+        }
+        self.variedad_codes = (arrays["variedad_codes.codes"], decode_index(arrays["variedad_codes.categories"]))
+        for name in ("precio_index", "categoria_bebida_index", "tipo_producto_index"):
+            categories = arrays[f"{name}.categories"].tolist()
+            setattr(self, name, MenuIndex(n, dict(zip(categories, arrays[f"{name}.bitsets"]))))
+
+    def save_snapshot(self, snapshot_dir: str, skip_if_valid: bool = False) -> Union[Path, None]:
+        """
+        Guarda los DataFrames y los índices derivados con build_lock tomado;
+        devuelve el directorio o None si falla. Con `skip_if_valid`, si ya hay
+        una instantánea válida no se escribe y se devuelve la existente.
+        """
+        self._snapshot_manifest()
+        snapshot_dir = Path(snapshot_dir)
+        config = snapshot_config()
+        try:
+            with build_lock(snapshot_dir):
+                if skip_if_valid:
+                    try:
+                        manifest, _ = snapshot_status(snapshot_dir, DATA_DIR, CSV_FILES.values(), config)
+                    except SnapshotError:
+                        manifest = None
+                    if manifest is not None:
+                        return snapshot_dir / manifest["build"]
+                return write_snapshot(
+                    snapshot_dir,
+                    {attr: getattr(self, attr) for attr in CSV_FILES},
+                    self._snapshot_arrays(),
+                    self._sources,
+                    config,
+                )
+        except (SnapshotError, OSError) as e:
+            print(f"Advertencia: no se pudo guardar la instantánea de datos en {snapshot_dir}: {e}")
+            return None
+
+    def _set_empty_features(self):
+        """Valores de la matriz de características cuando no hay cafeterías."""
+        self.cafeteria_ids = np.empty(0, dtype=np.int64)
+        self.cafeteria_pos = {}
+        self.cafeteria_lat = np.empty(0, dtype=np.float64)
+        self.cafeteria_lon = np.empty(0, dtype=np.float64)
+        self.coords_valid = np.empty(0, dtype=bool)
+        self.spatial_index = SpatialIndex(np.empty(0), np.empty(0))
+        self.knn_graph = KNNGraph.empty()
+        self.tag_flags = {col: np.empty(0, dtype=bool) for col in TAG_FLAG_COLUMNS}
+        self.soft_tag_codes = {col: (np.empty(0, dtype=np.int32), pd.Index([])) for col in SOFT_TAG_COLUMNS}
+        self.variedad_codes = (np.empty(0, dtype=np.int32), pd.Index([]))
+        self.vegan_flags = np.empty(0, dtype=bool)
+        self.precio_index = MenuIndex(0)
+        self.categoria_bebida_index = MenuIndex(0)
+        self.tipo_producto_index = MenuIndex(0)
+        self.schedule_index = ScheduleIndex.empty()
+
+    def _build_feature_matrix(self):
+        """
+        Precalcula, una sola vez, los arrays por cafetería que usan los filtros
+        duros de discover: coordenadas en float (más su índice espacial y el
+        grafo de vecinas), tags
+        booleanos, horarios semanales compilados e índices de categoría
+        (precio, categoría de bebida y tipo de producto); y, para los costes de
+        preferencias, códigos categóricos de tags/variedad y la opción vegana.
+        """
+        self._set_empty_features()
+        df = self.df_cafeterias
+        if df.empty or 'cafeteria_id' not in df.columns:
+            return
+
+        self.cafeteria_ids = df['cafeteria_id'].to_numpy(dtype=np.int64)
+        index = pd.Index(self.cafeteria_ids)
+        self.cafeteria_pos = {int(cid): pos for pos, cid in enumerate(self.cafeteria_ids)}
+        n = len(self.cafeteria_ids)
+
+        # Coordenadas denormalizadas (en el dataset están multiplicadas por 10^7)
+        coords = {}
+        for col in ('latitude', 'longitude'):
+            if col in df.columns:
+                coords[col] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64) / COORD_SCALE
+            else:
+                coords[col] = np.full(n, np.nan)
+        self.cafeteria_lat = np.ascontiguousarray(coords['latitude'])
+        self.cafeteria_lon = np.ascontiguousarray(coords['longitude'])
+        self.coords_valid = ~(np.isnan(self.cafeteria_lat) | np.isnan(self.cafeteria_lon))
+        # Índice espacial para consultas por radio / cafeterías cercanas
+        self.spatial_index = SpatialIndex(self.cafeteria_lat, self.cafeteria_lon)
+        # Grafo de vecinas para rutas de varias paradas (se construye una vez)
+        self.knn_graph = KNNGraph.build(
+            self.cafeteria_lat, self.cafeteria_lon, self.coords_valid, self.spatial_index,
+            k=KNN_GRAPH_K, max_km=KNN_GRAPH_MAX_KM,
+        )
+
+        # Tags booleanos (las cafeterías sin fila de tags quedan en False)
+        self.tag_flags = {}
+        tags = self.df_tags
+        for col in TAG_FLAG_COLUMNS:
+            arr = np.zeros(n, dtype=bool)
+            if not tags.empty and col in tags.columns:
+                pos = index.get_indexer(tags['cafeteria_id'])
+                valid = pos >= 0
+                arr[pos[valid]] = _tag_flags(tags[col])[valid]
+            self.tag_flags[col] = arr
+
+        # Preferencias blandas: tags de texto y variedad de café como códigos categóricos
+        self.soft_tag_codes = {}
+        for col in SOFT_TAG_COLUMNS:
+            if not tags.empty and col in tags.columns:
+                self.soft_tag_codes[col] = _category_codes(index, tags['cafeteria_id'], tags[col])
+            else:
+                self.soft_tag_codes[col] = (np.full(n, -1, dtype=np.int32), pd.Index([]))
+        # Igual que calculate_preference_cost: la variedad se busca en dataset_cafes con id_cafes == cafeteria_id
+        cafes = self.df_cafes
+        if not cafes.empty and 'id_cafes' in cafes.columns and 'variedad' in cafes.columns:
+            self.variedad_codes = _category_codes(index, cafes['id_cafes'], cafes['variedad'])
+        else:
+            self.variedad_codes = (np.full(n, -1, dtype=np.int32), pd.Index([]))
+
+        # Horarios: bitmap semanal para abierto_ahora / abierto_en
+        self.schedule_index = ScheduleIndex.build(index, self.df_horarios)
+
+        # Precio: categorías ('barato', 'medio', 'caro') de bebidas y productos
+        rel_b = self.cafes_bebidas_data
+        rel_p = self.cafeterias_productos_data
+        rel_frames = [
+            rel[['cafeteria_id', 'categoria']]
+            for rel in (rel_b, rel_p)
+            if not rel.empty and 'categoria' in rel.columns
+        ]
+        self.precio_index = MenuIndex(n)
+        if rel_frames:
+            precios = pd.concat(rel_frames, ignore_index=True)
+            self.precio_index = MenuIndex.build(index, precios['cafeteria_id'], precios['categoria'])
+
+        # Categoría de bebida: relación cafetería-bebida unida con df_bebidas
+        bebidas = self._join_catalog(rel_b, self.df_bebidas, BEBIDAS_JOIN_KEYS, 'categoria')
+        self.categoria_bebida_index = (
+            MenuIndex.build(index, bebidas['cafeteria_id'], bebidas['categoria']) if bebidas is not None else MenuIndex(n)
+        )
+
+        # Tipo de producto: relación cafetería-producto unida con df_productos
+        productos = self._join_catalog(rel_p, self.df_productos, PRODUCTOS_JOIN_KEYS, 'tipo')
+        self.tipo_producto_index = (
+            MenuIndex.build(index, productos['cafeteria_id'], productos['tipo']) if productos is not None else MenuIndex(n)
+        )
+
+        # Opción vegana: algún producto de la cafetería con vegano = 'sí' en df_productos
+        self.vegan_flags = np.zeros(n, dtype=bool)
+        veganos = self._join_catalog(rel_p, self.df_productos, PRODUCTOS_JOIN_KEYS, 'vegano')
+        if veganos is not None:
+            veganos = veganos[_tag_flags(veganos['vegano'])]
+            pos = index.get_indexer(veganos['cafeteria_id'])
+            self.vegan_flags[pos[pos >= 0]] = True
+
+    def _join_catalog(self, rel: pd.DataFrame, catalog: pd.DataFrame, join_keys, value_col: str):
+        """
+        Une una tabla de relación con su catálogo por claves explícitas y devuelve
+        (cafeteria_id, value_col), o None si falta alguna columna.
+        """
+        rel_key, catalog_key = join_keys
+        if rel.empty or catalog.empty:
+            return None
+        missing = [c for c in ('cafeteria_id', rel_key) if c not in rel.columns]
+        missing += [c for c in (catalog_key, value_col) if c not in catalog.columns]
+        if missing:
+            print(f"Advertencia: columnas no encontradas para el índice de '{value_col}': {missing}")
+            return None
+        return rel[['cafeteria_id', rel_key]].merge(
+            catalog[[catalog_key, value_col]],
+            left_on=rel_key, right_on=catalog_key, how='inner',
+        )
+
+
+# Versión fijada para la petición en curso (ver DataLoader.pin y DataVersionMiddleware)
+_pinned_version: ContextVar[Optional[DataVersion]] = ContextVar("pinned_data_version", default=None)
+
+
+class DataLoader:
+    """
+    Clase Singleton que da acceso a los datasets de la versión de datos vigente
+    (una DataVersion) como atributos: `DataLoader().df_cafeterias`, etc.
+
+    Dentro de `pin()` (el middleware lo hace para cada petición) todas las
+    lecturas usan la versión vigente al entrar, aunque entretanto se publique
+    otra. `reload()` construye una versión nueva sin bloquear a nadie y la
+    publica de forma atómica: las peticiones en curso terminan con la anterior.
+    """
+    _instance: Union['DataLoader', None] = None
+
     # --- Singleton Pattern ---
     def __new__(cls) -> 'DataLoader':
         if cls._instance is None:
-            cls._instance = super(DataLoader, cls).__new__(cls)
-            cls._instance._load_data() # Carga los datos solo la primera vez
+            instance = super(DataLoader, cls).__new__(cls)
+            instance._current = DataVersion()  # No carga datos: se cargan al primer acceso
+            instance._reload_lock = threading.Lock()
+            instance._state_lock = threading.Lock()
+            instance._reload_thread = None
+            instance._reload_requested = None
+            # Resultado de la última recarga: {"trigger", "at", "duration_ms", "data_version" | "error"}
+            instance.last_reload = None
+            cls._instance = instance
         return cls._instance
 
-    # --- Lógica de Carga de Datos ---
-    def _to_id_dict(self, df: pd.DataFrame, id_col: str) -> Dict[int, Any]:
-        """Convierte un DataFrame a un diccionario usando una columna ID como clave."""
-        if df.empty or id_col not in df.columns:
-            return {}
-        return df.set_index(id_col).to_dict('index')
-
-    def _load_data(self):
-        print("Iniciando carga de datasets (TODOS)...")
-        
-        # 1. Carga de DataFrames en variables locales
-        df_tags_raw = load_csv("dataset_caracteristicas_cafeterias.csv")
-        df_cafeterias_raw = load_csv("dataset_cafeterias_peru_colombia.csv")
-        df_cafes_raw = load_csv("dataset_cafes.csv")
-        
-        # 2. ASIGNACIÓN A LOS ATRIBUTOS DE LA INSTANCIA (self.)
-        self.df_tags = df_tags_raw
-        self.df_cafeterias = df_cafeterias_raw
-        self.df_cafes = df_cafes_raw
-        
-        self.df_bebidas = load_csv("dataset_cafe_datos.csv")
-        self.df_productos = load_csv("dataset_producto.csv")
-        self.cafes_bebidas_data = load_csv("dataset_relacion_cafeteria_bebidas.csv")
-        self.cafeterias_productos_data = load_csv("dataset_relacion_cafeteria_productos.csv")
-        self.df_horarios = load_csv("dataset_cafeterias_horarios.csv") 
-
-        # 3. Mapeo a diccionarios
-        self.cafeterias_data = self._to_id_dict(self.df_cafeterias, id_col='cafeteria_id')
-        self.tags_data = self._to_id_dict(self.df_tags, id_col='cafeteria_id')
-        self.cafe_data = self._to_id_dict(df_cafes_raw, id_col='id_cafes')
-        
-        print("Carga de datasets finalizada. Todos los datos están disponibles.")
\ No newline at end of file
+    @staticmethod
+    def from_csv() -> DataVersion:
+        """Versión nueva (no la vigente) que lee siempre los CSV, sin usar la instantánea."""
+        return DataVersion(use_snapshot=False)
+
+    def current(self) -> DataVersion:
+        """La versión fijada para la petición en curso o, fuera de una, la vigente."""
+        pinned = _pinned_version.get()
+        return pinned if pinned is not None else self._current
+
+    def __getattr__(self, name: str):
+        # Datasets, índices, data_version, load_report...: los de la versión actual
+        if name.startswith("__") or name == "_current":
+            raise AttributeError(name)
+        return getattr(self.current(), name)
+
+    @contextmanager
+    def pin(self) -> Iterator[DataVersion]:
+        """Fija la versión actual para todo lo que se ejecute dentro (incluidos los hilos que copien el contexto)."""
+        token = _pinned_version.set(self.current())
+        try:
+            yield _pinned_version.get()
+        finally:
+            _pinned_version.reset(token)
+
+    # --- Recarga en caliente ---
+    def reload(self, trigger: str = "manual") -> DataVersion:
+        """
+        Construye una versión nueva de los datos (de la instantánea si sigue
+        siendo válida o, si no, de los CSV), completamente cargada, y la
+        publica. Mientras tanto se sigue sirviendo la anterior. Si la nueva no
+        es válida (o los CSV cambian mientras se lee) lanza DataReloadError y
+        no se publica.
+        """
+        with self._reload_lock:
+            old = self._current
+            start = time.perf_counter()
+            print(f"Recargando datos (versión {old.data_version + 1}, origen: {trigger})...")
+            try:
+                new = DataVersion(data_version=old.data_version + 1)
+                new.preload()
+            except Exception as e:
+                self.last_reload = {
+                    "trigger": trigger,
+                    "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                    "error": str(e),
+                }
+                print(f"Error al recargar los datos ({e}): se mantiene la versión {old.data_version}.")
+                raise DataReloadError(str(e)) from e
+            # Publicación atómica: una sola asignación de referencia
+            self._current = new
+            self.last_reload = {
+                "trigger": trigger,
+                "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "data_version": new.data_version,
+            }
+            print(f"Datos recargados: versión {new.data_version} publicada ({self.last_reload['duration_ms']:.0f} ms).")
+            return new
+
+    def reload_if_current(self, data_version: int, trigger: str) -> bool:
+        """Pide una recarga en segundo plano si `data_version` sigue siendo la vigente."""
+        if self._current.data_version != data_version:
+            return False
+        return self.reload_in_background(trigger)
+
+    def reload_in_background(self, trigger: str = "manual") -> bool:
+        """
+        Pide una recarga en un hilo aparte. Devuelve False si ya había una en
+        curso: en ese caso se repite al terminar, para recoger también los
+        cambios que llegaron mientras tanto.
+        """
+        with self._state_lock:
+            self._reload_requested = trigger
+            if self._reload_thread is not None:
+                return False
+            self._reload_thread = threading.Thread(target=self._reload_worker, name="data-reload", daemon=True)
+            self._reload_thread.start()
+            return True
+
+    def _reload_worker(self):
+        while True:
+            with self._state_lock:
+                trigger, self._reload_requested = self._reload_requested, None
+                if trigger is None:
+                    self._reload_thread = None
+                    return
+            try:
+                self.reload(trigger)
+            except DataReloadError:
+                pass  # Ya registrado en last_reload
+
+    def reload_status(self) -> Dict[str, Any]:
+        with self._state_lock:
+            reloading = self._reload_thread is not None
+        return {
+            "data_version": self._current.data_version,
+            "created_at": self._current.created_at,
+            "reloading": reloading,
+            "last_reload": self.last_reload,
+        }
@@ -0,0 +1,88 @@
+# app/utils/data_reload.py
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from app.utils.data_loader import CSV_FILES, DATA_DIR, DataLoader
+
+# Cada cuántos segundos se comprueba si han cambiado los CSV de app/data (0 = sin vigilancia)
+DATA_WATCH_INTERVAL_SECONDS = float(os.getenv("DATA_WATCH_INTERVAL_SECONDS", "0"))
+
+
+class DataVersionMiddleware:
+    """
+    Middleware ASGI que fija la versión de los datos durante toda la petición
+    (también mientras se envía una respuesta en streaming): aunque se publique
+    una versión nueva, la petición en curso termina con la que empezó.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with DataLoader().pin():
+            await self.app(scope, receive, send)
+
+
+class DataFileWatcher:
+    """
+    Hilo que vigila (por sondeo de tamaño y mtime, sin dependencias) los CSV de
+    app/data y pide una recarga en segundo plano cuando cambian. Espera a que
+    los archivos dejen de cambiar durante un intervalo completo, para no leer
+    un CSV a medio copiar.
+    """
+
+    def __init__(self, loader: DataLoader, interval_seconds: float):
+        self.loader = loader
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _stat() -> Dict[str, Optional[Tuple[int, int]]]:
+        state: Dict[str, Optional[Tuple[int, int]]] = {}
+        for name in CSV_FILES.values():
+            try:
+                stat = (DATA_DIR / name).stat()
+                state[name] = (stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                state[name] = None
+        return state
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="data-watcher", daemon=True)
+            self._thread.start()
+            print(f"Vigilando los CSV de {DATA_DIR} cada {self.interval_seconds:g} s.")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        # `loaded`: estado de los CSV en la última recarga; `last`: en la última comprobación
+        loaded = last = self._stat()
+        while not self._stop.wait(self.interval_seconds):
+            current = self._stat()
+            if current != last:
+                # Aún cambiando: se espera al siguiente intervalo
+                last = current
+                continue
+            if current != loaded:
+                changed = sorted(name for name in current if current[name] != loaded.get(name))
+                print(f"Cambios detectados en {', '.join(changed)}: recargando datos.")
+                loaded = current
+                self.loader.reload_in_background("watcher")
+
+
+def start_data_watcher() -> Optional[DataFileWatcher]:
+    """Arranca la vigilancia de los CSV si DATA_WATCH_INTERVAL_SECONDS > 0."""
+    if DATA_WATCH_INTERVAL_SECONDS <= 0:
+        return None
+    watcher = DataFileWatcher(DataLoader(), DATA_WATCH_INTERVAL_SECONDS)
+    watcher.start()
+    return watcher
@@ -1,32 +1,185 @@
 # app/routers/discover.py
-from fastapi import APIRouter, HTTPException
-from typing import Dict, Any, List
-from app.models import OptimalRouteRequest, OptimalRouteResultSchema, CafeRouteItemSchema
-from app.utils.cost_calculator import build_preference_graph, haversine_distance, get_route_polyline
-from app.utils.graph_algorithms import dijkstra_algorithm, floyd_warshall_algorithm, bellman_ford_algorithm
+import heapq
+import json
+import os
+import secrets
+import time
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import Dict, Any, List, Optional, Tuple
+from app.models import (
+    BatchOptimalRouteRequest,
+    BatchOptimalRouteResultSchema,
+    BatchOriginResultSchema,
+    CafeCrawlRequest,
+    CafeCrawlResultSchema,
+    CafeCrawlRouteSchema,
+    CafeCrawlStopSchema,
+    CafeRouteItemSchema,
+    OptimalRouteRequest,
+    OptimalRouteResultSchema,
+)
+from app.utils.cache import LRUCache
+from app.utils.cafe_crawl import plan_cafe_crawl
+from app.utils.data_loader import DataLoader
+from app.utils.cost_calculator import (
+    build_preference_graph,
+    fetch_route_polylines,
+    get_route_polylines,
+    iter_route_polylines,
+    rank_many_origins,
+    route_cache,
+)
+from app.utils.graph_algorithms import (
+    GraphTooLargeError,
+    bellman_ford_algorithm,
+    dijkstra_algorithm,
+    direct_star_algorithm,
+    floyd_warshall_algorithm,
+    is_star_graph,
+    spfa_algorithm,
+)
+from app.utils.schedule_index import cafe_local_time
+from app.utils.timing import StageTimer, TimingHistogram
 
 router = APIRouter(
     prefix="/discover",
     tags=["Discover (Graph Algorithms)"],
 )
 
+# Rankings pendientes de polylines: route_token -> (lat, lon del usuario, [(cafeteria_id, lat, lon)])
+ROUTE_TOKEN_TTL_SECONDS = 10 * 60
+_route_tokens = LRUCache(maxsize=10000, ttl_seconds=ROUTE_TOKEN_TTL_SECONDS)
+
+# Caché de resultados de optimal_route: clave = algoritmo + filtros canónicos + ubicación en rejilla
+DISCOVER_CACHE_GRID_DEG = float(os.getenv("DISCOVER_CACHE_GRID_DEG", "0.001"))  # ~110 m
+_result_cache = LRUCache(
+    maxsize=int(os.getenv("DISCOVER_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("DISCOVER_CACHE_TTL_SECONDS", "300")),
+)
+
+# Algoritmos aceptados en optimal_route ("Directo": ranking directo del grafo estrella)
+SUPPORTED_ALGORITHMS = ("Dijkstra", "Floyd-Warshall", "Bellman-Ford", "SPFA", "Directo")
+
+# Duración por etapa de optimal_route (en memoria, por worker)
+_timings_histogram = TimingHistogram()
+
+
+def _canonical_filters(filters: Dict[str, Any]) -> str:
+    """
+    JSON canónico de los filtros: claves ordenadas, listas ordenadas y sin los
+    valores que equivalen a no filtrar (None, False, '', []).
+    """
+    canonical = {}
+    for key, value in filters.items():
+        if value is None or value is False or value == '' or value == []:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = sorted(value, key=str)
+        canonical[key] = value
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+
+def _result_cache_key(request: OptimalRouteRequest) -> tuple:
+    grid = DISCOVER_CACHE_GRID_DEG
+    lat = round(request.user_location.latitude / grid)
+    lon = round(request.user_location.longitude / grid)
+    # abierto_ahora depende de la hora: la entrada solo vale para el minuto actual
+    minute = cafe_local_time().strftime("%Y-%m-%dT%H:%M") if request.filters.get('abierto_ahora') else None
+    return (
+        DataLoader().data_version,
+        request.algorithm,
+        _canonical_filters(request.filters),
+        lat,
+        lon,
+        request.top_k,
+        request.include_routes,
+        request.include_timings,
+        request.force_algorithm,
+        minute,
+    )
+
 @router.post("/optimal_route/", response_model=OptimalRouteResultSchema)
 def calculate_optimal_route(request: OptimalRouteRequest):
     """
     Calcula la ruta óptima desde la ubicación del usuario a las cafeterías
     usando el algoritmo de grafo seleccionado y las preferencias ponderadas.
+
+    Los resultados se guardan en caché (ubicación ajustada a una rejilla de
+    DISCOVER_CACHE_GRID_DEG grados); la cabecera `X-Cache` indica HIT o MISS.
+
+    La cabecera `Server-Timing` lleva la duración de cada etapa (filter,
+    graph_build, algorithm, ranking, route_fetch, serialization); con
+    `include_timings=true` también van en `timings` (salvo serialization,
+    que ocurre después de construir el cuerpo). Son siempre las de la
+    petición actual: en un HIT, solo cache_lookup.
+    """
+    timer = StageTimer()
+    cache_key = _result_cache_key(request)
+    with timer.stage("cache_lookup"):
+        cached = _result_cache.get(cache_key)
+    if cached is not None:
+        payload, route_token, pending_routes = cached
+        if route_token is not None:
+            # Renovar el token para que siga vivo mientras el resultado esté en caché
+            _route_tokens.set(route_token, pending_routes)
+        if isinstance(payload, bytes):
+            body = payload
+        else:
+            # Resultado guardado sin `timings`: se rellenan con las etapas de esta petición
+            with timer.stage("serialization"):
+                body = payload.copy(update={"timings": timer.rounded()}).json().encode("utf-8")
+        return _timed_response(body, timer, "HIT")
+
+    result, pending_routes, cacheable = _compute_optimal_route(request, timer)
+    with timer.stage("serialization"):
+        body = result.json().encode("utf-8")
+    if cacheable:
+        # Con include_timings se guarda el modelo sin `timings` (las de esta petición no valen
+        # para las siguientes); si no, directamente el cuerpo ya serializado
+        payload = result.copy(update={"timings": None}) if request.include_timings else body
+        _result_cache.set(cache_key, (payload, result.route_token, pending_routes))
+    return _timed_response(body, timer, "MISS")
+
+
+def _timed_response(body: bytes, timer: StageTimer, cache_status: str) -> Response:
+    """Respuesta JSON con las cabeceras X-Cache y Server-Timing; registra las etapas en el histograma."""
+    # Los aciertos de caché van aparte para no mezclar su total con el de las peticiones calculadas
+    _timings_histogram.record(timer, total_stage="total" if cache_status == "MISS" else "total_cache_hit")
+    headers = {"X-Cache": cache_status, "Server-Timing": timer.server_timing_header()}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _compute_optimal_route(
+    request: OptimalRouteRequest, timer: StageTimer
+) -> Tuple[OptimalRouteResultSchema, Optional[tuple], bool]:
+    """
+    Construye el grafo, ejecuta el algoritmo y arma la respuesta (sin caché).
+    Devuelve también los datos registrados bajo el route_token (o None) y si
+    el resultado se puede guardar en caché (no, si algún polyline es la línea
+    recta de fallback: la próxima petición debe volver a intentar la ruta real).
+    Cada etapa se mide en `timer`.
+
+    Mientras el grafo sea una estrella (solo aristas usuario -> cafetería),
+    la distancia mínima a cada cafetería es el peso de su arista y se usa el
+    ranking directo, salvo que el cliente pida `force_algorithm`; en ese caso
+    `selected_algorithm` es "Directo".
     """
+    if request.algorithm not in SUPPORTED_ALGORITHMS:
+        raise HTTPException(status_code=400, detail=f"Algoritmo '{request.algorithm}' no soportado.")
     
     user_lat = request.user_location.latitude
     user_lon = request.user_location.longitude
     algorithm_name = request.algorithm
     filters = request.filters
+    top_k = request.top_k
     
     # 1. Construir el grafo (Nodos y Aristas ponderadas)
-    graph, all_nodes, user_node_id = build_preference_graph(
+    graph, all_nodes, user_node_id, distances_km = build_preference_graph(
         user_lat=user_lat, 
         user_lon=user_lon, 
-        filters=filters
+        filters=filters,
+        timer=timer
     )
     
     if user_node_id not in graph:
@@ -36,77 +189,231 @@ def calculate_optimal_route(request: OptimalRouteRequest):
     distances: Dict[Any, float] = {}
     processing_time: float = 0.0
     big_o: str = ""
+
+    star = is_star_graph(graph, user_node_id)
+    if algorithm_name == "Directo" and not star:
+        raise HTTPException(status_code=400, detail="El ranking directo solo es válido para grafos estrella.")
     
-    if algorithm_name == "Dijkstra":
-        distances, processing_time, big_o = dijkstra_algorithm(graph, user_node_id)
+    if star and (algorithm_name == "Directo" or not request.force_algorithm):
+        # Grafo estrella: distancia mínima = peso de la arista (top-k por selección parcial)
+        algorithm_name = "Directo"
+        distances, processing_time, big_o = direct_star_algorithm(graph, user_node_id, k=top_k)
+    elif algorithm_name == "Dijkstra":
+        distances, processing_time, big_o = dijkstra_algorithm(graph, user_node_id, k=top_k)
     elif algorithm_name == "Floyd-Warshall":
         # Nota: Floyd-Warshall requiere aristas entre todos los nodos para ser útil.
         # Aquí lo simularemos extrayendo solo las distancias desde el nodo de usuario.
-        all_dist, processing_time, big_o = floyd_warshall_algorithm(graph, all_nodes)
-        distances = {node: all_dist.get((user_node_id, node), float('inf')) for node in all_nodes}
-    elif algorithm_name == "Bellman-Ford":
-        distances, processing_time, big_o = bellman_ford_algorithm(graph, user_node_id, all_nodes)
+        try:
+            all_dist, processing_time, big_o = floyd_warshall_algorithm(graph, all_nodes)
+        except GraphTooLargeError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{e} Reduzca los candidatos con filtros (p.ej. distancia_max_km) o use otro algoritmo.",
+            )
+        distances = all_dist.row(user_node_id)
+    elif algorithm_name in ("Bellman-Ford", "SPFA"):
+        algorithm = bellman_ford_algorithm if algorithm_name == "Bellman-Ford" else spfa_algorithm
+        distances, processing_time, big_o = algorithm(graph, user_node_id, all_nodes)
         if big_o == "Ciclo Negativo Detectado":
              raise HTTPException(status_code=500, detail="El grafo contiene un ciclo negativo. Use pesos positivos.")
     else:
         raise HTTPException(status_code=400, detail=f"Algoritmo '{algorithm_name}' no soportado.")
+    timer.add("algorithm", processing_time * 1000)
 
-    # 3. Formatear y Ordenar Resultados
-    results_list: List[CafeRouteItemSchema] = []
-    
-    from app.utils.data_loader import DataLoader # Re-importar si es necesario
-    data_loader = DataLoader()
-    CAFETERIA_DATA = data_loader.cafeterias_data
-    
-    for cafe_id, optimal_cost in distances.items():
-        if cafe_id == user_node_id or optimal_cost == float('inf'):
-            continue
-            
-        cafe_data = CAFETERIA_DATA.get(cafe_id)
-        if not cafe_data:
-            continue
-            
-        cafe_lat = cafe_data['latitude'] / 10**7 # Denormalizar (datos estan en 10^7)
-        cafe_lon = cafe_data['longitude'] / 10**7
-
-        # Calcular la distancia física real para mostrarla
-        distance_km = haversine_distance(user_lat, user_lon, cafe_lat, cafe_lon)
-        
-        # Inicializar con un polyline vacío (se llenará después si es top 20)
-        route_points = []
-        
-        results_list.append(CafeRouteItemSchema(
-            cafeteria_id=cafe_id,
-            name=cafe_data['name'],
-            latitude=cafe_lat,
-            longitude=cafe_lon,
-            optimal_cost=optimal_cost,
-            distance_km=distance_km,
-            real_route_points=route_points,
-        ))
-
-    # Ordenar por el Coste Óptimo (menor coste = mejor ruta)
-    results_list.sort(key=lambda x: x.optimal_cost)
-    
-    # Limitar a los top 20 mejores resultados (para evitar saturar OSRM)
-    # El frontend puede pedir más en una siguiente consulta si lo necesita
-    MAX_RESULTS = 20
-    results_list = results_list[:MAX_RESULTS]
-    
-    # 4. Obtener polylines solo para los top 20 (paralelizar si es posible)
-    for item in results_list:
-        try:
-            route_points = get_route_polyline(user_lat, user_lon, item.latitude, item.longitude)
+    # 3. Seleccionar y Formatear los top_k Resultados
+    with timer.stage("ranking"):
+        data_loader = DataLoader()
+        CAFETERIA_DATA = data_loader.cafeterias_data
+
+        # Selección parcial con heap (menor coste = mejor ruta): O(V log k) en vez de ordenar todo
+        reachable = (
+            (optimal_cost, cafe_id)
+            for cafe_id, optimal_cost in distances.items()
+            if cafe_id != user_node_id and optimal_cost != float('inf') and cafe_id in CAFETERIA_DATA
+        )
+        top_results = heapq.nsmallest(top_k, reachable)
+
+        # Solo se construyen los modelos Pydantic de los resultados devueltos
+        results_list: List[CafeRouteItemSchema] = []
+        for optimal_cost, cafe_id in top_results:
+            cafe_data = CAFETERIA_DATA[cafe_id]
+
+            # Coordenadas ya denormalizadas por el DataLoader
+            pos = data_loader.cafeteria_pos[cafe_id]
+            cafe_lat = float(data_loader.cafeteria_lat[pos])
+            cafe_lon = float(data_loader.cafeteria_lon[pos])
+
+            results_list.append(CafeRouteItemSchema(
+                cafeteria_id=cafe_id,
+                name=cafe_data['name'],
+                latitude=cafe_lat,
+                longitude=cafe_lon,
+                optimal_cost=optimal_cost,
+                # Distancia física real (calculada una sola vez al construir el grafo)
+                distance_km=distances_km[cafe_id],
+                real_route_points=[],  # Se llena en el paso 4
+            ))
+
+    # 4. Obtener polylines solo para los top_k (en paralelo, con plazo total por petición),
+    #    o dejarlos para GET /discover/routes/{route_token} si el cliente quiere el ranking ya
+    route_token = None
+    pending_routes = None
+    fallbacks = 0
+    if request.include_routes:
+        with timer.stage("route_fetch"):
+            routes, fallbacks = fetch_route_polylines(
+                user_lat, user_lon, [(item.latitude, item.longitude) for item in results_list]
+            )
+        for item, route_points in zip(results_list, routes):
             item.real_route_points = route_points
-        except Exception as e:
-            print(f"Advertencia: No se pudo obtener polyline para cafeteria {item.cafeteria_id}: {e}")
-            # Dejar polyline vacío (fallback)
-            item.real_route_points = []
+    else:
+        route_token = secrets.token_urlsafe(16)
+        pending_routes = (
+            user_lat,
+            user_lon,
+            [(item.cafeteria_id, item.latitude, item.longitude) for item in results_list],
+        )
+        _route_tokens.set(route_token, pending_routes)
     
-    # 4. Devolver la Respuesta
-    return OptimalRouteResultSchema(
+    # 5. Devolver la Respuesta
+    result = OptimalRouteResultSchema(
         ordered_cafeterias=results_list,
         selected_algorithm=algorithm_name,
         big_o_notation=big_o,
         processing_time_ms=int(processing_time * 1000),
-    )
\ No newline at end of file
+        route_token=route_token,
+        timings=timer.rounded() if request.include_timings else None,
+    )
+    return result, pending_routes, fallbacks == 0
+
+
+@router.post("/optimal_route/batch/", response_model=BatchOptimalRouteResultSchema)
+def calculate_optimal_routes_batch(request: BatchOptimalRouteRequest):
+    """
+    Ranking de cafeterías para muchos orígenes con los mismos filtros (p.ej.
+    la precarga nocturna de recomendaciones). Da el mismo orden que
+    optimal_route por origen (coste = distancia + preferencias), pero evalúa
+    los filtros una sola vez y las distancias en bloques vectorizados.
+    No incluye polylines.
+    """
+    data_loader = DataLoader()
+    CAFETERIA_DATA = data_loader.cafeterias_data
+
+    start_time = time.perf_counter()
+    origins = [(origin.latitude, origin.longitude) for origin in request.origins]
+    rankings = rank_many_origins(origins, request.filters, request.top_k)
+    processing_time = time.perf_counter() - start_time
+
+    results: List[BatchOriginResultSchema] = []
+    for origin, ranking in zip(request.origins, rankings):
+        items = []
+        for optimal_cost, cafe_id, distance_km in ranking:
+            pos = data_loader.cafeteria_pos[cafe_id]
+            items.append(CafeRouteItemSchema(
+                cafeteria_id=cafe_id,
+                name=CAFETERIA_DATA.get(cafe_id, {}).get('name', ''),
+                latitude=float(data_loader.cafeteria_lat[pos]),
+                longitude=float(data_loader.cafeteria_lon[pos]),
+                optimal_cost=optimal_cost,
+                distance_km=distance_km,
+            ))
+        results.append(BatchOriginResultSchema(user_location=origin, ordered_cafeterias=items))
+
+    return BatchOptimalRouteResultSchema(
+        results=results,
+        # B orígenes x V cafeterías (distancias) + selección parcial de k por fila
+        big_o_notation="O(B * V)",
+        processing_time_ms=int(processing_time * 1000),
+    )
+
+
+@router.post("/crawl/", response_model=CafeCrawlResultSchema)
+def plan_crawl(request: CafeCrawlRequest):
+    """
+    Rutas de varias paradas ("café crawl"): `stops` cafeterías distintas que
+    cumplen los filtros, encadenadas sobre el grafo de vecinas más cercanas
+    que el DataLoader precalcula al cargar los datos. Coste = suma de los
+    tramos en km + coste de preferencias de cada parada.
+    """
+    data_loader = DataLoader()
+    CAFETERIA_DATA = data_loader.cafeterias_data
+
+    start_time = time.perf_counter()
+    crawl_routes = plan_cafe_crawl(
+        request.user_location.latitude,
+        request.user_location.longitude,
+        request.filters,
+        stops=request.stops,
+        beam_width=request.beam_width,
+        top_k=request.top_k,
+    )
+    processing_time = time.perf_counter() - start_time
+
+    routes: List[CafeCrawlRouteSchema] = []
+    for total_cost, path, legs, prefs in crawl_routes:
+        stops = []
+        for pos, leg_km, pref in zip(path, legs, prefs):
+            cafe_id = int(data_loader.cafeteria_ids[pos])
+            stops.append(CafeCrawlStopSchema(
+                cafeteria_id=cafe_id,
+                name=CAFETERIA_DATA.get(cafe_id, {}).get('name', ''),
+                latitude=float(data_loader.cafeteria_lat[pos]),
+                longitude=float(data_loader.cafeteria_lon[pos]),
+                leg_distance_km=leg_km,
+                preference_cost=pref,
+            ))
+        routes.append(CafeCrawlRouteSchema(stops=stops, total_cost=total_cost, total_distance_km=sum(legs)))
+
+    return CafeCrawlResultSchema(
+        routes=routes,
+        # Búsqueda en haz: B rutas parciales x k vecinas por paso
+        big_o_notation="O(V + N * B * k log B)",
+        processing_time_ms=int(processing_time * 1000),
+    )
+
+
+@router.get("/routes/{route_token}")
+def get_routes(route_token: str, stream: bool = Query(True)):
+    """
+    Polylines de un ranking pedido con `include_routes=false`.
+    - stream=true (por defecto): NDJSON, una línea
+      {"cafeteria_id": ..., "real_route_points": [...]} por cafetería, en el
+      orden en que se calculan.
+    - stream=false: una sola respuesta JSON con todas las rutas, en el orden del ranking.
+    """
+    pending = _route_tokens.get(route_token)
+    if pending is None:
+        raise HTTPException(status_code=404, detail="route_token no encontrado o expirado.")
+    user_lat, user_lon, items = pending
+    destinations = [(lat, lon) for _, lat, lon in items]
+
+    if not stream:
+        routes = get_route_polylines(user_lat, user_lon, destinations)
+        return [
+            {"cafeteria_id": cafe_id, "real_route_points": points}
+            for (cafe_id, _, _), points in zip(items, routes)
+        ]
+
+    def ndjson_lines():
+        for i, points in iter_route_polylines(user_lat, user_lon, destinations):
+            yield json.dumps({"cafeteria_id": items[i][0], "real_route_points": points}) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+@router.get("/route_cache/stats")
+def get_route_cache_stats() -> Dict[str, Any]:
+    """Contadores de aciertos/fallos de la caché de polylines."""
+    return route_cache.stats()
+
+
+@router.get("/result_cache/stats")
+def get_result_cache_stats() -> Dict[str, Any]:
+    """Contadores de aciertos/fallos de la caché de resultados de optimal_route."""
+    return {**_result_cache.stats(), "grid_deg": DISCOVER_CACHE_GRID_DEG}
+
+
+@router.get("/timings/stats")
+def get_timings_stats() -> Dict[str, Any]:
+    """Histograma (por worker) de la duración de cada etapa de optimal_route, en ms."""
+    return _timings_histogram.snapshot()
@@ -0,0 +1,52 @@
+# app/utils/frame_records.py
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class FrameRecords(Mapping):
+    """
+    Vista de solo lectura {id: {columna: valor}} sobre un DataFrame, con el
+    mismo contenido que `df.set_index(id_col).to_dict('index')` pero sin
+    copiar los datos: solo se guarda la posición de cada id, y la fila se
+    construye al leerla a partir de los arrays de las columnas (que pueden
+    estar mapeados en memoria desde la instantánea).
+    """
+
+    def __init__(self, df: pd.DataFrame, id_col: str):
+        ids = df[id_col].tolist() if id_col in df.columns else []
+        self._pos: Dict[Any, int] = {cid: pos for pos, cid in enumerate(ids)}
+        # (columna, valores o códigos, categorías si es categórica)
+        self._columns: List[Tuple[str, np.ndarray, Optional[np.ndarray]]] = []
+        for col in df.columns:
+            if col == id_col:
+                continue
+            values = df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                categories = np.asarray(values.cat.categories, dtype=object)
+                self._columns.append((col, values.cat.codes.to_numpy(), categories))
+            else:
+                self._columns.append((col, values.to_numpy(), None))
+
+    def __getitem__(self, key) -> Dict[str, Any]:
+        pos = self._pos[key]
+        row: Dict[str, Any] = {}
+        for col, values, categories in self._columns:
+            value = values[pos]
+            if categories is not None:
+                row[col] = categories[value] if value >= 0 else np.nan
+            else:
+                # Tipos nativos de Python, como to_dict
+                row[col] = value.item() if isinstance(value, np.generic) else value
+        return row
+
+    def __contains__(self, key) -> bool:
+        # Sin construir la fila (discover lo comprueba para cada cafetería alcanzable)
+        return key in self._pos
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._pos)
+
+    def __len__(self) -> int:
+        return len(self._pos)
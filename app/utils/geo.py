@@ -0,0 +1,33 @@
+# app/utils/geo.py
+import numpy as np
+from math import radians, sin, cos, sqrt, atan2
+
+# --- Constante de Distancia (Radio de la Tierra en km) ---
+R = 6371.0
+
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calcula la distancia Haversine entre dos puntos en kilómetros."""
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+
+    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    distance = R * c
+    return distance
+
+
+def haversine_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Versión vectorizada de `haversine_distance`: distancia (km) desde el punto
+    (lat, lon) a cada punto de los arrays `lats`/`lons` (float64 contiguos).
+    Admite broadcasting, p.ej. `lat` de forma (m, 1) contra arrays de forma (n,).
+    """
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
@@ -1,113 +1,334 @@
 # app/utils/graph_algorithms.py
 import heapq
+import os
 import time
-from typing import Dict, List, Tuple
+from collections import deque
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
-# La estructura del grafo será un diccionario: 
-# {nodo_origen: {nodo_destino: peso}}
+import numpy as np
 
-def dijkstra_algorithm(graph: Dict[int, Dict[int, float]], start_node: int) -> Tuple[Dict[int, float], float, str]:
-    """Calcula la ruta más corta desde un nodo de inicio usando Dijkstra."""
-    start_time = time.time()
-    
-    # Construir el conjunto completo de nodos: claves del grafo y todos los vecinos
-    nodes = set(graph.keys())
-    for neighbours in graph.values():
-        nodes.update(neighbours.keys())
-
-    # {nodo: distancia_minima} inicializado con infinito
-    distances: Dict[int, float] = {node: float('inf') for node in nodes}
-    # Asegurarse de inicializar la distancia del nodo inicial aunque no esté en las claves
-    distances[start_node] = 0
+from app.utils.csr_graph import CSRGraph, DictGraph, as_csr
+
+# Límite de nodos para Floyd-Warshall (matriz V x V en memoria, O(V^3) operaciones).
+# Según benchmark_graph_algorithms: ~0.1 s con 300 nodos, pero 3-4.5 s con 1000 (no cabe en una petición)
+FLOYD_WARSHALL_MAX_NODES = int(os.getenv("FLOYD_WARSHALL_MAX_NODES", "300"))
+
+# Los grafos son CSRGraph (ver app/utils/csr_graph.py). Por compatibilidad,
+# todas las funciones aceptan también el formato {nodo_origen: {nodo_destino: peso}}.
+Graph = Union[CSRGraph, DictGraph]
+
+
+def _restrict(graph: CSRGraph, nodes: Optional[List[int]]) -> CSRGraph:
+    """
+    CSR con exactamente los nodos de `nodes` (en ese orden), descartando las
+    aristas cuyos extremos no están en la lista. Sin `nodes`, el grafo tal cual.
+    """
+    if nodes is None:
+        return graph
+    nodes = list(dict.fromkeys(nodes))
+    if nodes == graph.node_ids.tolist():
+        return graph
+    index = {node: i for i, node in enumerate(nodes)}
+    mapping = np.array([index.get(node, -1) for node in graph.node_ids.tolist()], dtype=np.int64)
+    src = mapping[graph.edge_sources()]
+    dst = mapping[graph.indices]
+    keep = (src >= 0) & (dst >= 0)
+    return CSRGraph.from_arrays(nodes, src[keep], dst[keep], graph.weights[keep])
+
+
+def dijkstra_algorithm(
+    graph: Graph,
+    start_node: int,
+    k: Optional[int] = None
+) -> Tuple[Dict[int, float], float, str]:
+    """
+    Calcula la ruta más corta desde un nodo de inicio usando Dijkstra.
+
+    Si se indica `k`, se detiene en cuanto `k` nodos (distintos del inicial)
+    quedan asentados y solo devuelve las distancias de los nodos asentados,
+    que son los `k` más cercanos. La parada temprana es exacta con pesos no
+    negativos o, como en el grafo estrella de discover, cuando las aristas
+    negativas solo salen del nodo inicial.
+    """
+    graph = as_csr(graph)
+    start_time = time.perf_counter()
+
+    node_ids = graph.node_ids.tolist()
+    indptr = graph.indptr.tolist()
+    # Las aristas se leen por nodo (solo las de los nodos que se visitan, útil con parada temprana)
+    indices, weights = graph.indices, graph.weights
+
+    # distancias[posición]; los nodos aún no alcanzados quedan en infinito
+    distances = [float('inf')] * len(node_ids)
+    # Nodos asentados (solo se lleva la cuenta si hay parada temprana)
+    settled: Dict[int, float] = {}
+
+    start = graph.position(start_node)
+    if start is None:
+        # El nodo inicial no tiene aristas: solo él es alcanzable
+        if k is not None:
+            return {start_node: 0}, time.perf_counter() - start_time, "O(E + V log V)"
+        result = dict.fromkeys(node_ids, float('inf'))
+        result[start_node] = 0
+        return result, time.perf_counter() - start_time, "O(E + V log V)"
+    distances[start] = 0
     
-    # Cola de prioridad: [(distancia, nodo)]
-    priority_queue = [(0, start_node)]
+    # Cola de prioridad: [(distancia, posición)]
+    priority_queue = [(0, start)]
     
     while priority_queue:
-        current_distance, current_node = heapq.heappop(priority_queue)
+        current_distance, current = heapq.heappop(priority_queue)
         
         # Ignorar si ya encontramos una ruta más corta
-        if current_distance > distances[current_node]:
+        if current_distance > distances[current]:
             continue
+
+        if k is not None and node_ids[current] not in settled:
+            settled[node_ids[current]] = current_distance
+            # +1 por el nodo inicial
+            if len(settled) > k:
+                break
             
-        for neighbor, weight in graph.get(current_node, {}).items():
+        start, end = indptr[current], indptr[current + 1]
+        for neighbor, weight in zip(indices[start:end].tolist(), weights[start:end].tolist()):
             distance = current_distance + weight
             
             if distance < distances[neighbor]:
                 distances[neighbor] = distance
                 heapq.heappush(priority_queue, (distance, neighbor))
                 
-    processing_time = time.time() - start_time
-    
+    processing_time = time.perf_counter() - start_time
+
+    if k is not None:
+        return settled, processing_time, "O(E + V log V)"
+
+    # Todos los nodos del grafo (inalcanzables = infinito)
     # La complejidad O(E + V log V) asume el uso de un heap binario.
-    return distances, processing_time, "O(E + V log V)"
+    return dict(zip(node_ids, distances)), processing_time, "O(E + V log V)"
 
 
-def floyd_warshall_algorithm(graph: Dict[int, Dict[int, float]], nodes: List[int]) -> Tuple[Dict[Tuple[int, int], float], float, str]:
-    """Calcula las rutas más cortas entre todos los pares de nodos."""
-    start_time = time.time()
-    num_nodes = len(nodes)
-    
-    # Inicializa las distancias: { (origen, destino): distancia }
-    dist: Dict[Tuple[int, int], float] = {}
-    
-    for i in nodes:
-        for j in nodes:
-            if i == j:
-                dist[(i, j)] = 0.0
-            elif j in graph.get(i, {}):
-                dist[(i, j)] = graph[i][j]
-            else:
-                dist[(i, j)] = float('inf')
+def is_star_graph(graph: Graph, center: int) -> bool:
+    """
+    True si todas las aristas salen de `center`, ninguna vuelve a él y no
+    hay dos aristas al mismo destino (como el grafo de `build_preference_graph`).
+    En ese caso, la distancia mínima a cada nodo es el peso de su arista.
+    """
+    graph = as_csr(graph)
+    c = graph.position(center)
+    if c is None:
+        return False
+    start, end = graph.indptr[c], graph.indptr[c + 1]
+    if end - start != graph.num_edges:
+        return False
+    targets = graph.indices
+    return not (targets == c).any() and len(np.unique(targets)) == len(targets)
+
+
+def direct_star_algorithm(
+    graph: Graph,
+    start_node: int,
+    k: Optional[int] = None
+) -> Tuple[Dict[int, float], float, str]:
+    """
+    Ranking directo para grafos estrella (ver `is_star_graph`): la distancia
+    mínima a cada nodo es el peso de su arista desde el centro, así que basta
+    con leer ese array y, con `k`, quedarse con los `k` menores (selección
+    parcial O(V), sin cola de prioridad). Admite pesos negativos.
+
+    Con `k` devuelve el nodo inicial, los `k` más cercanos y los empatados con
+    el k-ésimo (para que el llamador desempate como quiera); sin `k`, todos
+    los nodos, como `dijkstra_algorithm`.
+    """
+    graph = as_csr(graph)
+    if not is_star_graph(graph, start_node):
+        raise ValueError("El ranking directo solo es válido para grafos estrella.")
+    start_time = time.perf_counter()
+
+    c = graph.position(start_node)
+    start, end = graph.indptr[c], graph.indptr[c + 1]
+    targets = graph.indices[start:end]
+    weights = graph.weights[start:end]
+
+    if k is not None and k < len(weights):
+        kth = np.partition(weights, k - 1)[k - 1] if k > 0 else -np.inf
+        selected = weights <= kth
+        targets, weights = targets[selected], weights[selected]
+        distances = {start_node: 0}
+    else:
+        distances = dict.fromkeys(graph.node_ids.tolist(), float('inf')) if k is None else {}
+        distances[start_node] = 0
+    distances.update(zip(graph.node_ids[targets].tolist(), weights.tolist()))
+
+    processing_time = time.perf_counter() - start_time
+
+    # Una pasada por las aristas del centro (+ selección parcial)
+    return distances, processing_time, "O(V)"
+
+
+class GraphTooLargeError(ValueError):
+    """El grafo supera el número de nodos permitido para un algoritmo O(V^3)/O(V^2) en memoria."""
+
+
+class DistanceMatrix(Mapping):
+    """
+    Vista de solo lectura {(origen, destino): distancia} sobre la matriz densa
+    de Floyd-Warshall. Se usa igual que el diccionario que devolvía la versión
+    anterior (`dist[(i, j)]`, `dist.get((i, j), inf)`), sin materializar V^2 tuplas.
+    """
+
+    def __init__(self, matrix: np.ndarray, nodes: List[int]):
+        self.matrix = matrix
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+
+    def __getitem__(self, key: Tuple[int, int]) -> float:
+        i, j = key
+        return float(self.matrix[self.index[i], self.index[j]])
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        for i in self.nodes:
+            for j in self.nodes:
+                yield (i, j)
+
+    def __len__(self) -> int:
+        return len(self.nodes) ** 2
+
+    def row(self, node: int) -> Dict[int, float]:
+        """Distancias desde `node` a todos los nodos: {destino: distancia}."""
+        return dict(zip(self.nodes, self.matrix[self.index[node]].tolist()))
+
+
+def floyd_warshall_algorithm(
+    graph: Graph,
+    nodes: Optional[List[int]] = None,
+    max_nodes: Optional[int] = None,
+    dtype: type = np.float64
+) -> Tuple[DistanceMatrix, float, str]:
+    """
+    Calcula las rutas más cortas entre todos los pares de nodos (`nodes`, o
+    todos los del grafo).
+
+    Usa una matriz de adyacencia densa y, para cada k, actualiza toda la
+    matriz con un `minimum` vectorizado (fila k + columna k). Falla de
+    inmediato con `GraphTooLargeError` si hay más de `max_nodes` nodos
+    (por defecto FLOYD_WARSHALL_MAX_NODES), en vez de bloquear el worker.
+    """
+    if max_nodes is None:
+        max_nodes = FLOYD_WARSHALL_MAX_NODES
+    graph = as_csr(graph, nodes)
+    num_nodes = len(dict.fromkeys(nodes)) if nodes is not None else graph.num_nodes
+    if num_nodes > max_nodes:
+        raise GraphTooLargeError(
+            f"Floyd-Warshall admite como máximo {max_nodes} nodos y el grafo tiene {num_nodes}."
+        )
+
+    start_time = time.perf_counter()
+    graph = _restrict(graph, nodes)
+
+    # Inicializa las distancias: infinito, salvo aristas directas y la diagonal (0)
+    dist = np.full((num_nodes, num_nodes), np.inf, dtype=dtype)
+    np.minimum.at(dist, (graph.edge_sources(), graph.indices), graph.weights.astype(dtype))
+    np.fill_diagonal(dist, 0.0)
                 
-    # Algoritmo de Floyd-Warshall
-    for k in nodes:
-        for i in nodes:
-            for j in nodes:
-                current_dist = dist.get((i, j), float('inf'))
-                through_k = dist.get((i, k), float('inf')) + dist.get((k, j), float('inf'))
-                if through_k < current_dist:
-                    dist[(i, j)] = through_k
+    # Algoritmo de Floyd-Warshall: dist = min(dist, dist[:, k] + dist[k, :])
+    # (se reutiliza un único buffer temporal para no reservar V^2 floats por iteración)
+    candidate = np.empty_like(dist)
+    for k in range(num_nodes):
+        np.add(dist[:, k, None], dist[None, k, :], out=candidate)
+        np.minimum(dist, candidate, out=dist)
                     
-    processing_time = time.time() - start_time
+    processing_time = time.perf_counter() - start_time
     
     # La complejidad es O(V^3)
-    return dist, processing_time, "O(V^3)"
+    return DistanceMatrix(dist, graph.node_ids.tolist()), processing_time, "O(V^3)"
 
 
-def bellman_ford_algorithm(graph: Dict[int, Dict[int, float]], start_node: int, nodes: List[int]) -> Tuple[Dict[int, float], float, str]:
+def bellman_ford_algorithm(graph: Graph, start_node: int, nodes: Optional[List[int]] = None) -> Tuple[Dict[int, float], float, str]:
     """
     Calcula la ruta más corta desde un nodo de inicio, manejando pesos negativos.
     También detecta ciclos de peso negativo.
+
+    Cada pasada relaja todas las aristas a la vez sobre los arrays del CSR y
+    el algoritmo termina en cuanto una pasada no mejora ninguna distancia (en
+    el grafo estrella de discover, tras la segunda).
     """
-    start_time = time.time()
+    graph = _restrict(as_csr(graph, nodes), nodes)
+    start_time = time.perf_counter()
     
-    # {nodo: distancia_minima}
-    distances: Dict[int, float] = {node: float('inf') for node in nodes}
-    distances[start_node] = 0
-    
-    # Recolectar todas las aristas (edges)
-    edges: List[Tuple[int, int, float]] = []
-    for u, neighbors in graph.items():
-        for v, weight in neighbors.items():
-            edges.append((u, v, weight))
-            
-    num_nodes = len(nodes)
-    
-    # Paso 1: Relajación de aristas |V| - 1 veces
-    for _ in range(num_nodes - 1):
-        for u, v, weight in edges:
-            if distances[u] != float('inf') and distances[u] + weight < distances[v]:
-                distances[v] = distances[u] + weight
-                
-    # Paso 2: Detección de ciclos de peso negativo
-    for u, v, weight in edges:
-        if distances[u] != float('inf') and distances[u] + weight < distances[v]:
-            # Este es un ciclo negativo. En un caso real, deberías lanzar un error.
-            # Aquí, simplemente retornamos un indicador.
+    num_nodes = graph.num_nodes
+    src, dst, weights = graph.edge_sources(), graph.indices, graph.weights
+
+    # distancias[posición] = distancia mínima
+    dist = np.full(num_nodes, np.inf)
+    start = graph.position(start_node)
+    if start is not None:
+        dist[start] = 0.0
+
+    # Paso 1: Relajación de aristas hasta |V| - 1 veces (o hasta que nada cambie)
+    # Paso 2: si tras |V| - 1 pasadas todavía mejora alguna distancia, hay un ciclo negativo
+    for _ in range(num_nodes):
+        candidate = dist.copy()
+        np.minimum.at(candidate, dst, dist[src] + weights)
+        if not (candidate < dist).any():
+            break
+        dist = candidate
+    else:
+        if num_nodes > 0:
             return {}, 0.0, "Ciclo Negativo Detectado"
+
+    distances: Dict[int, float] = dict(zip(graph.node_ids.tolist(), dist.tolist()))
             
-    processing_time = time.time() - start_time
+    processing_time = time.perf_counter() - start_time
     
     # La complejidad es O(V * E)
-    return distances, processing_time, "O(V * E)"
\ No newline at end of file
+    return distances, processing_time, "O(V * E)"
+
+
+def spfa_algorithm(graph: Graph, start_node: int, nodes: Optional[List[int]] = None) -> Tuple[Dict[int, float], float, str]:
+    """
+    Bellman-Ford con cola (SPFA): solo se vuelven a relajar las aristas de los
+    nodos cuya distancia acaba de mejorar. Admite pesos negativos y detecta
+    ciclos negativos (un camino mínimo con |V| aristas o más).
+    """
+    graph = _restrict(as_csr(graph, nodes), nodes)
+    start_time = time.perf_counter()
+
+    num_nodes = graph.num_nodes
+    indptr = graph.indptr.tolist()
+    neighbors = graph.indices.tolist()
+    edge_weights = graph.weights.tolist()
+
+    dist = [float('inf')] * num_nodes
+    in_queue = [False] * num_nodes
+    # Número de aristas del mejor camino encontrado hasta cada nodo
+    path_edges = [0] * num_nodes
+    queue: deque = deque()
+    start = graph.position(start_node)
+    if start is not None:
+        dist[start] = 0.0
+        queue.append(start)
+        in_queue[start] = True
+
+    while queue:
+        u = queue.popleft()
+        in_queue[u] = False
+        base = dist[u]
+        for e in range(indptr[u], indptr[u + 1]):
+            v = neighbors[e]
+            cost = base + edge_weights[e]
+            if cost < dist[v]:
+                dist[v] = cost
+                path_edges[v] = path_edges[u] + 1
+                if path_edges[v] >= num_nodes:
+                    return {}, 0.0, "Ciclo Negativo Detectado"
+                if not in_queue[v]:
+                    queue.append(v)
+                    in_queue[v] = True
+
+    distances: Dict[int, float] = dict(zip(graph.node_ids.tolist(), dist))
+
+    processing_time = time.perf_counter() - start_time
+
+    # Peor caso O(V * E); en la práctica cerca de O(E)
+    return distances, processing_time, "O(V * E)"
@@ -0,0 +1,72 @@
+# app/utils/knn_graph.py
+import numpy as np
+from typing import Tuple
+from app.utils.spatial_index import SpatialIndex
+
+
+class KNNGraph:
+    """
+    Grafo disperso de k vecinos más cercanos entre cafeterías, en formato CSR:
+    los vecinos de la posición `i` son `indices[indptr[i]:indptr[i + 1]]`, con
+    su distancia Haversine en km en `weights`, ordenados por distancia.
+
+    Las posiciones son las de la matriz de características del DataLoader. Se
+    construye una vez al cargar los datos y lo reutilizan todas las peticiones
+    de rutas de varias paradas.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    @classmethod
+    def empty(cls, size: int = 0) -> 'KNNGraph':
+        return cls(np.zeros(size + 1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+
+    @classmethod
+    def build(
+        cls,
+        lats: np.ndarray,
+        lons: np.ndarray,
+        valid: np.ndarray,
+        spatial_index: SpatialIndex,
+        k: int = 8,
+        max_km: float = 3.0,
+    ) -> 'KNNGraph':
+        """
+        Para cada cafetería con coordenadas, sus `k` vecinas más cercanas dentro
+        de `max_km` (puede tener menos si está aislada). Las consultas usan el
+        índice espacial, así que no se calcula la matriz completa de distancias.
+        """
+        n = len(lats)
+        counts = np.zeros(n, dtype=np.int64)
+        neighbor_chunks = []
+        weight_chunks = []
+        for pos in np.flatnonzero(valid).tolist():
+            positions, distances = spatial_index.nearest(lats[pos], lons[pos], max_km, k + 1)
+            # La propia cafetería (y duplicados exactos de coordenadas siguen siendo vecinos válidos)
+            keep = positions != pos
+            positions, distances = positions[keep][:k], distances[keep][:k]
+            counts[pos] = len(positions)
+            neighbor_chunks.append(positions)
+            weight_chunks.append(distances)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        if not neighbor_chunks:
+            return cls.empty(n)
+        return cls(
+            indptr,
+            np.concatenate(neighbor_chunks).astype(np.int32),
+            np.concatenate(weight_chunks).astype(np.float32),
+        )
+
+    def neighbors(self, position: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(posiciones, distancias_km) de las vecinas de `position`."""
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def __len__(self) -> int:
+        """Número de aristas (dirigidas)."""
+        return len(self.indices)
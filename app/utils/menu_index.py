@@ -0,0 +1,55 @@
+# app/utils/menu_index.py
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable
+
+
+def bitset_to_mask(bits: np.ndarray, size: int) -> np.ndarray:
+    """Convierte un bitset (np.packbits) en un array booleano de `size` elementos."""
+    return np.unpackbits(bits, count=size).astype(bool)
+
+
+class MenuIndex:
+    """
+    Índice invertido {categoría_en_minúsculas: bitset de cafeterías}.
+
+    Cada bitset es un array `np.packbits` (1 bit por cafetería) alineado con el
+    orden de la matriz de características del DataLoader, así que combinar
+    filtros es un AND/OR bit a bit sobre unos pocos cientos de bytes.
+    """
+
+    def __init__(self, size: int, bitsets: Dict[str, np.ndarray] = None):
+        self.size = size
+        self._bitsets: Dict[str, np.ndarray] = bitsets or {}
+        self._empty = np.zeros((size + 7) // 8, dtype=np.uint8)
+
+    @classmethod
+    def build(cls, index: pd.Index, keys: pd.Series, values: pd.Series) -> 'MenuIndex':
+        """
+        Construye el índice a partir de una tabla de relación
+        (cafeteria_id -> categoría). `index` define el orden de las cafeterías.
+        """
+        size = len(index)
+        pos = index.get_indexer(keys)
+        valid = pos >= 0
+        codes, uniques = pd.factorize(values.astype(str).str.lower().to_numpy()[valid])
+        pos = pos[valid]
+
+        bitsets: Dict[str, np.ndarray] = {}
+        for code, categoria in enumerate(uniques):
+            flags = np.zeros(size, dtype=bool)
+            flags[pos[codes == code]] = True
+            bitsets[categoria] = np.packbits(flags)
+        return cls(size, bitsets)
+
+    def categories(self) -> Iterable[str]:
+        return self._bitsets.keys()
+
+    def any_of(self, wanted: Iterable[str]) -> np.ndarray:
+        """Bitset de las cafeterías con al menos una de las categorías pedidas."""
+        result = self._empty.copy()
+        for w in wanted:
+            bits = self._bitsets.get(w)
+            if bits is not None:
+                result |= bits
+        return result
@@ -0,0 +1,184 @@
+# app/utils/route_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.utils.cache import LRUCache
+
+RoutePoints = List[Tuple[float, float]]
+RouteKey = Tuple[float, float, float, float]
+
+# Cada cuántas escrituras en disco se purgan las filas caducadas y las que sobran del límite
+DISK_PRUNE_EVERY = 256
+
+
+class RouteCache:
+    """
+    Caché de polylines de rutas, con clave en las coordenadas de inicio y fin
+    cuantizadas (`precision` decimales; 4 ≈ 11 m), para que búsquedas repetidas
+    desde el mismo barrio no vuelvan a llamar al servicio de rutas.
+
+    - Nivel 1: memoria del proceso (LRU + TTL).
+    - Nivel 2 (opcional): SQLite en disco, sobrevive a reinicios y se comparte
+      entre workers (modo WAL). Las filas caducadas se borran al leerlas y,
+      cada DISK_PRUNE_EVERY escrituras (y al abrirla), se purgan todas las
+      caducadas y las más antiguas por encima de `disk_max_rows`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        ttl_seconds: float = 7 * 24 * 3600,
+        precision: int = 4,
+        db_path: Optional[str] = None,
+        disk_max_rows: int = 100000,
+    ):
+        self.precision = precision
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self.db_path = db_path
+        self.disk_max_rows = disk_max_rows
+        self.disk_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._disk_writes = 0
+        if db_path:
+            self._open_db(db_path)
+
+    @classmethod
+    def from_env(cls) -> 'RouteCache':
+        """Configuración por variables de entorno (ver README)."""
+        return cls(
+            maxsize=int(os.getenv("ROUTE_CACHE_SIZE", "10000")),
+            ttl_seconds=float(os.getenv("ROUTE_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+            precision=int(os.getenv("ROUTE_CACHE_PRECISION", "4")),
+            db_path=os.getenv("ROUTE_CACHE_DB") or None,
+            disk_max_rows=int(os.getenv("ROUTE_CACHE_DB_MAX_ROWS", "100000")),
+        )
+
+    # --- Nivel en disco ---
+    def _open_db(self, db_path: str) -> None:
+        try:
+            conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS routes ("
+                " key TEXT PRIMARY KEY, points TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS routes_created_at ON routes (created_at)")
+            conn.commit()
+            self._db = conn
+        except sqlite3.Error as e:
+            print(f"Advertencia: no se pudo abrir la caché de rutas en disco ({db_path}): {e}")
+            self._db = None
+            return
+        self.prune_disk()
+
+    def prune_disk(self) -> int:
+        """Borra las filas caducadas y las más antiguas por encima de `disk_max_rows`; devuelve cuántas."""
+        if self._db is None:
+            return 0
+        try:
+            with self._db_lock:
+                deleted = self._db.execute(
+                    "DELETE FROM routes WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                ).rowcount
+                excess = self._db.execute("SELECT COUNT(*) FROM routes").fetchone()[0] - self.disk_max_rows
+                if excess > 0:
+                    deleted += self._db.execute(
+                        "DELETE FROM routes WHERE key IN (SELECT key FROM routes ORDER BY created_at LIMIT ?)",
+                        (excess,),
+                    ).rowcount
+                self._db.commit()
+            return deleted
+        except sqlite3.Error as e:
+            print(f"Advertencia: no se pudo purgar la caché de rutas en disco: {e}")
+            return 0
+
+    def _disk_get(self, key: RouteKey) -> Optional[RoutePoints]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT points, created_at FROM routes WHERE key = ?", (self._disk_key(key),)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        if row[1] + self.ttl_seconds < time.time():
+            # Caducada: se borra (solo si nadie la ha reemplazado entretanto)
+            try:
+                with self._db_lock:
+                    self._db.execute(
+                        "DELETE FROM routes WHERE key = ? AND created_at = ?", (self._disk_key(key), row[1])
+                    )
+                    self._db.commit()
+            except sqlite3.Error:
+                pass
+            return None
+        return [tuple(p) for p in json.loads(row[0])]
+
+    def _disk_set(self, key: RouteKey, points: RoutePoints) -> None:
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO routes (key, points, created_at) VALUES (?, ?, ?)",
+                    (self._disk_key(key), json.dumps(points), time.time()),
+                )
+                self._db.commit()
+                self._disk_writes += 1
+                prune = self._disk_writes % DISK_PRUNE_EVERY == 0
+        except sqlite3.Error as e:
+            print(f"Advertencia: no se pudo guardar la ruta en disco: {e}")
+            return
+        if prune:
+            self.prune_disk()
+
+    @staticmethod
+    def _disk_key(key: RouteKey) -> str:
+        return ",".join(repr(c) for c in key)
+
+    # --- API pública ---
+    def make_key(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> RouteKey:
+        p = self.precision
+        return tuple(round(float(c), p) for c in (start_lat, start_lon, end_lat, end_lon))
+
+    def get(self, key: RouteKey) -> Optional[RoutePoints]:
+        points = self.memory.get(key)
+        if points is not None:
+            return points
+        points = self._disk_get(key)
+        if points is not None:
+            self.disk_hits += 1
+            self.memory.set(key, points)
+            return points
+        self.misses += 1
+        return None
+
+    def set(self, key: RouteKey, points: RoutePoints) -> None:
+        self.memory.set(key, points)
+        self._disk_set(key, points)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM routes")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk_enabled": self._db is not None,
+            "disk_max_rows": self.disk_max_rows,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "precision": self.precision,
+        }
@@ -0,0 +1,234 @@
+# app/utils/route_providers.py
+import heapq
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.utils.geo import haversine_distance, haversine_many
+from app.utils.spatial_index import SpatialIndex
+
+# `requests` y `polyline` se importan al crear/usar el proveedor OSRM, no al importar el módulo
+if TYPE_CHECKING:
+    import requests
+
+RoutePoints = List[Tuple[float, float]]
+
+DEFAULT_OSRM_URL = "http://router.project-osrm.org/route/v1/driving"
+
+
+class RouteProvider(ABC):
+    """
+    Interfaz (abstracta) de los proveedores de rutas usados por `get_route_polyline`.
+    `route` devuelve la lista de puntos (lat, lon) de la ruta, o None si el
+    proveedor no encuentra ruta (el llamador usa entonces la línea recta).
+    """
+    name = "base"
+
+    @abstractmethod
+    def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Optional[RoutePoints]:
+        ...
+
+
+class OSRMRouteProvider(RouteProvider):
+    """Rutas de un servidor OSRM (por defecto, el servidor público de demo)."""
+    name = "osrm"
+
+    def __init__(self, base_url: str = DEFAULT_OSRM_URL, session: 'requests.Session' = None, timeout: float = 5):
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.base_url = base_url
+        self.session = session
+        self.timeout = timeout
+
+    def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Optional[RoutePoints]:
+        # Formato OSRM: lng,lat (nota el orden invertido)
+        coordinates = f"{start_lon},{start_lat};{end_lon},{end_lat}"
+        url = f"{self.base_url}/{coordinates}"
+        params = {
+            "steps": "false",
+            "geometries": "polyline",  # Retorna polyline6 (comprimido)
+            "overview": "full",  # Incluye la ruta completa
+        }
+
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+
+        data = response.json()
+        if data.get("code") == "Ok" and data.get("routes"):
+            geometry_str = data["routes"][0].get("geometry", "")
+            if geometry_str:
+                # Decodificar polyline6; devuelve [(lat, lon), ...], que es lo que queremos
+                import polyline
+                return polyline.decode(geometry_str, precision=6)
+        return None
+
+
+class LocalGraphRouteProvider(RouteProvider):
+    """
+    Rutas sobre una red vial local (p.ej. un extracto de OSM preprocesado),
+    guardada como grafo CSR compacto y consultada con A* usando la distancia
+    Haversine como heurística. No depende de ningún servicio externo.
+
+    Formato de `road_graph_dir` (CSV separados por ';', como los datasets):
+    - nodes.csv: node_id;lat;lon
+    - edges.csv: source;target[;length_km][;oneway]
+      Sin `length_km` se usa la distancia Haversine entre los nodos; las
+      aristas son bidireccionales salvo que `oneway` sea 1/true/sí.
+    """
+    name = "local"
+
+    def __init__(
+        self,
+        node_lat: np.ndarray,
+        node_lon: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        weights: np.ndarray,
+        max_snap_km: float = 1.0,
+    ):
+        self.node_lat = node_lat
+        self.node_lon = node_lon
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.max_snap_km = max_snap_km
+        self.spatial_index = SpatialIndex(node_lat, node_lon, cell_deg=0.01)
+
+    @classmethod
+    def from_edges(
+        cls,
+        node_lat: np.ndarray,
+        node_lon: np.ndarray,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        lengths_km: np.ndarray = None,
+        oneway: np.ndarray = None,
+        max_snap_km: float = 1.0,
+    ) -> 'LocalGraphRouteProvider':
+        """Construye el CSR a partir de aristas con nodos ya numerados 0..n-1."""
+        n = len(node_lat)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if lengths_km is None:
+            lengths_km = haversine_many(node_lat[sources], node_lon[sources], node_lat[targets], node_lon[targets])
+        lengths_km = np.asarray(lengths_km, dtype=np.float64)
+
+        # Aristas de vuelta para las que no son de sentido único
+        back = np.ones(len(sources), dtype=bool) if oneway is None else ~np.asarray(oneway, dtype=bool)
+        src = np.concatenate([sources, targets[back]])
+        dst = np.concatenate([targets, sources[back]])
+        w = np.concatenate([lengths_km, lengths_km[back]])
+
+        order = np.argsort(src, kind='stable')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return cls(
+            np.ascontiguousarray(node_lat, dtype=np.float64),
+            np.ascontiguousarray(node_lon, dtype=np.float64),
+            indptr,
+            dst[order].astype(np.int32 if n < 2**31 else np.int64),
+            w[order].astype(np.float32),
+            max_snap_km=max_snap_km,
+        )
+
+    @classmethod
+    def load(cls, road_graph_dir: str, max_snap_km: float = 1.0) -> 'LocalGraphRouteProvider':
+        path = Path(road_graph_dir)
+        nodes = pd.read_csv(path / "nodes.csv", delimiter=";")
+        edges = pd.read_csv(path / "edges.csv", delimiter=";")
+
+        # Renumerar los node_id (p.ej. ids de OSM) a posiciones 0..n-1
+        node_index = pd.Index(nodes["node_id"])
+        sources = node_index.get_indexer(edges["source"])
+        targets = node_index.get_indexer(edges["target"])
+        valid = (sources >= 0) & (targets >= 0)
+        if not valid.all():
+            print(f"Advertencia: {int((~valid).sum())} aristas con nodos desconocidos en {path}")
+
+        lengths = edges["length_km"].to_numpy(dtype=np.float64)[valid] if "length_km" in edges.columns else None
+        oneway = None
+        if "oneway" in edges.columns:
+            oneway = edges["oneway"].astype(str).str.strip().str.lower().isin(["1", "true", "si", "sí", "yes"]).to_numpy()[valid]
+
+        provider = cls.from_edges(
+            nodes["lat"].to_numpy(dtype=np.float64),
+            nodes["lon"].to_numpy(dtype=np.float64),
+            sources[valid],
+            targets[valid],
+            lengths_km=lengths,
+            oneway=oneway,
+            max_snap_km=max_snap_km,
+        )
+        print(f"Red vial local cargada: {len(nodes)} nodos, {len(provider.indices)} aristas dirigidas")
+        return provider
+
+    def nearest_node(self, lat: float, lon: float) -> Optional[int]:
+        positions, _ = self.spatial_index.nearest(lat, lon, self.max_snap_km, 1)
+        return int(positions[0]) if len(positions) else None
+
+    def shortest_path(self, source: int, target: int) -> Optional[List[int]]:
+        """A* con heurística Haversine (admisible si las longitudes no son menores que la línea recta)."""
+        goal_lat, goal_lon = float(self.node_lat[target]), float(self.node_lon[target])
+        lat, lon = self.node_lat, self.node_lon
+
+        g = {source: 0.0}
+        came_from = {source: -1}
+        closed = set()
+        heap = [(haversine_distance(lat[source], lon[source], goal_lat, goal_lon), source)]
+
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node == target:
+                path = []
+                while node != -1:
+                    path.append(node)
+                    node = came_from[node]
+                return path[::-1]
+            if node in closed:
+                continue
+            closed.add(node)
+
+            start, end = self.indptr[node], self.indptr[node + 1]
+            base = g[node]
+            for neighbor, weight in zip(self.indices[start:end].tolist(), self.weights[start:end].tolist()):
+                cost = base + weight
+                if cost < g.get(neighbor, float('inf')):
+                    g[neighbor] = cost
+                    came_from[neighbor] = node
+                    h = haversine_distance(lat[neighbor], lon[neighbor], goal_lat, goal_lon)
+                    heapq.heappush(heap, (cost + h, neighbor))
+        return None
+
+    def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Optional[RoutePoints]:
+        source = self.nearest_node(start_lat, start_lon)
+        target = self.nearest_node(end_lat, end_lon)
+        if source is None or target is None:
+            return None
+        path = self.shortest_path(source, target)
+        if path is None:
+            return None
+        points = [(float(self.node_lat[n]), float(self.node_lon[n])) for n in path]
+        return [(start_lat, start_lon)] + points + [(end_lat, end_lon)]
+
+
+def provider_from_env(session: 'requests.Session' = None, timeout: float = 5) -> RouteProvider:
+    """
+    Elige el proveedor según `ROUTE_PROVIDER` ('osrm' por defecto, o 'local'
+    con la red de `ROAD_GRAPH_DIR`). Si la red local no se puede cargar, se
+    vuelve a OSRM.
+    """
+    kind = os.getenv("ROUTE_PROVIDER", "osrm").strip().lower()
+    if kind == "local":
+        road_graph_dir = os.getenv("ROAD_GRAPH_DIR", "")
+        try:
+            return LocalGraphRouteProvider.load(
+                road_graph_dir, max_snap_km=float(os.getenv("ROAD_GRAPH_MAX_SNAP_KM", "1.0"))
+            )
+        except Exception as e:
+            print(f"Error al cargar la red vial local '{road_graph_dir}': {e}. Se usa OSRM.")
+    return OSRMRouteProvider(os.getenv("OSRM_URL", DEFAULT_OSRM_URL), session=session, timeout=timeout)
@@ -0,0 +1,153 @@
+# app/utils/schedule_index.py
+import os
+import unicodedata
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import List, Optional, Union
+from zoneinfo import ZoneInfo
+
+MINUTES_PER_DAY = 24 * 60
+BYTES_PER_DAY = MINUTES_PER_DAY // 8
+
+# Zona horaria de los horarios del dataset (Perú y Colombia: UTC-5, sin horario de verano)
+CAFE_TIMEZONE = ZoneInfo(os.getenv("CAFE_TIMEZONE", "America/Lima"))
+
+# Python weekday (0=Lunes) -> nombre usado en el dataset (sin tildes)
+DAY_NAMES = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
+
+
+def cafe_local_time(value: Union[str, datetime, None] = None) -> datetime:
+    """
+    Hora local de las cafeterías (sin zona, como los horarios del dataset)
+    para `abierto_en` (ISO 8601) o, sin valor, para ahora. Un valor sin zona
+    horaria se toma tal cual como hora local de la cafetería; uno con zona
+    (p.ej. "2025-06-02T15:00:00Z") se convierte a CAFE_TIMEZONE. Lanza
+    ValueError si no es una fecha ISO 8601 válida.
+    """
+    if value is None:
+        return datetime.now(CAFE_TIMEZONE).replace(tzinfo=None)
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).strip())
+    if value.tzinfo is not None:
+        value = value.astimezone(CAFE_TIMEZONE).replace(tzinfo=None)
+    return value
+
+
+def _normalize(text: str) -> str:
+    """Minúsculas y sin tildes ('Sábado' -> 'sabado')."""
+    text = unicodedata.normalize('NFKD', str(text).strip().lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def parse_dias(text: str) -> Optional[List[int]]:
+    """
+    Convierte `dias_abre` ('Lunes-Sábado', 'Lunes, Miércoles', 'Domingo') en
+    índices de día (0=Lunes). Los rangos pueden dar la vuelta a la semana
+    ('Viernes-Lunes'). Devuelve None si el texto no se reconoce.
+    """
+    dias: List[int] = []
+    for part in _normalize(text).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, _, end = (p.strip() for p in part.partition('-'))
+            if start not in DAY_NAMES or end not in DAY_NAMES:
+                return None
+            d = DAY_NAMES.index(start)
+            dias.append(d)
+            while d != DAY_NAMES.index(end):
+                d = (d + 1) % 7
+                dias.append(d)
+        elif part in DAY_NAMES:
+            dias.append(DAY_NAMES.index(part))
+        else:
+            return None
+    return dias or None
+
+
+def parse_hhmm(text: str) -> Optional[int]:
+    """'HH:MM' -> minutos desde medianoche ('24:00' -> 1440), o None si no es válido."""
+    try:
+        h, m = map(int, str(text).strip().split(':'))
+    except Exception:
+        return None
+    minutes = h * 60 + m
+    if h < 0 or not 0 <= m < 60 or minutes > MINUTES_PER_DAY:
+        return None
+    return minutes
+
+
+def _week_pattern(dias: List[int], apertura: int, cierre: int) -> np.ndarray:
+    """Bitmap semanal (7 x 1440, empaquetado por minuto) de una fila de horario."""
+    week = np.zeros((7, MINUTES_PER_DAY), dtype=bool)
+    for d in dias:
+        if cierre < apertura:
+            # Horario pasada la medianoche: sigue abierto la madrugada del día siguiente
+            week[d, apertura:] = True
+            week[(d + 1) % 7, :cierre + 1] = True
+        else:
+            # El cierre es inclusivo ('24:00' cubre hasta el último minuto del día)
+            week[d, apertura:min(cierre, MINUTES_PER_DAY - 1) + 1] = True
+    return np.packbits(week, axis=1)
+
+
+class ScheduleIndex:
+    """
+    Horarios semanales compilados: un bitmap de 7 x 1440 minutos por cafetería
+    (empaquetado, ~1.3 KB cada una) alineado con la matriz de características
+    del DataLoader. Saber qué cafeterías están abiertas a una hora dada es una
+    sola lectura vectorizada de un bit por cafetería.
+
+    Las cafeterías sin ninguna fila de horario se consideran abiertas.
+    """
+
+    def __init__(self, bits: np.ndarray, has_schedule: np.ndarray):
+        self.bits = bits
+        self.has_schedule = has_schedule
+
+    @classmethod
+    def empty(cls, size: int = 0) -> 'ScheduleIndex':
+        return cls(np.zeros((size, 7, BYTES_PER_DAY), dtype=np.uint8), np.zeros(size, dtype=bool))
+
+    @classmethod
+    def build(cls, index: pd.Index, df_horarios: pd.DataFrame) -> 'ScheduleIndex':
+        schedule = cls.empty(len(index))
+        required = ('cafeteria_id', 'hora_apertura', 'hora_cierre', 'dias_abre')
+        if df_horarios.empty or any(c not in df_horarios.columns for c in required):
+            return schedule
+
+        pos = index.get_indexer(df_horarios['cafeteria_id'])
+        valid = pos >= 0
+        schedule.has_schedule[pos[valid]] = True
+
+        # Hay pocas combinaciones distintas (días, apertura, cierre): cada patrón se compila una vez
+        rows = df_horarios.loc[valid, ['dias_abre', 'hora_apertura', 'hora_cierre']].astype(str)
+        pos = pos[valid]
+        codes, combos = pd.factorize(pd.MultiIndex.from_frame(rows))
+        for code, (dias_txt, apertura_txt, cierre_txt) in enumerate(combos):
+            apertura, cierre = parse_hhmm(apertura_txt), parse_hhmm(cierre_txt)
+            if apertura is None or cierre is None:
+                # Fila con horas no válidas: se ignora (igual que antes)
+                continue
+            # Si no se reconocen los días, se asume que abre todos los días
+            dias = parse_dias(dias_txt)
+            pattern = _week_pattern(dias if dias is not None else list(range(7)), apertura, cierre)
+            targets = np.unique(pos[codes == code])
+            schedule.bits[targets] |= pattern
+        return schedule
+
+    def open_mask(self, when: datetime, positions: np.ndarray = None) -> np.ndarray:
+        """Array booleano: qué cafeterías (o qué `positions`) están abiertas en `when`."""
+        minute = when.hour * 60 + when.minute
+        column = self.bits[:, when.weekday(), minute >> 3]
+        has_schedule = self.has_schedule
+        if positions is not None:
+            column = column[positions]
+            has_schedule = has_schedule[positions]
+        is_open = ((column >> (7 - (minute & 7))) & 1).astype(bool)
+        return is_open | ~has_schedule
+
+    def is_open(self, position: int, when: datetime) -> bool:
+        return bool(self.open_mask(when, np.array([position]))[0])
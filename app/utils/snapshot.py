@@ -0,0 +1,359 @@
+# app/utils/snapshot.py
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Cambiar al modificar el formato o cómo se calculan los índices guardados:
+# invalida las instantáneas existentes
+SNAPSHOT_FORMAT_VERSION = 3
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".build.lock"
+
+# build_lock dentro de este proceso: {directorio: RLock} y cuántas veces lo ha tomado
+# el hilo que lo tiene (flock no es reentrante: solo se toma en el nivel exterior)
+_thread_locks: Dict[str, threading.RLock] = {}
+_thread_locks_guard = threading.Lock()
+_lock_depth: Dict[str, int] = {}
+
+
+class SnapshotError(Exception):
+    """La instantánea no se puede escribir o leer (se vuelve a los CSV)."""
+
+
+# --- Huella de los CSV de origen ---
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(data_dir: Path, file_names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """{archivo: {size, mtime_ns, sha256}} de cada CSV (None si no existe)."""
+    sources: Dict[str, Dict[str, Any]] = {}
+    for name in file_names:
+        path = data_dir / name
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            sources[name] = None
+            continue
+        sources[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": _sha256(path)}
+    return sources
+
+
+def sources_match(data_dir: Path, recorded: Dict[str, Any], file_names: Iterable[str]) -> bool:
+    """
+    Los CSV no han cambiado: mismo tamaño y mtime, o (si el mtime cambió,
+    p.ej. tras un checkout) el mismo contenido según su hash.
+    """
+    file_names = list(file_names)
+    if sorted(recorded) != sorted(file_names):
+        return False
+    for name in file_names:
+        info = recorded[name]
+        path = data_dir / name
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            if info is not None:
+                return False
+            continue
+        if info is None or stat.st_size != info["size"]:
+            return False
+        if stat.st_mtime_ns != info["mtime_ns"] and _sha256(path) != info["sha256"]:
+            return False
+    return True
+
+
+# --- Codificación de columnas (sin pickle: solo arrays numéricos y de texto) ---
+
+def _encode_strings(values: Iterable[str], prefix: str) -> Dict[str, np.ndarray]:
+    """Textos como un buffer UTF-8 (`<prefix>_blob`) más sus offsets (`<prefix>_offsets`, n + 1)."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return {
+        f"{prefix}_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        f"{prefix}_offsets": offsets,
+    }
+
+
+def _decode_strings(arrays: Dict[str, np.ndarray], prefix: str) -> np.ndarray:
+    blob = arrays[f"{prefix}_blob"].tobytes()
+    bounds = arrays[f"{prefix}_offsets"].tolist()
+    values = np.empty(len(bounds) - 1, dtype=object)
+    values[:] = [blob[start:end].decode("utf-8") for start, end in zip(bounds[:-1], bounds[1:])]
+    return values
+
+
+def _encode_column(values: pd.Series) -> Tuple[str, Dict[str, np.ndarray]]:
+    """
+    Devuelve (tipo, arrays). Las columnas numéricas/booleanas se guardan tal
+    cual; las categóricas como sus códigos más las categorías; y las de texto
+    como códigos int32 (-1 = nulo) más los valores únicos. Los textos van como
+    buffer UTF-8 + offsets (sin el relleno de los arrays de ancho fijo).
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        if not all(isinstance(v, str) for v in categories):
+            raise SnapshotError(f"columna '{values.name}' con categorías que no son texto")
+        return "category", {"codes": values.cat.codes.to_numpy(), **_encode_strings(categories, "categories")}
+    if values.dtype != object:
+        return "array", {"values": values.to_numpy()}
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    if not all(isinstance(v, str) for v in uniques):
+        raise SnapshotError(f"columna '{values.name}' con valores que no son texto")
+    return "text", {"codes": codes.astype(np.int32), **_encode_strings(uniques, "uniques")}
+
+
+def _decode_column(kind: str, arrays: Dict[str, np.ndarray]) -> Union[np.ndarray, pd.Categorical]:
+    """
+    Inversa de `_encode_column`. Las columnas numéricas y los códigos de las
+    categóricas son los propios arrays leídos (mapeados en memoria si se
+    leyeron así); los textos (columnas de texto y etiquetas de las
+    categóricas) se convierten en objetos de Python, propios de cada proceso.
+    """
+    if kind == "array":
+        return arrays["values"]
+    if kind == "category":
+        return pd.Categorical.from_codes(arrays["codes"], categories=_decode_strings(arrays, "categories"))
+    codes = arrays["codes"]
+    values = _decode_strings(arrays, "uniques")[codes]
+    values[codes < 0] = np.nan
+    return values
+
+
+def encode_index(values: Iterable[Any]) -> np.ndarray:
+    """Categorías (texto o numéricas) como array guardable sin pickle."""
+    values = list(values)
+    if all(isinstance(v, str) for v in values):
+        return np.array(values, dtype=str)
+    return np.asarray(values)
+
+
+def decode_index(values: np.ndarray) -> pd.Index:
+    return pd.Index(values.astype(object) if values.dtype.kind == 'U' else values)
+
+
+# --- Escritura / lectura ---
+
+def write_snapshot(
+    snapshot_dir: Path,
+    frames: Dict[str, pd.DataFrame],
+    arrays: Dict[str, np.ndarray],
+    sources: Dict[str, Any],
+    config: Dict[str, Any],
+) -> Path:
+    """
+    Escribe los DataFrames (una serie de .npy por columna) y los arrays
+    derivados en un subdirectorio nuevo y, al final, reemplaza de forma atómica
+    el manifiesto que apunta a él. Los lectores ven la instantánea anterior o
+    la nueva completa, nunca una a medias. Todo ocurre con build_lock tomado,
+    así que dos escritores no se pisan la publicación ni la limpieza.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    with build_lock(snapshot_dir):
+        try:
+            previous = read_manifest(snapshot_dir)
+        except SnapshotError:
+            previous = None
+        build_dir = _write_build(snapshot_dir, frames, arrays, sources, config)
+        if isinstance(previous, dict) and previous.get("build"):
+            _remove_old_builds(snapshot_dir, previous["build"], keep=build_dir.name)
+    return build_dir
+
+
+def _write_build(
+    snapshot_dir: Path,
+    frames: Dict[str, pd.DataFrame],
+    arrays: Dict[str, np.ndarray],
+    sources: Dict[str, Any],
+    config: Dict[str, Any],
+) -> Path:
+    build = f"build-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    build_dir = snapshot_dir / build
+    build_dir.mkdir()
+
+    try:
+        manifest_frames: Dict[str, Any] = {}
+        for frame_name, df in frames.items():
+            columns = []
+            for i, col in enumerate(df.columns):
+                kind, encoded = _encode_column(df[col])
+                decoded = _decode_column(kind, encoded)
+                if not df[col].equals(pd.Series(decoded, index=df.index, name=col, dtype=df[col].dtype)):
+                    raise SnapshotError(f"la columna '{frame_name}.{col}' no se reconstruye igual")
+                files = {}
+                for part, arr in encoded.items():
+                    file_name = f"{frame_name}.{i}.{part}.npy"
+                    np.save(build_dir / file_name, arr, allow_pickle=False)
+                    files[part] = file_name
+                columns.append({"name": col, "kind": kind, "dtype": str(df[col].dtype), "files": files})
+            manifest_frames[frame_name] = {"rows": len(df), "columns": columns}
+
+        manifest_arrays: Dict[str, str] = {}
+        for key, arr in arrays.items():
+            file_name = f"{key}.npy"
+            np.save(build_dir / file_name, np.asarray(arr), allow_pickle=False)
+            manifest_arrays[key] = file_name
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "build": build,
+            "config": config,
+            "sources": sources,
+            "frames": manifest_frames,
+            "arrays": manifest_arrays,
+        }
+        tmp_manifest = snapshot_dir / f"{MANIFEST_NAME}.{build}.tmp"
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_manifest, snapshot_dir / MANIFEST_NAME)
+    except Exception:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    return build_dir
+
+
+def _remove_old_builds(snapshot_dir: Path, replaced: str, keep: str):
+    """
+    Borra el build al que apuntaba el manifiesto reemplazado y los anteriores a
+    él (restos de escrituras fallidas). Los posteriores pueden ser de otro
+    escritor que aún no ha publicado su manifiesto (p.ej. en otra máquina, si
+    el directorio es compartido): no se tocan.
+    """
+    replaced_dir = snapshot_dir / replaced
+    try:
+        cutoff = replaced_dir.stat().st_mtime_ns
+    except FileNotFoundError:
+        return
+    for old in snapshot_dir.glob("build-*"):
+        if old.name == keep or not old.is_dir():
+            continue
+        try:
+            if old == replaced_dir or old.stat().st_mtime_ns <= cutoff:
+                shutil.rmtree(old, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+@contextmanager
+def build_lock(snapshot_dir: Path) -> Iterator[None]:
+    """
+    Bloqueo entre procesos (flock) para que, si varios workers arrancan a la
+    vez sin instantánea válida, solo uno la construya y el resto la lea. Es
+    reentrante dentro de un hilo (write_snapshot lo toma aunque quien lo llama
+    ya lo tenga) y también excluye a los demás hilos del proceso.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    key = str(snapshot_dir.resolve())
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(key, threading.RLock())
+    with thread_lock:
+        depth = _lock_depth.get(key, 0)
+        _lock_depth[key] = depth + 1
+        try:
+            if depth or fcntl is None:
+                yield
+            else:
+                with open(snapshot_dir / LOCK_NAME, "a") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+        finally:
+            _lock_depth[key] = depth
+
+
+def read_manifest(snapshot_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(Path(snapshot_dir) / MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"manifiesto ilegible: {e}")
+
+
+def snapshot_status(
+    snapshot_dir: Path,
+    data_dir: Path,
+    file_names: Iterable[str],
+    config: Dict[str, Any],
+) -> Tuple[Optional[Dict[str, Any]], str]:
+    """(manifiesto, motivo): el manifiesto solo si la instantánea es válida para estos CSV y configuración."""
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None:
+        return None, "no existe"
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        return None, "versión de formato distinta"
+    if manifest.get("config") != config:
+        return None, "configuración distinta"
+    if not sources_match(Path(data_dir), manifest.get("sources", {}), file_names):
+        return None, "los CSV han cambiado"
+    return manifest, "válida"
+
+
+def _load_array(path: Path, mmap: bool) -> np.ndarray:
+    if not mmap:
+        return np.load(path, allow_pickle=False)
+    # Vista ndarray normal sobre el mapeo (sin copiar; el np.memmap queda como `base`)
+    return np.load(path, mmap_mode="r", allow_pickle=False).view(np.ndarray)
+
+
+def read_frame(snapshot_dir: Path, manifest: Dict[str, Any], frame_name: str, mmap: bool = False) -> pd.DataFrame:
+    """
+    Carga un DataFrame de la instantánea descrita en `manifest`. Con `mmap`
+    las columnas numéricas y booleanas, y los códigos de las categóricas,
+    quedan mapeados (solo lectura) sobre los .npy, sin copiarlos: los procesos
+    que leen la misma instantánea comparten esas páginas. Las columnas de texto
+    y las etiquetas de las categóricas sí se copian en cada proceso.
+    """
+    build_dir = Path(snapshot_dir) / manifest["build"]
+    try:
+        info = manifest["frames"][frame_name]
+        data = {}
+        for column in info["columns"]:
+            encoded = {
+                part: _load_array(build_dir / file_name, mmap)
+                for part, file_name in column["files"].items()
+            }
+            # Las categóricas ya traen su dtype (pasarlo de nuevo recodificaría los códigos)
+            dtype = None if column["kind"] == "category" else column["dtype"]
+            data[column["name"]] = pd.Series(_decode_column(column["kind"], encoded), dtype=dtype, copy=False)
+        return pd.DataFrame(data, index=pd.RangeIndex(info["rows"]), copy=False)
+    except (OSError, ValueError, KeyError) as e:
+        raise SnapshotError(f"instantánea incompleta o corrupta: {e}")
+
+
+def read_arrays(snapshot_dir: Path, manifest: Dict[str, Any], mmap: bool = False) -> Dict[str, np.ndarray]:
+    """Carga los arrays derivados de la instantánea descrita en `manifest` (mapeados si `mmap`)."""
+    build_dir = Path(snapshot_dir) / manifest["build"]
+    try:
+        return {
+            key: _load_array(build_dir / file_name, mmap)
+            for key, file_name in manifest["arrays"].items()
+        }
+    except (OSError, ValueError, KeyError) as e:
+        raise SnapshotError(f"instantánea incompleta o corrupta: {e}")
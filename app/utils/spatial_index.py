@@ -0,0 +1,103 @@
+# app/utils/spatial_index.py
+import numpy as np
+from math import asin, ceil, cos, degrees, floor, radians, sin
+from typing import Dict, Tuple
+from app.utils.geo import R, haversine_many
+
+# Tamaño de celda por defecto en grados (~11 km de latitud)
+DEFAULT_CELL_DEG = 0.1
+
+
+class SpatialIndex:
+    """
+    Índice espacial de rejilla lat/lon sobre arrays de coordenadas (en grados).
+
+    Los puntos se ordenan por celda una sola vez; cada celda guarda el rango
+    [inicio, fin) de sus posiciones. Una consulta por radio solo visita las
+    celdas de la caja que envuelve el círculo, así que su coste depende del
+    número de resultados y no del tamaño del catálogo.
+    Las posiciones devueltas son índices en los arrays originales.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, cell_deg: float = DEFAULT_CELL_DEG):
+        self.lats = np.ascontiguousarray(lats, dtype=np.float64)
+        self.lons = np.ascontiguousarray(lons, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self.n_rows = int(ceil(180.0 / cell_deg)) + 1
+        self.n_cols = int(ceil(360.0 / cell_deg))
+
+        valid = np.flatnonzero(~(np.isnan(self.lats) | np.isnan(self.lons)))
+        keys = self._cell_keys(self.lats[valid], self.lons[valid])
+        order = np.argsort(keys, kind='stable')
+
+        # Posiciones agrupadas por celda (CSR: celda -> rango en _positions)
+        self._positions = valid[order]
+        sorted_keys = keys[order]
+        uniq, starts, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+        self._cells: Dict[int, Tuple[int, int]] = {
+            int(k): (int(s), int(s + c)) for k, s, c in zip(uniq, starts, counts)
+        }
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _cell_keys(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        rows = np.floor((lats + 90.0) / self.cell_deg).astype(np.int64)
+        cols = np.floor((lons + 180.0) / self.cell_deg).astype(np.int64) % self.n_cols
+        return rows * self.n_cols + cols
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Posiciones de las celdas que cubren el círculo (superconjunto del resultado)."""
+        ang = radius_km / R
+        dlat = degrees(ang)
+        row_min = max(int(floor((lat - dlat + 90.0) / self.cell_deg)), 0)
+        row_max = min(int(floor((lat + dlat + 90.0) / self.cell_deg)), self.n_rows - 1)
+
+        # Desviación máxima de longitud del círculo; si toca un polo, todas las columnas
+        cos_lat = cos(radians(lat))
+        if ang >= radians(90.0) or abs(lat) + dlat >= 90.0 or sin(ang) >= cos_lat:
+            cols = range(self.n_cols)
+        else:
+            dlon = degrees(asin(sin(ang) / cos_lat))
+            col_min = int(floor((lon - dlon + 180.0) / self.cell_deg))
+            col_max = int(floor((lon + dlon + 180.0) / self.cell_deg))
+            if col_max - col_min + 1 >= self.n_cols:
+                cols = range(self.n_cols)
+            else:
+                cols = [c % self.n_cols for c in range(col_min, col_max + 1)]
+
+        # Si la caja tiene más celdas que celdas ocupadas, es más barato recorrerlas todas
+        if (row_max - row_min + 1) * len(cols) > len(self._cells):
+            return self._positions
+
+        slices = []
+        for row in range(row_min, row_max + 1):
+            base = row * self.n_cols
+            for col in cols:
+                cell = self._cells.get(base + col)
+                if cell is not None:
+                    slices.append(self._positions[cell[0]:cell[1]])
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Devuelve (posiciones, distancias_km) de los puntos a <= `radius_km` de
+        (lat, lon), ordenados por distancia ascendente.
+        """
+        if radius_km < 0 or len(self._positions) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        candidates = self._candidates(lat, lon, radius_km)
+        distances = haversine_many(lat, lon, self.lats[candidates], self.lons[candidates])
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+
+        order = np.argsort(distances, kind='stable')
+        return candidates[order], distances[order]
+
+    def nearest(self, lat: float, lon: float, radius_km: float, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Los `limit` puntos más cercanos dentro de `radius_km`, por distancia ascendente."""
+        positions, distances = self.query_radius(lat, lon, radius_km)
+        return positions[:limit], distances[:limit]
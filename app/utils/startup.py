@@ -0,0 +1,91 @@
+# app/utils/startup.py
+import importlib.abc
+import importlib.machinery
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Envuelve el loader real de un módulo y mide cuánto tarda en ejecutarse."""
+
+    def __init__(self, loader, report: 'StartupReport'):
+        self._loader = loader
+        self._report = report
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._report.record_import(module.__name__, (time.perf_counter() - start) * 1000)
+
+    def __getattr__(self, name: str):
+        # get_source, is_package, get_resource_reader, ...: los del loader real
+        return getattr(self._loader, name)
+
+
+class _ImportTimingFinder(importlib.abc.MetaPathFinder):
+    """Localiza los módulos de `package` como siempre, pero con un `_TimedLoader`."""
+
+    def __init__(self, package: str, report: 'StartupReport'):
+        self.package = package
+        self.report = report
+
+    def find_spec(self, fullname: str, path=None, target=None):
+        if fullname != self.package and not fullname.startswith(self.package + "."):
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if spec is not None and spec.loader is not None:
+            spec.loader = _TimedLoader(spec.loader, self.report)
+        return spec
+
+
+class StartupReport:
+    """
+    Tiempos de arranque del proceso: cuánto tarda en importarse cada módulo de
+    la aplicación (acumulado: incluye lo que importa, como `python -X importtime`)
+    y cuánto pasa hasta que la aplicación está lista.
+    """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.imports_ms: Dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def install_import_hook(self, package: str = "app") -> None:
+        """Mide a partir de ahora la importación de los módulos de `package`."""
+        if not any(isinstance(finder, _ImportTimingFinder) for finder in sys.meta_path):
+            sys.meta_path.insert(0, _ImportTimingFinder(package, self))
+
+    def record_import(self, module: str, duration_ms: float) -> None:
+        with self._lock:
+            self.imports_ms[module] = round(duration_ms, 3)
+
+    def mark_ready(self) -> None:
+        self.ready_ms = round((time.perf_counter() - self._started) * 1000, 3)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            imports = dict(self.imports_ms)
+        stdlib = getattr(sys, "stdlib_module_names", frozenset())
+        return {
+            "ready_ms": self.ready_ms,
+            "uptime_s": round(time.perf_counter() - self._started, 3),
+            # Módulos de la app por tiempo de importación acumulado (de mayor a menor)
+            "imports_ms": dict(sorted(imports.items(), key=lambda item: -item[1])),
+            # Paquetes externos ya importados (p.ej. para comprobar que `requests` aún no se ha cargado)
+            "third_party_loaded": sorted(
+                name for name in list(sys.modules)
+                if "." not in name and not name.startswith("_") and name not in stdlib and name != "app"
+            ),
+        }
+
+
+# Informe del proceso actual (el hook se instala al principio de app/main.py)
+startup_report = StartupReport()
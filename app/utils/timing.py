@@ -0,0 +1,112 @@
+# app/utils/timing.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+# Límites superiores (ms) de los buckets del histograma; el último recoge el resto
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+
+class StageTimer:
+    """
+    Mide con `time.perf_counter` cuánto tarda cada etapa de una petición.
+
+        timer = StageTimer()
+        with timer.stage("graph_build"):
+            ...
+        timer.spans  # {"graph_build": 12.3}  (ms; si una etapa se repite, se suma)
+    """
+
+    def __init__(self):
+        self.spans: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, duration_ms: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + duration_ms
+
+    def total_ms(self) -> float:
+        """Tiempo desde que se creó el timer."""
+        return (time.perf_counter() - self._started) * 1000
+
+    def rounded(self, digits: int = 3) -> Dict[str, float]:
+        return {name: round(ms, digits) for name, ms in self.spans.items()}
+
+    def server_timing_header(self) -> str:
+        """Valor de la cabecera `Server-Timing` (etapas + total)."""
+        parts = [f"{name};dur={ms:.3f}" for name, ms in self.spans.items()]
+        parts.append(f"total;dur={self.total_ms():.3f}")
+        return ", ".join(parts)
+
+
+class TimingHistogram:
+    """
+    Histograma en memoria (por proceso) de la duración de cada etapa, con
+    buckets fijos en ms. Es seguro entre hilos.
+    """
+
+    def __init__(self, buckets_ms=HISTOGRAM_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, duration_ms: float) -> None:
+        bucket = next(i for i, upper in enumerate(self.buckets_ms) if duration_ms <= upper)
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = {"count": 0, "sum_ms": 0.0, "max_ms": 0.0, "buckets": [0] * len(self.buckets_ms)}
+                self._stages[stage] = entry
+            entry["count"] += 1
+            entry["sum_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["buckets"][bucket] += 1
+
+    def record(self, timer: StageTimer, total_stage: str = "total") -> None:
+        """Registra todas las etapas de `timer` y su total (bajo `total_stage`)."""
+        for stage, duration_ms in timer.spans.items():
+            self.observe(stage, duration_ms)
+        self.observe(total_stage, timer.total_ms())
+
+    def _percentile(self, buckets: List[int], count: int, q: float, max_ms: float) -> float:
+        """
+        Estimación del percentil `q`: límite superior del bucket que lo
+        contiene, acotado por el máximo observado (así nunca es infinito).
+        """
+        threshold = q * count
+        seen = 0
+        for upper, n in zip(self.buckets_ms, buckets):
+            seen += n
+            if seen >= threshold:
+                return round(min(upper, max_ms), 3)
+        return round(max_ms, 3)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: {**entry, "buckets": list(entry["buckets"])} for name, entry in self._stages.items()}
+        result = {}
+        for name, entry in stages.items():
+            count, max_ms = entry["count"], entry["max_ms"]
+            result[name] = {
+                "count": count,
+                "mean_ms": round(entry["sum_ms"] / count, 3),
+                "max_ms": round(max_ms, 3),
+                "p50_ms": self._percentile(entry["buckets"], count, 0.50, max_ms),
+                "p90_ms": self._percentile(entry["buckets"], count, 0.90, max_ms),
+                "p99_ms": self._percentile(entry["buckets"], count, 0.99, max_ms),
+                # {"<=límite_ms": n} ('inf' para el último)
+                "buckets": {f"<={upper:g}": n for upper, n in zip(self.buckets_ms, entry["buckets"]) if n},
+            }
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stages.clear()
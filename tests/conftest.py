@@ -0,0 +1,15 @@
+# tests/conftest.py
+import os
+
+# app.models importa app.database, que crea el engine (sin conectar) con estas variables
+for name, value in {
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "DB_HOST": "localhost",
+    "DB_PORT": "3306",
+    "DB_NAME": "caffinet_test",
+}.items():
+    os.environ.setdefault(name, value)
+
+# Mismo orden de importación que app.main: app.database antes que app.models
+import app.database  # noqa: E402,F401
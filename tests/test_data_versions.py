@@ -0,0 +1,58 @@
+# tests/test_data_versions.py
+"""
+Inmutabilidad de las versiones de los datos (DataVersion / DataLoader.reload):
+una versión que ya registró la huella de los CSV no carga bajo demanda un CSV
+modificado después, y la recarga publica una versión completamente cargada.
+
+    python -m pytest -q
+"""
+
+import shutil
+
+import pytest
+
+from app.utils import data_loader
+from app.utils.data_loader import CSV_FILES, DataLoader, DataVersion, StaleDataError
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    shutil.copytree(data_loader.DATA_DIR, data, ignore=shutil.ignore_patterns(".*"))
+    monkeypatch.setattr(data_loader, "DATA_DIR", data)
+    monkeypatch.setattr(data_loader, "DATA_SNAPSHOT_DIR", "")
+    monkeypatch.setattr(DataLoader, "_instance", None)
+    return data
+
+
+def _edit_first_name(data):
+    path = data / CSV_FILES["df_cafeterias"]
+    lines = path.read_bytes().split(b"\n")
+    header = lines[0].split(b";")
+    row = lines[1].split(b";")
+    row[header.index(b"name")] = b"Cafe Editado"
+    lines[1] = b";".join(row)
+    path.write_bytes(b"\n".join(lines))
+
+
+def test_version_refuses_csv_changed_after_fingerprint(data_dir):
+    version = DataVersion()
+    assert not version.df_tags.empty
+    _edit_first_name(data_dir)
+
+    with pytest.raises(StaleDataError):
+        version.df_cafeterias
+    assert "df_cafeterias" not in version.loaded_names()
+
+
+def test_reload_publishes_fully_loaded_version(data_dir):
+    loader = DataLoader()
+    old = loader.current()
+    old.df_tags
+    _edit_first_name(data_dir)
+
+    new = loader.reload("test")
+
+    assert loader.current() is new and new.data_version == old.data_version + 1
+    assert {*CSV_FILES, *data_loader.ID_DICTS, "features"} <= new.loaded_names()
+    assert new.df_cafeterias["name"].iloc[0] == "Cafe Editado"
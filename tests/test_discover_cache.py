@@ -0,0 +1,88 @@
+# tests/test_discover_cache.py
+"""
+Caché de resultados de POST /discover/optimal_route/ (X-Cache: HIT|MISS),
+con un proveedor de rutas de prueba en lugar de OSRM.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import cost_calculator, discover
+from app.utils.cache import LRUCache
+from app.utils.route_cache import RouteCache
+from app.utils.route_providers import RouteProvider
+
+REQUEST = {
+    "user_location": {"latitude": -12.05, "longitude": -77.04},
+    "filters": {},
+    "algorithm": "Dijkstra",
+    "top_k": 3,
+}
+
+
+class _StubProvider(RouteProvider):
+    name = "stub"
+
+    def __init__(self):
+        self.fail = False
+
+    def route(self, start_lat, start_lon, end_lat, end_lon):
+        if self.fail:
+            raise ConnectionError("proveedor caído")
+        return [(start_lat, start_lon), ((start_lat + end_lat) / 2, (start_lon + end_lon) / 2), (end_lat, end_lon)]
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = _StubProvider()
+    monkeypatch.setattr(cost_calculator, "_route_provider", provider)
+    monkeypatch.setattr(cost_calculator, "route_cache", RouteCache())
+    monkeypatch.setattr(discover, "_result_cache", LRUCache(maxsize=100, ttl_seconds=300))
+    return provider
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(discover.router)
+    return TestClient(app)
+
+
+def test_results_with_real_routes_are_cached(provider, client):
+    body = {**REQUEST, "include_routes": True}
+    first = client.post("/discover/optimal_route/", json=body)
+    second = client.post("/discover/optimal_route/", json=body)
+
+    assert first.status_code == 200
+    assert [first.headers["x-cache"], second.headers["x-cache"]] == ["MISS", "HIT"]
+    assert second.json() == first.json()
+
+
+def test_results_with_fallback_routes_are_not_cached(provider, client):
+    provider.fail = True
+    body = {**REQUEST, "include_routes": True}
+    first = client.post("/discover/optimal_route/", json=body)
+
+    assert first.status_code == 200
+    assert all(len(item["real_route_points"]) == 2 for item in first.json()["ordered_cafeterias"])
+
+    # Con el proveedor recuperado, la siguiente petición calcula (y obtiene) las rutas reales
+    provider.fail = False
+    second = client.post("/discover/optimal_route/", json=body)
+    assert second.headers["x-cache"] == "MISS"
+    assert all(len(item["real_route_points"]) == 3 for item in second.json()["ordered_cafeterias"])
+    assert client.post("/discover/optimal_route/", json=body).headers["x-cache"] == "HIT"
+
+
+def test_cache_hit_reports_its_own_timings(provider, client):
+    body = {**REQUEST, "include_timings": True}
+    miss = client.post("/discover/optimal_route/", json=body)
+    hit = client.post("/discover/optimal_route/", json=body)
+
+    assert [miss.headers["x-cache"], hit.headers["x-cache"]] == ["MISS", "HIT"]
+    assert {"filter", "graph_build", "ranking"} <= set(miss.json()["timings"])
+    # En el HIT, cuerpo y Server-Timing describen la misma petición: solo la búsqueda en caché
+    assert set(hit.json()["timings"]) == {"cache_lookup"}
+    assert hit.headers["server-timing"].startswith("cache_lookup;dur=")
+    assert {**hit.json(), "timings": None} == {**miss.json(), "timings": None}
@@ -0,0 +1,48 @@
+# tests/test_graph_algorithms.py
+"""
+Límite de nodos de Floyd-Warshall (FLOYD_WARSHALL_MAX_NODES): un grafo mayor
+falla de inmediato con GraphTooLargeError, que /discover/optimal_route/
+responde como 400 en lugar de bloquear el worker.
+
+    python -m pytest -q
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import discover, graph_algorithms
+from app.utils.graph_algorithms import GraphTooLargeError, floyd_warshall_algorithm
+
+
+def _chain(n):
+    return {i: ({i + 1: 1.0} if i + 1 < n else {}) for i in range(n)}
+
+
+def test_floyd_warshall_over_default_limit_raises():
+    limit = graph_algorithms.FLOYD_WARSHALL_MAX_NODES
+    assert limit <= 300
+
+    dist, _, _ = floyd_warshall_algorithm(_chain(limit))
+    assert dist[(0, limit - 1)] == limit - 1
+    with pytest.raises(GraphTooLargeError):
+        floyd_warshall_algorithm(_chain(limit + 1))
+
+
+def test_optimal_route_floyd_warshall_over_limit_is_400(monkeypatch):
+    monkeypatch.setattr(graph_algorithms, "FLOYD_WARSHALL_MAX_NODES", 2)
+    monkeypatch.setattr(discover, "_result_cache", discover.LRUCache(maxsize=10, ttl_seconds=60))
+    app = FastAPI()
+    app.include_router(discover.router)
+    body = {
+        "user_location": {"latitude": -12.05, "longitude": -77.04},
+        "filters": {},
+        "algorithm": "Floyd-Warshall",
+        "force_algorithm": True,
+        "include_routes": False,
+    }
+
+    response = TestClient(app).post("/discover/optimal_route/", json=body)
+
+    assert response.status_code == 400
+    assert "Floyd-Warshall admite como máximo 2 nodos" in response.json()["detail"]
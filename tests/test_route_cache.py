@@ -0,0 +1,55 @@
+# tests/test_route_cache.py
+"""
+Nivel en disco (SQLite) de RouteCache: las rutas caducadas son un fallo y se
+borran, y la tabla no crece por encima de `disk_max_rows`.
+
+    python -m pytest -q
+"""
+
+import time
+
+import pytest
+
+from app.utils.route_cache import RouteCache
+
+POINTS = [(-12.05, -77.04), (-12.04, -77.03)]
+
+
+def _rows(cache):
+    return cache._db.execute("SELECT key, created_at FROM routes ORDER BY created_at").fetchall()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RouteCache(ttl_seconds=60, db_path=str(tmp_path / "routes.db"), disk_max_rows=3)
+
+
+def test_expired_disk_entry_is_a_miss_and_is_deleted(cache):
+    key = cache.make_key(-12.05, -77.04, -12.04, -77.03)
+    cache.set(key, POINTS)
+    cache.memory.clear()
+    cache._db.execute("UPDATE routes SET created_at = ?", (time.time() - 120,))
+    cache._db.commit()
+
+    assert cache.get(key) is None
+    assert cache.misses == 1
+    assert _rows(cache) == []
+
+
+def test_prune_removes_expired_and_oldest_rows(cache, tmp_path):
+    keys = [cache.make_key(-12.05, -77.04, -12.0 + i / 100, -77.0) for i in range(5)]
+    for i, key in enumerate(keys):
+        cache.set(key, POINTS)
+        cache._db.execute("UPDATE routes SET created_at = ? WHERE key = ?", (1000.0 + i, cache._disk_key(key)))
+    cache._db.execute("UPDATE routes SET created_at = ? WHERE key = ?", (time.time(), cache._disk_key(keys[0])))
+    cache._db.commit()
+
+    # Todas caducadas salvo keys[0] (recién renovada)
+    assert cache.prune_disk() == 4
+    assert [key for key, _ in _rows(cache)] == [cache._disk_key(keys[0])]
+
+    # Al superar el límite se borran las más antiguas (también al abrir la caché)
+    for key in keys[1:]:
+        cache.set(key, POINTS)
+    reopened = RouteCache(ttl_seconds=60, db_path=str(tmp_path / "routes.db"), disk_max_rows=3)
+    assert [key for key, _ in _rows(reopened)] == [cache._disk_key(key) for key in keys[2:]]
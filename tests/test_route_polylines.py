@@ -0,0 +1,138 @@
+# tests/test_route_polylines.py
+"""
+Descarga de polylines de discover (`get_route_polylines` / `iter_route_polylines`)
+contra un OSRM de prueba local (http.server en un hilo): rutas correctas,
+línea recta si el servidor falla o no responde a tiempo, y límite de
+descargas simultáneas.
+
+    python -m pytest -q
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import polyline
+import pytest
+
+from app.utils import cost_calculator
+from app.utils.route_cache import RouteCache
+from app.utils.route_providers import OSRMRouteProvider
+
+START = (-12.05, -77.04)
+DESTINATIONS = [(-12.05 + i * 0.01, -77.03) for i in range(1, 7)]
+ROUTE_MIDPOINT = (-12.0, -77.0)
+
+
+class _StubOSRMHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            if server.status != 200:
+                self.send_response(server.status)
+                self.end_headers()
+                return
+            # /route/v1/driving/lon,lat;lon,lat
+            coords = self.path.split("?")[0].rsplit("/", 1)[-1]
+            (start_lon, start_lat), (end_lon, end_lat) = (map(float, c.split(",")) for c in coords.split(";"))
+            points = [(start_lat, start_lon), ROUTE_MIDPOINT, (end_lat, end_lon)]
+            body = json.dumps({"code": "Ok", "routes": [{"geometry": polyline.encode(points, precision=6)}]})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def osrm_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOSRMHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = server.in_flight = server.max_in_flight = 0
+    server.delay = 0.0
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def routes(osrm_stub, monkeypatch):
+    """Proveedor OSRM apuntando al servidor de prueba, caché vacía y un pool de 2 hilos."""
+    base_url = f"http://127.0.0.1:{osrm_stub.server_address[1]}/route/v1/driving"
+    monkeypatch.setattr(cost_calculator, "_route_provider", OSRMRouteProvider(base_url, timeout=5))
+    monkeypatch.setattr(cost_calculator, "route_cache", RouteCache())
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(cost_calculator, "_route_executor", executor)
+    yield osrm_stub
+    executor.shutdown(wait=True)
+
+
+def _straight_line(destination):
+    return [START, destination]
+
+
+def _rounded(points):
+    return [(round(lat, 5), round(lon, 5)) for lat, lon in points]
+
+
+def test_routes_are_fetched_in_order_and_cached(routes):
+    result = cost_calculator.get_route_polylines(*START, DESTINATIONS, deadline_seconds=5)
+
+    assert [_rounded(points) for points in result] == [
+        _rounded([START, ROUTE_MIDPOINT, destination]) for destination in DESTINATIONS
+    ]
+    assert routes.requests == len(DESTINATIONS)
+
+    # Segunda vez: todo sale de la caché, sin tocar el servidor
+    assert cost_calculator.get_route_polylines(*START, DESTINATIONS, deadline_seconds=5) == result
+    assert routes.requests == len(DESTINATIONS)
+
+
+def test_server_error_falls_back_to_straight_line_without_caching(routes):
+    routes.status = 500
+
+    result = cost_calculator.get_route_polylines(*START, DESTINATIONS[:2], deadline_seconds=5)
+
+    assert result == [_straight_line(d) for d in DESTINATIONS[:2]]
+    # El fallback no se guarda: al recuperarse el servidor se piden de nuevo
+    routes.status = 200
+    result = cost_calculator.get_route_polylines(*START, DESTINATIONS[:2], deadline_seconds=5)
+    assert all(len(points) == 3 for points in result)
+    assert routes.requests == 4
+
+
+def test_deadline_returns_straight_lines_without_waiting(routes):
+    routes.delay = 1.0
+
+    started = time.perf_counter()
+    result = cost_calculator.get_route_polylines(*START, DESTINATIONS[:2], deadline_seconds=0.2)
+    elapsed = time.perf_counter() - started
+
+    assert result == [_straight_line(d) for d in DESTINATIONS[:2]]
+    assert elapsed < 0.8
+
+
+def test_concurrent_fetches_are_capped_by_the_pool(routes):
+    routes.delay = 0.1
+
+    result = cost_calculator.get_route_polylines(*START, DESTINATIONS, deadline_seconds=5)
+
+    assert all(len(points) == 3 for points in result)
+    assert routes.requests == len(DESTINATIONS)
+    assert routes.max_in_flight == 2
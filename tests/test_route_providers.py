@@ -0,0 +1,134 @@
+# tests/test_route_providers.py
+"""
+Proveedores de rutas (`app/utils/route_providers.py`) sobre una red vial
+sintética: el A* de LocalGraphRouteProvider da los mismos caminos mínimos que
+Dijkstra, un destino inalcanzable vuelve a la línea recta, y
+`provider_from_env` elige el proveedor según ROUTE_PROVIDER.
+
+    python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from app.utils import cost_calculator
+from app.utils.geo import haversine_many
+from app.utils.graph_algorithms import dijkstra_algorithm
+from app.utils.route_cache import RouteCache
+from app.utils.route_providers import (
+    LocalGraphRouteProvider,
+    OSRMRouteProvider,
+    RouteProvider,
+    provider_from_env,
+)
+
+GRID = 6
+STEP_DEG = 0.005
+ORIGIN = (-12.05, -77.04)
+# Isla: dos nodos unidos entre sí, sin conexión con la cuadrícula
+ISLAND = [(-12.00, -77.04), (-12.00, -77.035)]
+
+
+def _road_graph():
+    """Cuadrícula GRID x GRID con longitudes >= línea recta (la heurística sigue siendo admisible) más la isla."""
+    rng = np.random.default_rng(7)
+    lat = [ORIGIN[0] + r * STEP_DEG for r in range(GRID) for c in range(GRID)] + [p[0] for p in ISLAND]
+    lon = [ORIGIN[1] + c * STEP_DEG for r in range(GRID) for c in range(GRID)] + [p[1] for p in ISLAND]
+    lat, lon = np.array(lat), np.array(lon)
+
+    sources, targets = [], []
+    for r in range(GRID):
+        for c in range(GRID):
+            node = r * GRID + c
+            if c + 1 < GRID:
+                sources.append(node)
+                targets.append(node + 1)
+            if r + 1 < GRID:
+                sources.append(node)
+                targets.append(node + GRID)
+    sources.append(GRID * GRID)
+    targets.append(GRID * GRID + 1)
+    sources, targets = np.array(sources), np.array(targets)
+    lengths = haversine_many(lat[sources], lon[sources], lat[targets], lon[targets]) * rng.uniform(1.0, 1.5, len(sources))
+    return lat, lon, sources, targets, lengths
+
+
+@pytest.fixture
+def provider():
+    lat, lon, sources, targets, lengths = _road_graph()
+    return LocalGraphRouteProvider.from_edges(lat, lon, sources, targets, lengths_km=lengths)
+
+
+def _as_dict_graph(provider):
+    n = len(provider.node_lat)
+    return {
+        node: dict(zip(
+            provider.indices[provider.indptr[node]:provider.indptr[node + 1]].tolist(),
+            provider.weights[provider.indptr[node]:provider.indptr[node + 1]].tolist(),
+        ))
+        for node in range(n)
+    }
+
+
+def test_route_provider_is_abstract():
+    with pytest.raises(TypeError):
+        RouteProvider()
+
+
+def test_astar_matches_dijkstra(provider):
+    graph = _as_dict_graph(provider)
+    source = 0
+    distances, _, _ = dijkstra_algorithm(graph, source)
+
+    for target in range(GRID * GRID):
+        path = provider.shortest_path(source, target)
+        assert path[0] == source and path[-1] == target
+        # Cada paso es una arista de la red; la longitud total es la mínima
+        length = sum(graph[a][b] for a, b in zip(path, path[1:]))
+        assert length == pytest.approx(distances[target], rel=1e-9)
+
+
+def test_route_snaps_to_the_network(provider):
+    start = (ORIGIN[0] + 0.0001, ORIGIN[1])
+    end = (ORIGIN[0] + (GRID - 1) * STEP_DEG, ORIGIN[1] + (GRID - 1) * STEP_DEG + 0.0001)
+
+    points = provider.route(*start, *end)
+
+    assert points[0] == start and points[-1] == end
+    assert points[1] == (ORIGIN[0], ORIGIN[1])
+    assert len(points) == 2 * GRID + 1  # inicio + 2*GRID - 1 nodos + fin
+
+
+def test_unreachable_target_falls_back_to_straight_line(provider, monkeypatch):
+    start, end = ORIGIN, ISLAND[1]
+    assert provider.shortest_path(0, GRID * GRID + 1) is None
+    assert provider.route(*start, *end) is None
+    # Demasiado lejos de la red para ajustarse a un nodo
+    assert provider.route(*start, 0.0, 0.0) is None
+
+    monkeypatch.setattr(cost_calculator, "_route_provider", provider)
+    monkeypatch.setattr(cost_calculator, "route_cache", RouteCache())
+    assert cost_calculator.get_route_polyline(*start, *end) == [start, end]
+
+
+def test_provider_from_env(tmp_path, monkeypatch):
+    lat, lon, sources, targets, _ = _road_graph()
+    (tmp_path / "nodes.csv").write_text(
+        "node_id;lat;lon\n" + "".join(f"{1000 + i};{a};{b}\n" for i, (a, b) in enumerate(zip(lat, lon)))
+    )
+    (tmp_path / "edges.csv").write_text(
+        "source;target\n" + "".join(f"{1000 + s};{1000 + t}\n" for s, t in zip(sources, targets))
+    )
+
+    monkeypatch.delenv("ROUTE_PROVIDER", raising=False)
+    assert isinstance(provider_from_env(), OSRMRouteProvider)
+
+    monkeypatch.setenv("ROUTE_PROVIDER", "local")
+    monkeypatch.setenv("ROAD_GRAPH_DIR", str(tmp_path))
+    local = provider_from_env()
+    assert isinstance(local, LocalGraphRouteProvider)
+    assert len(local.node_lat) == len(lat)
+
+    # Red local que no se puede cargar: se vuelve a OSRM
+    monkeypatch.setenv("ROAD_GRAPH_DIR", str(tmp_path / "no-existe"))
+    assert isinstance(provider_from_env(), OSRMRouteProvider)
@@ -0,0 +1,43 @@
+# tests/test_schedule_filter.py
+"""
+Filtro de horario `abierto_en` de discover: un valor que no es ISO 8601
+responde 422 (no se ignora el filtro) y uno con zona horaria se convierte a la
+hora local de las cafeterías (CAFE_TIMEZONE).
+
+    python -m pytest -q
+"""
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import discover
+from app.utils.cost_calculator import data_loader, hard_filter_mask
+
+
+def _open_mask(abierto_en):
+    positions = np.arange(len(data_loader.cafeteria_ids))
+    return hard_filter_mask({"abierto_en": abierto_en}, positions)
+
+
+def test_invalid_abierto_en_is_rejected():
+    app = FastAPI()
+    app.include_router(discover.router)
+    body = {
+        "user_location": {"latitude": -12.05, "longitude": -77.04},
+        "filters": {"abierto_en": "garbage"},
+        "algorithm": "Dijkstra",
+    }
+
+    response = TestClient(app).post("/discover/optimal_route/", json=body)
+
+    assert response.status_code == 422
+    assert "abierto_en" in response.text
+
+
+def test_timezone_aware_abierto_en_uses_cafe_local_time():
+    # 03:00 UTC del martes = 22:00 del lunes en Lima/Bogotá (UTC-5)
+    aware = _open_mask("2025-06-03T03:00:00Z")
+
+    assert np.array_equal(aware, _open_mask("2025-06-02T22:00"))
+    assert not np.array_equal(aware, _open_mask("2025-06-03T03:00"))
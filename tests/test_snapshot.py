@@ -0,0 +1,83 @@
+# tests/test_snapshot.py
+"""
+Escritura de la instantánea binaria (`write_snapshot`): la limpieza solo borra
+el build reemplazado y los anteriores, nunca uno posterior (de un escritor que
+aún no ha publicado), y build_lock es reentrante dentro del proceso. Leída
+mapeada, solo los valores numéricos y los códigos se comparten (no el texto).
+
+    python -m pytest -q
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.utils.data_loader import _mapped_bytes
+from app.utils.snapshot import build_lock, read_frame, read_manifest, write_snapshot
+
+FRAMES = {"df": pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"]})}
+ARRAYS = {"ids": np.arange(3)}
+
+
+def _write(snapshot_dir):
+    return write_snapshot(snapshot_dir, FRAMES, ARRAYS, sources={}, config={})
+
+
+def _set_mtime(path, seconds):
+    os.utime(path, ns=(seconds * 10**9, seconds * 10**9))
+
+
+def test_cleanup_keeps_newer_builds(tmp_path):
+    stale = tmp_path / "build-00000000000000-stale"
+    stale.mkdir()
+    _set_mtime(stale, 1_000)
+    first = _write(tmp_path)
+    _set_mtime(first, 2_000)
+    # Build de otro escritor, posterior al publicado y aún sin manifiesto
+    in_progress = tmp_path / "build-99999999999999-writer"
+    in_progress.mkdir()
+    _set_mtime(in_progress, 3_000)
+
+    second = _write(tmp_path)
+
+    assert read_manifest(tmp_path)["build"] == second.name
+    assert not first.exists() and not stale.exists()
+    assert in_progress.exists()
+    assert read_frame(tmp_path, read_manifest(tmp_path), "df").equals(FRAMES["df"])
+
+
+def test_build_lock_is_reentrant_and_excludes_other_threads(tmp_path):
+    events = []
+
+    def other_writer():
+        with build_lock(tmp_path):
+            events.append("other")
+
+    with build_lock(tmp_path):
+        # write_snapshot vuelve a tomar el bloqueo: no debe bloquearse
+        _write(tmp_path)
+        thread = threading.Thread(target=other_writer)
+        thread.start()
+        thread.join(timeout=0.2)
+        assert thread.is_alive()
+        events.append("owner")
+    thread.join(timeout=5)
+    assert events == ["owner", "other"]
+
+
+def test_mmap_shares_values_and_codes_but_not_text(tmp_path):
+    df = pd.DataFrame({
+        "id": np.arange(4, dtype=np.int16),
+        "country": pd.Categorical(["Peru", "Colombia", "Peru", "Peru"]),
+        "name": ["a", "b", "c", "d"],
+    })
+    write_snapshot(tmp_path, {"df": df}, {}, sources={}, config={})
+
+    mapped = read_frame(tmp_path, read_manifest(tmp_path), "df", mmap=True)
+
+    assert mapped.equals(df)
+    assert _mapped_bytes(mapped["id"]) == df["id"].nbytes
+    assert _mapped_bytes(mapped["country"]) == df["country"].cat.codes.nbytes
+    assert _mapped_bytes(mapped["name"]) == 0